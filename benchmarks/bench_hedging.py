@@ -0,0 +1,74 @@
+import os, sys, json, time, asyncio, argparse
+
+# allow `python benchmarks/bench_hedging.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.model_client import FakeClient
+from utils.routing import hedged, Tier, RoutedClient, _trackers
+from utils.runner import call_with_retry
+from utils.telemetry import percentile
+
+
+class SlowTailClient(FakeClient):
+    """
+    Fake backend with a heavy tail: `tail_rate` of calls take `tail_factor`
+    times longer, like a real API under load.
+    """
+
+    def __init__(self, tail_rate=0.05, tail_factor=15.0, **kwargs):
+        super().__init__(**kwargs)
+        self.tail_rate = tail_rate
+        self.tail_factor = tail_factor
+
+    def _delay(self, prompt_tokens=0):
+        base = super()._delay(prompt_tokens)
+        return base * self.tail_factor if self._rng.random() < self.tail_rate else base
+
+
+async def measure(client, calls, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with sem:
+            start = time.perf_counter()
+            await call_with_retry(lambda: client.agenerate([f"question {i}"]), retries=2, base_delay=0.01)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    latencies.sort()
+    return {f"p{q}_ms": round(percentile(latencies, q) * 1000, 1) for q in (50, 95, 99)}
+
+
+async def run(args):
+    report = {}
+    plain = SlowTailClient(latency=args.latency, jitter=args.latency / 4, seed=1, model_name="fake-plain")
+    report["plain"] = await measure(plain, args.calls, args.concurrency)
+
+    backend = SlowTailClient(latency=args.latency, jitter=args.latency / 4, seed=1, model_name="fake-hedged")
+    client = hedged(backend, deadline=args.latency * 40)
+    report["hedged"] = await measure(client, args.calls, args.concurrency)
+    report["hedged"].update(hedges=client.hedges, hedge_wins=client.hedge_wins,
+                            extra_load=f"{client.hedges / client.calls:.1%}")
+
+    # routing: the small tier starts failing, traffic should move to the standard tier
+    _trackers.clear()
+    small = FakeClient(latency=args.latency / 2, fail_rate=0.5, seed=2, model_name="fake-small")
+    standard = FakeClient(latency=args.latency, seed=3, model_name="fake-standard")
+    router = RoutedClient([Tier("small", hedged(small), 8000, 1.0),
+                           Tier("standard", hedged(standard), 100000, 2.0)], task="judge")
+    report["routed"] = await measure(router, args.calls, args.concurrency)
+    report["routed"]["routes"] = router.routes()
+    print(json.dumps(report, indent=2))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Tail latency with and without hedging, and tier routing under errors.")
+    p.add_argument("--calls", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--latency", type=float, default=0.05, help="typical fake model latency (s)")
+    asyncio.run(run(p.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
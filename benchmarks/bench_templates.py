@@ -0,0 +1,36 @@
+import os, sys, json, timeit
+
+# allow `python benchmarks/bench_templates.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.templates import load_template
+
+USER_QUERY = "Can you explain recursion in simple terms?"
+LEARNER_DATA = {"level": "beginner", "preferred_style": "analogy", "subject": "Computer Science"}
+
+def legacy_dynamic_prompt(user_query, learner_data):
+    # The pre-template implementation: re-read files, chained str.replace, dumps twice.
+    with open("prompts/system_prompt_dynamic.txt", "r", encoding="utf-8") as f:
+        system_prompt = f.read()
+    with open("prompts/user_prompt_dynamic.txt", "r", encoding="utf-8") as f:
+        user_prompt = f.read()
+    return (
+        system_prompt.replace("{user_query}", user_query).replace("{learner_data}", json.dumps(learner_data, indent=2))
+        + "\n\n"
+        + user_prompt.replace("{user_query}", user_query).replace("{learner_data}", json.dumps(learner_data, indent=2))
+    )
+
+def template_dynamic_prompt(user_query, learner_data):
+    system_prompt = load_template("prompts/system_prompt_dynamic.txt")
+    user_prompt = load_template("prompts/user_prompt_dynamic.txt")
+    values = {"user_query": user_query, "learner_data": json.dumps(learner_data, indent=2)}
+    return system_prompt.render(**values) + "\n\n" + user_prompt.render(**values)
+
+def main(number=20000):
+    assert legacy_dynamic_prompt(USER_QUERY, LEARNER_DATA) == template_dynamic_prompt(USER_QUERY, LEARNER_DATA)
+    for name, fn in [("legacy", legacy_dynamic_prompt), ("template", template_dynamic_prompt)]:
+        best = min(timeit.repeat(lambda: fn(USER_QUERY, LEARNER_DATA), number=number, repeat=5))
+        print(f"{name:>8}: {best / number * 1e6:.2f} µs/render")
+
+if __name__ == "__main__":
+    main()
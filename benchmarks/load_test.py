@@ -0,0 +1,130 @@
+import os, sys, json, time, random, asyncio, argparse, tempfile
+
+# allow `python benchmarks/load_test.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.model_client import FakeClient
+from utils.response_cache import cached
+from utils.service import TutorService, serve, fake_lesson_reply
+from utils.telemetry import percentile
+
+TOPICS = ["Pythagorean Theorem", "Newton's Second Law", "Photosynthesis", "Fractions",
+          "Recursion", "Cell Division", "Linear Equations", "World War I", "Chemical Bonds", "Probability"]
+
+
+async def post(conn, path, payload):
+    reader, writer = conn
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+def bursty_arrivals(students, bursts, window, rng):
+    """
+    Classroom-style traffic: requests land in a few short bursts, and within
+    a burst most students ask about the same handful of topics (Zipf-ish).
+    """
+    per_burst = students // bursts
+    weights = [1 / (i + 1) ** 1.2 for i in range(len(TOPICS))]
+    jobs = []
+    for b in range(bursts):
+        for _ in range(per_burst):
+            at = b * window * 4 + rng.uniform(0, window)
+            flow = rng.choice(["smart-tutor", "lesson", "dynamic"])
+            topic = rng.choices(TOPICS, weights)[0]
+            if flow == "dynamic":
+                payload = {"user_query": f"Can you explain {topic} simply?",
+                           "learner_data": {"level": "beginner", "subject": "General"}}
+            else:
+                payload = {"topic": topic, "grade": 8}
+            jobs.append((at, flow, payload))
+    return sorted(jobs, key=lambda j: j[0])
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    backend = FakeClient(reply=fake_lesson_reply, latency=args.latency, jitter=args.latency / 2, seed=args.seed)
+    client = backend
+    if args.cache:
+        client = cached(backend, path=os.path.join(tempfile.mkdtemp(), "bench.sqlite"))
+    service = TutorService(client, workers=args.workers, queue_size=args.queue_size)
+    server = await serve(service, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    # one keep-alive connection per concurrent client, reused across requests
+    pool = asyncio.Queue()
+    for _ in range(args.connections):
+        pool.put_nowait(await asyncio.open_connection("127.0.0.1", port))
+
+    latencies, statuses = [], {}
+    jobs = bursty_arrivals(args.requests, args.bursts, args.window, rng)
+    start = time.perf_counter()
+
+    async def fire(at, flow, payload):
+        await asyncio.sleep(max(0.0, at - (time.perf_counter() - start)))
+        conn = await pool.get()
+        t0 = time.perf_counter()
+        try:
+            status = await post(conn, f"/{flow}", payload)
+        finally:
+            pool.put_nowait(conn)
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(fire(*job) for job in jobs))
+    wall = time.perf_counter() - start
+    while not pool.empty():
+        _, writer = pool.get_nowait()
+        writer.close()
+        await writer.wait_closed()
+    server.close()
+    await server.wait_closed()
+    await service.stop()
+
+    latencies.sort()
+    stats = service.stats()
+    report = {
+        "requests": len(jobs),
+        "statuses": statuses,
+        "upstream_calls": backend.calls,
+        "coalesced": stats["coalesced"],
+        "cache_hits": stats["cache_hits"],
+        "rejected": stats["rejected"],
+        "wall_s": round(wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Load-test the tutor service against the fake backend.")
+    p.add_argument("--requests", type=int, default=600)
+    p.add_argument("--bursts", type=int, default=3)
+    p.add_argument("--window", type=float, default=1.0, help="seconds each burst is spread over")
+    p.add_argument("--connections", type=int, default=200)
+    p.add_argument("--workers", type=int, default=16)
+    p.add_argument("--queue-size", type=int, default=64)
+    p.add_argument("--latency", type=float, default=0.8, help="mean fake model latency (s)")
+    p.add_argument("--cache", action="store_true", help="put the response cache in front of the backend")
+    p.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(p.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os, sys, json, time, random, asyncio, argparse, platform, tempfile, timeit
+
+# allow `python benchmarks/suite.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# keep benchmark telemetry out of logs/telemetry.jsonl
+TMP = tempfile.mkdtemp(prefix="smarttutor-bench-")
+os.environ["SMARTTUTOR_TELEMETRY"] = os.path.join(TMP, "telemetry.jsonl")
+
+from utils.templates import load_template
+from utils.json_stream import extract_json, stream_json, StreamAbort
+from utils.model_client import make_response
+from utils.telemetry import log_call, get_sink, percentile
+from utils.simulate import SimulatedClient, LatencyModel, TokenProfile, lesson_reply
+from utils.judge import JUDGE_PROMPT, read
+from utils.dataset import ResultWriter
+
+BASELINE = "benchmarks/baseline.json"
+
+USER_QUERY = "Can you explain recursion in simple terms?"
+LEARNER_DATA = {"level": "beginner", "preferred_style": "analogy", "subject": "Computer Science"}
+
+
+def best_of(fn, number, repeat=5):
+    """
+    Best per-call time in microseconds over `repeat` runs of `number` calls.
+    """
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def reply_corpus(n=200, seed=0):
+    """
+    Lesson replies as they come off the wire: half fenced, a fifth malformed.
+    """
+    client = SimulatedClient(reply=lesson_reply(), fence_rate=0.5, malformed_rate=0.2,
+                             latency_model=LatencyModel(time_scale=0.0), seed=seed)
+    return [client.generate(["lesson prompt"]).text for _ in range(n)]
+
+
+# ---------- Cases ----------
+# Each returns {metric: (value, unit, "lower" | "higher" is better)}.
+
+def bench_prompt_render():
+    system = load_template("prompts/system_prompt_dynamic.txt")
+    user = load_template("prompts/user_prompt_dynamic.txt")
+
+    def render():
+        values = {"user_query": USER_QUERY, "learner_data": json.dumps(LEARNER_DATA, indent=2)}
+        return system.render(**values) + "\n\n" + user.render(**values)
+
+    return {"render_us": (best_of(render, 20000), "µs/prompt", "lower")}
+
+
+def bench_json_extraction():
+    corpus = reply_corpus()
+
+    def parse_all():
+        ok = 0
+        for text in corpus:
+            try:
+                extract_json(text)
+                ok += 1
+            except StreamAbort:
+                pass
+        return ok
+
+    def stream_all():
+        for text in corpus:
+            try:
+                stream_json(text[i:i + 16] for i in range(0, len(text), 16))
+            except StreamAbort:
+                pass
+
+    return {
+        "extract_us": (best_of(parse_all, 10, repeat=9) / len(corpus), "µs/reply", "lower"),
+        "stream_us": (best_of(stream_all, 5, repeat=9) / len(corpus), "µs/reply", "lower"),
+        "parse_rate": (parse_all() / len(corpus), "fraction", "higher"),
+    }
+
+
+def bench_usage_logging():
+    resp = make_response("x" * 3000, prompt_tokens=961, completion_tokens=780)
+    config = {"temperature": 0.8, "top_p": 0.9}
+    us = best_of(lambda: log_call("bench", "gemini-1.5-flash", resp, 1.2, generation_config=config), 20000)
+    get_sink().flush()
+    return {"log_call_us": (us, "µs/call", "lower")}
+
+
+def bench_eval_loop(samples=300, concurrency=8, time_scale=0.01):
+    # imported here: run_evaluation is a script and only this case needs it
+    from scripts.run_evaluation import evaluate
+
+    rng = random.Random(0)
+    dataset = [{"id": i, "user_query": f"Question {i}?", "learner_data": LEARNER_DATA,
+                "expected": " ".join(rng.choice(["force", "mass", "energy", "cell", "array"]) for _ in range(30))}
+               for i in range(samples)]
+    client = SimulatedClient(profile=TokenProfile.from_log(),
+                             latency_model=LatencyModel(time_scale=time_scale), seed=0)
+    latencies = []
+    agenerate = client.agenerate
+
+    async def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await agenerate(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    client.agenerate = timed
+    out = os.path.join(TMP, "results.jsonl")
+    start = time.perf_counter()
+    with ResultWriter(out, fresh=True) as writer:
+        asyncio.run(evaluate(iter(dataset), client, read(JUDGE_PROMPT), writer,
+                             concurrency=concurrency, rps=0, retries=0))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    # the simulated backend is fixed, so any slowdown here is loop overhead
+    return {
+        "samples_per_s": (samples / wall, "samples/s", "higher"),
+        "call_p95_ms": (percentile(latencies, 95) * 1000, "ms", "lower"),
+    }
+
+
+CASES = {
+    "prompt_render": bench_prompt_render,
+    "json_extraction": bench_json_extraction,
+    "usage_logging": bench_usage_logging,
+    "eval_loop": bench_eval_loop,
+}
+
+
+# ---------- Baselines ----------
+
+def run_case(name, times=1, pick="median"):
+    """
+    Runs a case `times` times and keeps, per metric, the median or the best value.
+    """
+    runs = [CASES[name]() for _ in range(times)]
+    merged = {}
+    for metric, (_, unit, better) in runs[0].items():
+        values = sorted(r[metric][0] for r in runs)
+        if pick == "median":
+            value = values[len(values) // 2]
+        else:
+            value = values[0] if better == "lower" else values[-1]
+        merged[metric] = (value, unit, better)
+    return merged
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns (rows, regressions); a metric regresses when it is worse than the
+    baseline by more than `threshold` (a fraction).
+    """
+    rows, regressions = [], []
+    for case, metrics in results.items():
+        for name, (value, unit, better) in metrics.items():
+            base = baseline.get(case, {}).get(name)
+            change = None
+            if base:
+                change = (value - base) / base
+                worse = change > threshold if better == "lower" else change < -threshold
+                if worse:
+                    regressions.append(f"{case}.{name}")
+            rows.append((f"{case}.{name}", value, base, change, unit))
+    return rows, regressions
+
+
+def print_rows(rows, regressions):
+    print(f"{'metric':<32}{'value':>12}{'baseline':>12}{'change':>9}  unit")
+    for name, value, base, change, unit in rows:
+        base_s = f"{base:.3f}" if base else "-"
+        change_s = f"{change:+.1%}" if change is not None else "-"
+        flag = "  ⚠️" if name in regressions else ""
+        print(f"{name:<32}{value:>12.3f}{base_s:>12}{change_s:>9}  {unit}{flag}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Offline benchmark suite (no API key needed).")
+    p.add_argument("--only", nargs="*", choices=list(CASES), help="run a subset of cases")
+    p.add_argument("--baseline", default=BASELINE)
+    p.add_argument("--save-baseline", action="store_true", help="record these results as the new baseline")
+    p.add_argument("--threshold", type=float, default=0.25,
+                   help="fail when a metric is this much worse than the baseline (fraction)")
+    args = p.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("metrics", {})
+
+    # baselines are the median of 3 runs; checks take one run and re-run
+    # (best of 3) only the cases that look regressed, to ride out timer noise
+    results = {}
+    for name in args.only or CASES:
+        print(f"📏 {name} ...", flush=True)
+        results[name] = run_case(name, times=3 if args.save_baseline else 1)
+    rows, regressions = compare(results, baseline, args.threshold)
+    if regressions and not args.save_baseline:
+        for name in sorted({r.split(".")[0] for r in regressions}):
+            print(f"🔁 re-running {name} ...", flush=True)
+            results[name] = run_case(name, times=3, pick="best")
+        rows, regressions = compare(results, baseline, args.threshold)
+    print_rows(rows, regressions)
+
+    if args.save_baseline:
+        merged = dict(baseline)
+        for case, metrics in results.items():
+            merged[case] = {name: round(v[0], 4) for name, v in metrics.items()}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "metrics": merged}, f, indent=2)
+        print(f"✅ Baseline saved → {args.baseline}")
+        return 0
+    if regressions:
+        print(f"❌ {len(regressions)} metric(s) regressed more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("✅ No regressions" if baseline else "⚠️ No baseline yet; run with --save-baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,67 +1,176 @@
-import os, json
-from dotenv import load_dotenv
-import google.generativeai as genai
-
-# ---------- Setup ----------
-load_dotenv()
-API_KEY = os.getenv("GOOGLE_API_KEY")
-if not API_KEY:
-    raise ValueError("❌ GOOGLE_API_KEY not found in .env")
-
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel("gemini-1.5-flash")
-
-def read(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read().strip()
-
-def ask_model(prompt):
-    resp = model.generate_content(prompt)
-    return resp.text.strip()
-
-# ---------- Load dataset ----------
-with open("evaluation/dataset.json", "r", encoding="utf-8") as f:
-    dataset = json.load(f)
-
-judge_template = read("prompts/judge_prompt.txt")
-
-results = []
-
-for sample in dataset:
-    user_query = sample["user_query"]
-    learner_data = json.dumps(sample["learner_data"], indent=2)
-    expected = sample["expected"]
-
+import os, sys, json, time, asyncio, argparse
+
+# allow `python scripts/run_evaluation.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.routing import build_client, cache_counts, layers
+from utils.judge import JUDGE_PROMPT, BatchJudge, stream_single, read
+from utils.dataset import iter_samples, ResultWriter, export_json
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Score SmartTutorBot answers with an LLM judge.")
+    p.add_argument("--dataset", default="evaluation/dataset.json", help="JSON array or JSONL file")
+    p.add_argument("--out-jsonl", default="evaluation/results.jsonl",
+                   help="results are appended here as they finish (with a .ckpt sidecar)")
+    p.add_argument("--out", default="evaluation/results.json", help="legacy JSON array export")
+    p.add_argument("--fresh", action="store_true", help="ignore the checkpoint and start over")
+    p.add_argument("--no-export", action="store_true", help="skip building the legacy --out file")
+    p.add_argument("--export-only", action="store_true", help="only rebuild --out from --out-jsonl")
+    p.add_argument("--concurrency", type=int, default=8, help="max judge calls in flight")
+    p.add_argument("--rps", type=float, default=5.0, help="max judge calls per second (0 = unlimited)")
+    p.add_argument("--retries", type=int, default=4, help="retries on transient errors")
+    p.add_argument("--fake", action="store_true", help="use the local fake backend (no API key needed)")
+    p.add_argument("--cache", choices=["on", "off", "refresh"], default=None,
+                   help="response cache mode (default: $SMARTTUTOR_CACHE or on)")
+    p.add_argument("--batch-size", type=int, default=1,
+                   help="max samples per judge call (1 = one call per sample)")
+    p.add_argument("--token-budget", type=int, default=6000,
+                   help="max estimated prompt tokens per batched judge call")
+    p.add_argument("--prescore", action="store_true",
+                   help="auto-score clear-cut samples locally and only judge the ambiguous band (needs numpy)")
+    p.add_argument("--calibrate", action="store_true",
+                   help="judge every sample, then fit prescore thresholds against the judge and report agreement")
+    p.add_argument("--route", action="store_true",
+                   help="route judge calls across model tiers by prompt size and observed latency/errors")
+    p.add_argument("--deadline", type=float, default=60.0, help="per-call deadline in seconds (hedged after p95)")
+    p.add_argument("--compact", action="store_true",
+                   help="compact judge prompts (minified JSON, collapsed whitespace) before sending them")
+    p.add_argument("--max-prompt-tokens", type=int, default=None,
+                   help="reject judge prompts estimated over this many tokens before calling the model")
+    return p.parse_args(argv)
+
+def prescored(items, writer, calibrate=False, window=1024):
+    """
+    Scores items against their reference locally, one vectorized batch per window.
+    Clear-cut samples are written straight away with a local evaluation; the
+    rest (or all of them, when calibrating) are passed on to the judge.
+    """
+    from itertools import islice
+    from utils.prescore import local_scores, load_thresholds, decide, auto_evaluation
+
+    thresholds = load_thresholds()
+    items = iter(items)
+    while True:
+        batch = list(islice(items, window))
+        if not batch:
+            return
+        combined = local_scores([i["model_answer"] for i in batch], [i["expected"] for i in batch])["combined"]
+        decisions = decide(combined, thresholds)
+        for item, score, decision in zip(batch, combined, decisions):
+            item["local_score"] = round(float(score), 4)
+            if calibrate or decision == "judge":
+                yield item
+            else:
+                writer.write({
+                    "id": item["id"],
+                    "query": item["user_query"],
+                    "model_answer": item["model_answer"],
+                    "evaluation": auto_evaluation(score, decision, thresholds)
+                })
+
+def calibration_report(out_jsonl):
+    from utils.dataset import iter_jsonl
+    from utils.prescore import calibrate, agreement, load_thresholds, save_thresholds, DEFAULT_THRESHOLDS
+
+    scores, totals = [], []
+    for r in iter_jsonl(out_jsonl):
+        total = r["evaluation"].get("total_score")
+        if "local_score" in r and isinstance(total, int) and not r["evaluation"].get("auto_scored"):
+            scores.append(r["local_score"])
+            totals.append(total)
+    if not scores:
+        print("⚠️ No judged samples with local scores to calibrate against.")
+        return
+    print("📏 Agreement with current thresholds:", json.dumps(agreement(scores, totals, load_thresholds())))
+    thresholds = calibrate(scores, totals)
+    save_thresholds(thresholds)
+    print("📏 Agreement with calibrated thresholds:", json.dumps(agreement(scores, totals, thresholds)))
+    print(f"✅ Saved thresholds → {DEFAULT_THRESHOLDS}")
+
+def with_model_answer(sample):
     # Simulated model answer (in real use, call your SmartTutorBot function)
-    model_answer = f"(Pretend SmartTutorBot answered) → {expected}"
-
-    # Judge Prompt
-    judge_prompt = f"""
-{judge_template}
-
-User Query: {user_query}
-Learner Data: {learner_data}
-Expected Reference: {expected}
-Model Output: {model_answer}
-"""
-
-    score_text = ask_model(judge_prompt)
-
-    try:
-        score_json = json.loads(score_text)
-    except Exception:
-        score_json = {"error": "Could not parse", "raw": score_text}
-
-    results.append({
-        "id": sample["id"],
-        "query": user_query,
-        "model_answer": model_answer,
-        "evaluation": score_json
-    })
-
-# ---------- Save results ----------
-os.makedirs("evaluation", exist_ok=True)
-with open("evaluation/results.json", "w", encoding="utf-8") as f:
-    json.dump(results, f, indent=2, ensure_ascii=False)
-
-print("✅ Evaluation complete → evaluation/results.json")
+    return dict(sample, model_answer=f"(Pretend SmartTutorBot answered) → {sample['expected']}")
+
+async def evaluate(samples, client, judge_template, writer, concurrency=8, rps=5.0, retries=4,
+                   batch_size=1, token_budget=6000, prescore=False, calibrate=False):
+    """
+    Judges samples lazily, skipping ids already in the checkpoint, and hands each
+    result to `writer` as soon as it finishes. Returns the number of judged results.
+    """
+    items = (with_model_answer(s) for s in samples if not writer.is_done(s["id"]))
+    if prescore or calibrate:
+        items = prescored(items, writer, calibrate=calibrate)
+
+    if batch_size > 1:
+        judge = BatchJudge(client, judge_template, max_k=batch_size, token_budget=token_budget,
+                           concurrency=concurrency, rps=rps, retries=retries)
+        stream = judge.stream(items)
+    else:
+        judge = None
+        stream = stream_single(items, client, judge_template, concurrency, rps, retries)
+
+    count = 0
+    async for item, evaluation in stream:
+        result = {
+            "id": item["id"],
+            "query": item["user_query"],
+            "model_answer": item["model_answer"],
+            "evaluation": evaluation
+        }
+        if "local_score" in item:
+            result["local_score"] = item["local_score"]
+        writer.write(result)
+        count += 1
+
+    if judge is not None:
+        print(f"📦 Batched judging: {judge.calls} calls for {count} samples ({judge.splits} splits)")
+    return count
+
+def main(argv=None, client=None):
+    """
+    `client` reuses an already built judge client (the CLI's warm worker passes
+    its own); otherwise one is built from the flags.
+    """
+    args = parse_args(argv)
+
+    if args.export_only:
+        n = export_json(args.out_jsonl, args.out, args.dataset)
+        print(f"✅ Exported {n} results → {args.out}")
+        return
+
+    if client is None:
+        client = build_client("judge", task="judge", fake=args.fake, route=args.route,
+                              cache_mode=args.cache, deadline=args.deadline,
+                              compact=args.compact, max_prompt_tokens=args.max_prompt_tokens)
+
+    judge_template = read(JUDGE_PROMPT)
+
+    # ---------- Stream dataset → JSONL results ----------
+    start = time.perf_counter()
+    with ResultWriter(args.out_jsonl, fresh=args.fresh) as writer:
+        skipped = len(writer.done)
+        count = asyncio.run(evaluate(iter_samples(args.dataset), client, judge_template, writer,
+                                     args.concurrency, args.rps, args.retries,
+                                     args.batch_size, args.token_budget,
+                                     args.prescore, args.calibrate))
+        written = len(writer.done) - skipped
+    elapsed = time.perf_counter() - start
+    hits, misses = cache_counts(client)
+
+    print(f"✅ Evaluation complete → {args.out_jsonl} ({written} new samples, {count} judged, "
+          f"{written - count} auto-scored in {elapsed:.2f}s, {skipped} already done, "
+          f"cache hits: {hits}, misses: {misses})")
+    routed = next((layer for layer in layers(client) if hasattr(layer, "routes")), None)
+    if routed is not None:
+        print(f"🔀 Routed calls per tier: {routed.routes()}")
+
+    if args.calibrate:
+        calibration_report(args.out_jsonl)
+
+    # ---------- Legacy results.json ----------
+    if not args.no_export:
+        n = export_json(args.out_jsonl, args.out, args.dataset)
+        print(f"✅ Exported {n} results → {args.out}")
+
+if __name__ == "__main__":
+    main()
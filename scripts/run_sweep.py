@@ -0,0 +1,118 @@
+import os, sys, json, time, zlib, asyncio, argparse
+
+# allow `python scripts/run_sweep.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.routing import build_client
+from utils.judge import JUDGE_PROMPT, read
+from utils.dataset import iter_samples
+from utils.strategies import STRATEGIES
+from utils.sweep import Sweep, Cell, config_grid
+
+
+def floats(text):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+def ints(text):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Sweep prompt strategies x generation configs, scored by the LLM judge.")
+    p.add_argument("--strategies", default=",".join(STRATEGIES),
+                   help=f"comma-separated subset of: {', '.join(STRATEGIES)}")
+    p.add_argument("--temperature", type=floats, default=[0.3, 0.8], help="comma-separated values")
+    p.add_argument("--top-p", type=floats, default=[0.9], help="comma-separated values")
+    p.add_argument("--top-k", type=ints, default=[], help="comma-separated values")
+    p.add_argument("--max-output-tokens", type=ints, default=[], help="comma-separated values")
+    p.add_argument("--dataset", default="evaluation/dataset.json", help="JSON array or JSONL file")
+    p.add_argument("--initial-samples", type=int, default=1, help="samples per cell in the first round")
+    p.add_argument("--eta", type=int, default=2,
+                   help="keep the best 1/eta cells each round; the next round uses eta x more samples")
+    p.add_argument("--concurrency", type=int, default=8, help="max generate+judge pairs in flight")
+    p.add_argument("--rps", type=float, default=5.0,
+                   help="max model calls per second, generation and judge combined (0 = unlimited)")
+    p.add_argument("--retries", type=int, default=4, help="retries on transient errors")
+    p.add_argument("--fake", action="store_true", help="use the local fake backend (no API key needed)")
+    p.add_argument("--cache", choices=["on", "off", "refresh"], default=None,
+                   help="response cache mode (default: $SMARTTUTOR_CACHE or on)")
+    p.add_argument("--compact", action="store_true",
+                   help="compact prompts (minified JSON, collapsed whitespace) before sending them")
+    p.add_argument("--out", default="evaluation/sweep.json")
+    return p.parse_args()
+
+
+# ---------- Fake backend ----------
+# Deterministic but uneven scores, so the halving has something to separate.
+
+def fake_answer(prompt_text):
+    return f"Answer {zlib.crc32(prompt_text.encode()) % 1000}: a short explanation with one example."
+
+
+def fake_judge_reply(prompt_text):
+    total = 3 + zlib.crc32(prompt_text.encode()) % 8
+    return json.dumps({"relevance": 2, "style": 2, "accuracy": 2, "completeness": 1, "clarity": 2,
+                       "total_score": total, "comments": "fake judge"})
+
+
+# ---------- Report ----------
+
+def print_round(rnd, ranked, batch):
+    best = ranked[0]
+    print(f"🔁 round {rnd}: {len(ranked)} cell(s) x {batch} sample(s); "
+          f"best so far {best.label} ({best.mean_score() or 0:.2f})", flush=True)
+
+
+def print_table(rows):
+    print(f"\n{'strategy':<13}{'config':<34}{'n':>4}{'score':>7}{'err':>5}"
+          f"{'in tok':>8}{'out tok':>8}{'p50 s':>8}{'p95 s':>8}  status")
+    for r in rows:
+        config = " ".join(f"{k}={v}" for k, v in r["config"].items())
+        cell = lambda v, fmt: "-" if v is None else format(v, fmt)
+        print(f"{r['strategy']:<13}{config:<34}{r['samples']:>4}{cell(r['score'], '.2f'):>7}{r['errors']:>5}"
+              f"{cell(r['prompt_tokens'], '.0f'):>8}{cell(r['completion_tokens'], '.0f'):>8}"
+              f"{cell(r['p50_latency_s'], '.3f'):>8}{cell(r['p95_latency_s'], '.3f'):>8}  {r['status']}")
+
+
+def main():
+    args = parse_args()
+    names = [s.strip() for s in args.strategies.split(",") if s.strip()]
+    unknown = [s for s in names if s not in STRATEGIES]
+    if unknown:
+        sys.exit(f"❌ Unknown strategy: {', '.join(unknown)}")
+
+    configs = config_grid(temperature=args.temperature, top_p=args.top_p,
+                          top_k=args.top_k, max_output_tokens=args.max_output_tokens)
+    cells = [Cell(s, c) for s in names for c in configs]
+    samples = list(iter_samples(args.dataset))
+
+    client = build_client("sweep", fake=args.fake, cache_mode=args.cache, compact=args.compact,
+                          reply=fake_answer if args.fake else None)
+    judge_client = build_client("judge", task="judge", fake=args.fake, cache_mode=args.cache,
+                                compact=args.compact, reply=fake_judge_reply if args.fake else None)
+    sweep = Sweep(client, judge_client, read(JUDGE_PROMPT),
+                  concurrency=args.concurrency, rps=args.rps, retries=args.retries)
+
+    print(f"📦 {len(cells)} cell(s) = {len(names)} strategies x {len(configs)} config(s), "
+          f"{len(samples)} samples", flush=True)
+    start = time.perf_counter()
+    ranked = asyncio.run(sweep.run(cells, samples, initial=args.initial_samples, eta=args.eta,
+                                   on_round=print_round))
+    elapsed = time.perf_counter() - start
+
+    rows = [c.row() for c in ranked]
+    print_table(rows)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"dataset": args.dataset, "eta": args.eta, "initial_samples": args.initial_samples,
+                   "cells": rows}, f, indent=2)
+    calls = sum(r["samples"] for r in rows)
+    print(f"\n✅ Sweep complete in {elapsed:.2f}s ({calls} generate+judge pairs vs "
+          f"{len(cells) * len(samples)} for the full grid) → {args.out}")
+    print(f"🏆 Best: {ranked[0].label}")
+
+
+if __name__ == "__main__":
+    main()
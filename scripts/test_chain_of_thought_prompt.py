@@ -1,17 +1,30 @@
 import json
 import os
+import sys
 
-def load_prompt(filepath):
-    with open(filepath, "r", encoding="utf-8") as f:   # force utf-8
-        return f.read()
+# allow `python scripts/test_chain_of_thought_prompt.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def chain_of_thought_prompt(user_query, learner_data):
-    base_prompt = load_prompt("prompts/system_prompt_chain_of_thought.txt")
-    return (
-        base_prompt
-        .replace("{user_query}", user_query)
-        .replace("{learner_data}", json.dumps(learner_data))
-    )
+from utils.templates import load_template
+
+INDEX_DIR = "index"
+
+def open_index(path=INDEX_DIR):
+    # retrieval is optional: only pull in numpy once an index has been built
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    from utils.retrieval import VectorIndex
+    return VectorIndex(path)
+
+def chain_of_thought_prompt(user_query, learner_data, index=None, context_budget=600):
+    base_prompt = load_template("prompts/system_prompt_chain_of_thought.txt")
+    prompt = base_prompt.render(user_query=user_query, learner_data=json.dumps(learner_data))
+    if index is not None:
+        from utils.retrieval import retrieve_context
+        context = retrieve_context(index, user_query, learner_data, token_budget=context_budget)
+        if context:
+            prompt = context + "\n\n" + prompt
+    return prompt
 
 if __name__ == "__main__":
     # Example test case
@@ -22,7 +35,7 @@ if __name__ == "__main__":
         "subject": "Computer Science"
     }
 
-    final_prompt = chain_of_thought_prompt(user_query, learner_data)
+    final_prompt = chain_of_thought_prompt(user_query, learner_data, index=open_index())
 
     # Save outputs
     os.makedirs("evaluation", exist_ok=True)
@@ -1,20 +1,11 @@
 import json
 import os
+import sys
 
-def load_prompt(filepath):
-    with open(filepath, "r") as f:
-        return f.read()
+# allow `python scripts/test_dynamic_prompt.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def dynamic_prompt(user_query, learner_data):
-    system_prompt = load_prompt("prompts/system_prompt_dynamic.txt")
-    user_prompt = load_prompt("prompts/user_prompt_dynamic.txt")
-
-    combined_prompt = (
-        system_prompt.replace("{user_query}", user_query).replace("{learner_data}", json.dumps(learner_data, indent=2))
-        + "\n\n"
-        + user_prompt.replace("{user_query}", user_query).replace("{learner_data}", json.dumps(learner_data, indent=2))
-    )
-    return combined_prompt
+from utils.strategies import dynamic_prompt, open_index
 
 if __name__ == "__main__":
     # Example input
@@ -25,7 +16,7 @@ if __name__ == "__main__":
         "subject": "Computer Science"
     }
 
-    final_prompt = dynamic_prompt(user_query, learner_data)
+    final_prompt = dynamic_prompt(user_query, learner_data, index=open_index())
 
     # Save full prompt for debugging
     os.makedirs("evaluation", exist_ok=True)
@@ -1,22 +1,14 @@
 import os
-import re
+import sys
 import json
-import google.generativeai as genai
 
-# Load API key
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
-    raise ValueError("❌ GOOGLE_API_KEY not found. Please set it in your environment.")
+# allow `python scripts/test_multi_shot_prompt.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-genai.configure(api_key=api_key)
-
-def clean_json_fences(text: str) -> str:
-    """
-    Removes ```json ... ``` fences if present and extracts the JSON block.
-    """
-    if text.startswith("```"):
-        text = re.sub(r"^```[a-zA-Z]*\s*|\s*```$", "", text.strip(), flags=re.DOTALL)
-    return text.strip()
+from utils.model_client import GeminiClient
+from utils.response_cache import cached
+from utils.telemetry import instrumented
+from utils.json_stream import extract_json
 
 def main():
     # Load prompts
@@ -27,8 +19,8 @@ def main():
         user_prompt = f.read()
 
     # Run Gemini model
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    resp = model.generate_content([system_prompt, user_prompt])
+    client = instrumented(cached(GeminiClient()), tag="multi-shot")
+    resp = client.generate([system_prompt, user_prompt])
 
     print("\nDEBUG RAW RESPONSE:\n", resp, "\n")
 
@@ -36,11 +28,8 @@ def main():
         content = resp.candidates[0].content.parts[0].text.strip()
         print("\nRAW MODEL CONTENT:\n", content, "\n")
 
-        # 🔧 Clean content
-        cleaned = clean_json_fences(content)
-
-        # Parse JSON
-        data = json.loads(cleaned)
+        # Parse JSON (skips ```json fences and surrounding prose)
+        data = extract_json(content)
         print("✅ Parsed JSON Output:\n", json.dumps(data, indent=2))
 
         # Save outputs
@@ -1,26 +1,33 @@
-import os, json, re
-from dotenv import load_dotenv
-import google.generativeai as genai
-from google.generativeai.types import FunctionDeclaration, Tool
+import os, sys, json
+from typing import Literal
+
+# allow `python scripts/test_one_shot_prompt.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.model_client import GeminiClient
+from utils.context_cache import context_cached, DEFAULT_REGISTRY
+from utils.response_cache import cached
+from utils.telemetry import instrumented
+from utils.json_stream import extract_json
+from utils.lesson_schema import repair_lesson, format_errors
+from utils.tools import ToolRegistry, run_tool_loop
 
 # ---------- Setup ----------
-load_dotenv()
-API_KEY = os.getenv("GOOGLE_API_KEY")
-if not API_KEY:
-    raise ValueError("❌ GOOGLE_API_KEY not found in .env")
-
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel("gemini-1.5-flash")
-
-REQ_KEYS = {
-    "topic","grade_level","learning_objective","lesson_summary","key_points",
-    "worked_examples","practice_problems","assessment_quiz",
-    "follow_up_recommendations","references","estimated_time_minutes"
-}
-
-# ---------- Example Function ----------
-def get_weather(city: str, unit: str = "C"):
-    """Dummy weather lookup"""
+client = instrumented(
+    cached(context_cached(GeminiClient(), registry_path=DEFAULT_REGISTRY)), tag="one-shot"
+)
+
+# ---------- Tools ----------
+tools = ToolRegistry()
+
+@tools.register(idempotent=True)
+def get_weather(city: str, unit: Literal["C", "F"] = "C"):
+    """Get the weather forecast for a given city
+
+    Args:
+        city: City name
+        unit: Temperature unit
+    """
     return {
         "city": city,
         "unit": unit,
@@ -44,97 +51,49 @@ def extract_text(resp):
     except:
         return str(resp)
 
-def clean_to_json(text: str) -> str:
-    t = text.strip()
-    if t.startswith("```"):
-        t = re.sub(r"^```[a-zA-Z]*\n", "", t).strip()
-        t = re.sub(r"```$", "", t).strip()
-    m = re.search(r"\{.*\}\s*$", t, re.DOTALL)
-    return m.group(0) if m else t
-
 # ---------- Main ----------
 def main():
     system = read("prompts/system_prompt_one_shot.txt")
     user   = read("prompts/user_prompt_one_shot.txt")
 
-    prompt = f"{system}\n\n# New Task\n{user}"
-
-    # ✅ Correct function schema
-    tools = [
-        Tool(
-            function_declarations=[
-                FunctionDeclaration(
-                    name="get_weather",
-                    description="Get the weather forecast for a given city",
-                    parameters={
-                        "type": "object",
-                        "properties": {
-                            "city": {
-                                "type": "string",
-                                "description": "City name"
-                            },
-                            "unit": {
-                                "type": "string",
-                                "enum": ["C", "F"],
-                                "description": "Temperature unit"
-                            }
-                        },
-                        "required": ["city"]
-                    }
-                )
-            ]
-        )
-    ]
-
-    resp = model.generate_content(
+    # The system prompt + few-shot example is the static prefix; only the task varies
+    prompt = [system, f"# New Task\n{user}"]
+
+    def show_calls(calls, results):
+        for (name, args), result in zip(calls, results):
+            print(f"\n📞 {name}({args}) → {result}")
+
+    # Every function call in a turn runs in parallel; results go back with the
+    # full history until the model answers in text
+    resp, history = run_tool_loop(
+        client,
         prompt,
-        tools=tools,
-        generation_config=genai.types.GenerationConfig(
-            temperature=0.3,
-            top_p=0.9,
-            top_k=40
-        )
+        tools,
+        generation_config={
+            "temperature": 0.3,
+            "top_p": 0.9,
+            "top_k": 40
+        },
+        on_calls=show_calls,
     )
 
     print("\n=== RAW MODEL RESPONSE ===\n")
     print(resp)
 
-    # Check if model requested function call
-    fn_call = None
-    try:
-        fn_call = resp.candidates[0].content.parts[0].function_call
-    except:
-        pass
-
-    if fn_call:
-        fn_name = fn_call.name
-        args = json.loads(fn_call.args)
-        print(f"\n📞 Model requested function call: {fn_name} with args {args}")
-
-        if fn_name == "get_weather":
-            result = get_weather(**args)
-            print("\n✅ Function executed. Result:", result)
-
-            # Send result back to model for final response
-            followup = model.generate_content(
-                [{"role": "model", "parts": [result]}]
-            )
-            print("\n=== FINAL MODEL RESPONSE ===\n")
-            print(followup.text)
-            return
-
     # Fallback → structured JSON response
     raw = extract_text(resp)
     print("\n=== RAW MODEL TEXT (one-shot) ===\n")
     print(raw)
 
     try:
-        text = clean_to_json(raw)
-        data = json.loads(text)
-
-        for k in REQ_KEYS:
-            if k not in data:
-                data[k] = None
+        data = extract_json(raw)
+
+        # Fix what we can locally, then re-request only the still-invalid fields
+        data, errors, calls = repair_lesson(data, client)
+        if calls:
+            print(f"\n🔧 Repaired with {calls} targeted call(s).")
+        if errors:
+            print("\n⚠️ Still invalid:", format_errors(errors))
 
         os.makedirs("evaluation", exist_ok=True)
         with open("evaluation/one_shot_latest_output.json", "w", encoding="utf-8") as f:
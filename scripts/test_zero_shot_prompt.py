@@ -1,65 +1,51 @@
-import os, json, re
-from dotenv import load_dotenv
-import google.generativeai as genai
+import os, sys, json
 
-load_dotenv()
-API_KEY = os.getenv("GOOGLE_API_KEY")
-if not API_KEY:
-    raise ValueError("❌ GOOGLE_API_KEY not found in .env")
+# allow `python scripts/test_zero_shot_prompt.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel("gemini-1.5-flash")
+from utils.model_client import GeminiClient
+from utils.response_cache import cached
+from utils.telemetry import instrumented
+from utils.json_stream import stream_json, StreamAbort
+from utils.lesson_schema import REQ_KEYS, repair_lesson, format_errors
 
-REQ_KEYS = {
-    "topic","grade_level","learning_objective","lesson_summary","key_points",
-    "worked_examples","practice_problems","assessment_quiz",
-    "follow_up_recommendations","references","estimated_time_minutes"
-}
+client = instrumented(cached(GeminiClient()), tag="zero-shot")
 
 def read(p): 
     with open(p, "r", encoding="utf-8") as f: 
         return f.read().strip()
 
-def clean_to_json(text: str) -> str:
-    t = text.strip()
-    if t.startswith("```"):
-        t = re.sub(r"^```(\w+)?", "", t).strip()
-        t = re.sub(r"```$", "", t).strip()
-    # grab the last JSON object if extra text appears
-    m = re.search(r"\{.*\}\s*$", t, re.DOTALL)
-    return m.group(0) if m else t
+# ~4x the longest lesson in logs/tokens.log; anything longer is a runaway generation
+MAX_CHARS = 16000
 
 def main():
     system = read("prompts/system_prompt_zero_shot.txt")
     user   = read("prompts/user_prompt_zero_shot.txt")
 
-    resp = model.generate_content([system, user])
-
-    # Extract raw text
-    try:
-        raw = resp.candidates[0].content.parts[0].text.strip()
-    except Exception:
-        raw = str(resp)
-
-    print("\n=== RAW MODEL TEXT (zero-shot) ===\n")
-    print(raw)
-
-    text = clean_to_json(raw)
+    print("\n=== STREAMED FIELDS (zero-shot) ===\n")
+    chunks = client.generate_stream([system, user])
     os.makedirs("evaluation", exist_ok=True)
 
     try:
-        data = json.loads(text)
+        data, raw = stream_json(chunks, on_field=lambda k, v: print(f"  ✓ {k}"), max_chars=MAX_CHARS)
         missing = sorted(list(REQ_KEYS - set(data.keys())))
         extra   = sorted(list(set(data.keys()) - REQ_KEYS))
         print("\n✅ Parsed JSON. Missing keys:", missing, " Extra keys:", extra)
+
+        # Fix what we can locally, then re-request only the still-invalid fields
+        data, errors, calls = repair_lesson(data, client)
+        if calls:
+            print(f"🔧 Repaired with {calls} targeted call(s).")
+        if errors:
+            print("⚠️ Still invalid:", format_errors(errors))
         out_path = "evaluation/zero_shot_latest_output.json"
         with open(out_path, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
         print(f"Saved → {out_path}")
-    except Exception as e:
-        print("\n⚠️ JSON parse failed:", e)
+    except StreamAbort as e:
+        print("\n⚠️ JSON parse failed, generation stopped early:", e)
         with open("evaluation/zero_shot_latest_output_raw.txt", "w", encoding="utf-8") as f:
-            f.write(raw)
+            f.write(e.raw)
         print("Saved raw → evaluation/zero_shot_latest_output_raw.txt")
 
 if __name__ == "__main__":
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# keep test runs out of logs/telemetry.jsonl and cache/responses.sqlite
+os.environ["SMARTTUTOR_TELEMETRY"] = os.path.join(tempfile.mkdtemp(prefix="smarttutor-test-"), "telemetry.jsonl")
+os.environ["SMARTTUTOR_CACHE"] = "off"
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # prompt paths are relative to the repo root
+    monkeypatch.chdir(ROOT)
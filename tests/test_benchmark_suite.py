@@ -0,0 +1,24 @@
+import json
+
+import pytest
+
+from benchmarks.suite import compare, main
+
+
+def test_compare_flags_only_regressions_past_the_threshold():
+    results = {"render": {"us_per_call": (12.0, "us", "lower"), "calls_per_s": (70.0, "1/s", "higher")}}
+    baseline = {"render": {"us_per_call": 10.0, "calls_per_s": 100.0}}
+    rows, regressions = compare(results, baseline, threshold=0.25)
+    assert regressions == ["render.calls_per_s"]
+    assert rows[0][3] == pytest.approx(0.2)
+
+    _, regressions = compare(results, {}, threshold=0.25)
+    assert regressions == []
+
+
+def test_suite_runs_a_case_against_a_baseline(tmp_path, capsys):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({"metrics": {"prompt_render": {"render_us": 1e9}}}))
+    assert main(["--only", "prompt_render", "--baseline", str(path)]) == 0
+    out = capsys.readouterr().out
+    assert "prompt_render.render_us" in out and "No regressions" in out
@@ -0,0 +1,80 @@
+import io
+import sys
+import json
+import time
+import threading
+
+from utils.cli import Worker, serve_stdin
+
+
+def handle(worker, job):
+    return worker.handle(json.dumps(job))
+
+
+def test_bad_jobs_are_reported_not_raised():
+    worker = Worker(fake=True, cache_mode="off")
+    assert handle(worker, {"command": "nope"})["error"] == "unknown command 'nope'"
+    assert "missing field" in handle(worker, {"command": "dynamic"})["error"]
+    assert worker.handle("not json")["error"] == "job is not valid JSON"
+    assert worker.failed == 3 and worker.jobs == 3
+
+
+def test_evaluate_with_bad_args_does_not_kill_the_worker():
+    worker = Worker(fake=True, cache_mode="off")
+    reply = handle(worker, {"id": 7, "command": "evaluate", "args": ["--bogus"]})
+    assert reply["ok"] is False and reply["id"] == 7 and "invalid args" in reply["error"]
+    assert handle(worker, {"command": "evaluate", "args": "--fresh"})["ok"] is False
+
+
+def test_evaluate_rejects_backend_flags_that_differ_from_the_worker():
+    worker = Worker(fake=True, cache_mode="off", deadline=30.0)
+    for flag in (["--route"], ["--cache", "on"], ["--deadline", "5"], ["--max-prompt-tokens", "100"]):
+        reply = handle(worker, {"command": "evaluate", "args": flag})
+        assert reply["ok"] is False and flag[0] in reply["error"]
+
+
+def test_evaluate_runs_with_the_worker_client(tmp_path):
+    worker = Worker(fake=True, cache_mode="off")
+    out = tmp_path / "results.jsonl"
+    # --fake and --cache off match the worker, so they are accepted
+    args = ["--fake", "--cache", "off", "--out-jsonl", str(out), "--no-export", "--rps", "0"]
+    reply = handle(worker, {"command": "evaluate", "args": args})
+    assert reply["ok"] is True, reply
+    assert len(out.read_text().splitlines()) == 5
+
+
+def test_evaluate_jobs_are_serialised(monkeypatch):
+    import scripts.run_evaluation
+
+    running, overlaps = [], []
+
+    def slow_evaluation(argv, client=None):
+        running.append(argv)
+        overlaps.append(len(running))
+        time.sleep(0.05)
+        running.remove(argv)
+
+    monkeypatch.setattr(scripts.run_evaluation, "main", slow_evaluation)
+    worker = Worker(fake=True, cache_mode="off")
+    stdout = sys.stdout
+    threads = [threading.Thread(target=worker.evaluate, args=([f"--dataset={i}"],)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert overlaps == [1, 1, 1] and sys.stdout is stdout
+
+
+def test_stdin_worker_replies_per_line():
+    worker = Worker(fake=True, cache_mode="off")
+    jobs = "\n".join(json.dumps(j) for j in [
+        {"id": 1, "command": "dynamic", "user_query": "what is a loop?", "print_prompt": True},
+        {"id": 2, "command": "evaluate", "args": ["--bogus"]},
+        {"id": 3, "command": "dynamic", "user_query": "what is a loop?"},
+    ]) + "\n"
+    out = io.StringIO()
+    serve_stdin(worker, io.StringIO(jobs), out)
+    replies = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(r["id"], r["ok"]) for r in replies] == [(1, True), (2, False), (3, True)]
+    assert "what is a loop?" in replies[0]["result"]["prompt"][0]
+    assert "explanation" in replies[2]["result"]
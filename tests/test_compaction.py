@@ -0,0 +1,71 @@
+import pytest
+
+from utils.compaction import (CompactingClient, PromptTooLong, TokenEstimator, compact, dedupe_blocks,
+                              fit_budget, minify_json, raw_tokens, trim_examples)
+from utils.model_client import FakeClient
+from utils.routing import build_client, layers
+
+SCHEMA = '{\n  "topic": "x",\n  "items": [\n    1,\n    2\n  ]\n}'
+
+
+def test_minify_json_keeps_pseudo_json_and_prose():
+    text = f"Return:\n{SCHEMA}\nand {{\"n\": <integer>}} as shown."
+    out = minify_json(text)
+    assert '{"topic":"x","items":[1,2]}' in out
+    assert '{"n": <integer>}' in out and out.startswith("Return:\n")
+
+
+def test_compact_steps():
+    few_shot = "Intro\n\nExample 1: a\n\nExample 2: b\n\nExample 3: c\n\nNow answer."
+    assert trim_examples(few_shot, keep=1) == "Intro\n\nExample 1: a\n\nNow answer."
+    rules = "Always answer in JSON and never include commentary outside the object."
+    assert dedupe_blocks([rules + "\n\nsystem", rules + "\n\nbatch"]) == [rules + "\n\nsystem", "batch"]
+    assert compact("a   b  \n\n\n\nc") == "a b\n\nc"
+    # parts emptied by compaction keep their slot, so the cached prefix stays the same
+    assert compact(["system", "   \n", "task"]) == ["system", "", "task"]
+    assert compact([rules, rules, "task"]) == [rules, "", "task"]
+    history = compact([{"role": "user", "parts": ["x    y", {"text": SCHEMA}]}])
+    assert history == [{"role": "user", "parts": ["x y", {"text": '{"topic":"x","items":[1,2]}'}]}]
+
+
+def test_fit_budget_rejects_or_truncates_the_middle():
+    estimator = TokenEstimator()
+    long_part = "start " + "filler words here " * 200 + "the actual question?"
+    with pytest.raises(PromptTooLong):
+        fit_budget(["rules", long_part], 100, estimator)
+    rules, cut = fit_budget(["rules", long_part], 100, estimator, truncate=True)
+    assert rules == "rules" and cut.startswith("start") and cut.endswith("question?")
+    assert estimator.estimate([rules, cut]) <= 100
+
+
+def test_estimator_calibrates_from_telemetry(tmp_path):
+    events = [{"prompt_estimate": 100, "prompt_tokens": 130}] * 4 + [{"prompt_estimate": 100, "error": "x"}]
+    assert TokenEstimator.calibrate(events) is None
+    est = TokenEstimator.calibrate(events + [{"prompt_estimate": 100, "prompt_tokens": 130}])
+    assert est.scale == pytest.approx(1.3) and est.samples == 5
+
+    path = str(tmp_path / "calibration.json")
+    est.save(path)
+    loaded = TokenEstimator.load(path)
+    assert loaded.scale == pytest.approx(1.3)
+    assert loaded.estimate("hello world") == round(raw_tokens("hello world") * 1.3)
+    assert TokenEstimator.load(str(tmp_path / "missing.json")).scale == 1.0
+
+
+def test_compaction_is_opt_in():
+    def stages(client):
+        return [layer for layer in layers(client) if isinstance(layer, CompactingClient)]
+
+    assert stages(build_client("t", fake=True, cache_mode="off")) == []
+    assert stages(build_client("t", fake=True, cache_mode="off", compact=True))[0].compact
+    # a budget alone checks prompts without rewriting them
+    [budget_only] = stages(build_client("t", fake=True, cache_mode="off", max_prompt_tokens=50))
+    assert not budget_only.compact
+
+    seen = []
+    budget_only.client = FakeClient(reply=lambda text: seen.append(text) or "ok", latency=0.0)
+    budget_only.generate(["a    b"])
+    assert seen == ["a    b"]
+    with pytest.raises(PromptTooLong):
+        budget_only.generate(["word " * 500])
+    assert budget_only.rejected == 1
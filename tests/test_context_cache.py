@@ -0,0 +1,68 @@
+import asyncio
+
+from utils.context_cache import PrefixCacheClient, split_static
+from utils.model_client import FakeClient
+
+SYSTEM = "You are a tutor. " * 100
+
+
+def test_split_static():
+    assert split_static("one string") == (None, "one string")
+    assert split_static(["only part"]) == (None, ["only part"])
+    assert split_static(["sys", "examples", "task"]) == (["sys", "examples"], ["task"])
+
+
+def test_prefix_is_registered_once_and_reused():
+    backend = FakeClient(reply="ok", latency=0.0)
+    client = PrefixCacheClient(backend, min_tokens=10)
+    first = client.generate([SYSTEM, "task 1"])
+    second = client.generate([SYSTEM, "task 2"])
+    assert first.context_cache == second.context_cache == "hit"
+    assert len(backend._contexts) == 1
+    # only the suffix is sent; the prefix tokens are billed as cached
+    assert second.usage_metadata.cached_content_token_count == len(SYSTEM) // 4
+
+
+def test_short_prefixes_and_different_tools_are_handled_separately():
+    backend = FakeClient(reply="ok", latency=0.0)
+    client = PrefixCacheClient(backend, min_tokens=10_000)
+    resp = client.generate([SYSTEM, "task"])
+    assert getattr(resp, "context_cache", None) is None and backend._contexts == {}
+
+    client = PrefixCacheClient(backend, min_tokens=10)
+    client.generate([SYSTEM, "task"])
+    client.generate([SYSTEM, "task"], tools=[{"function_declarations": [{"name": "f"}]}])
+    assert len(backend._contexts) == 2
+
+
+class RefusesContexts(FakeClient):
+    def create_context(self, parts, tools=None, ttl=3600):
+        self.refused = getattr(self, "refused", 0) + 1
+        raise ValueError("model does not support explicit caching")
+
+
+def test_prefix_is_sent_in_full_when_the_backend_refuses_to_cache_it():
+    backend = RefusesContexts(reply=lambda text: text, latency=0.0)
+    client = PrefixCacheClient(backend, min_tokens=10)
+    first = client.generate([SYSTEM, "task 1"])
+    second = asyncio.run(client.agenerate([SYSTEM, "task 2"]))
+    assert SYSTEM.strip() in first.text and second.text.endswith("task 2")
+    assert getattr(second, "context_cache", None) is None
+    # the refusal is remembered instead of retried on every call
+    assert backend.refused == 1 and client.create_failures == 1
+
+
+def test_registry_survives_restarts_until_expiry(tmp_path):
+    registry = str(tmp_path / "contexts.json")
+    backend = FakeClient(reply="ok", latency=0.0)
+    PrefixCacheClient(backend, min_tokens=10, registry_path=registry).generate([SYSTEM, "task"])
+
+    restarted = PrefixCacheClient(backend, min_tokens=10, registry_path=registry)
+    restarted.generate([SYSTEM, "another task"])
+    assert len(backend._contexts) == 1
+
+    short_lived = PrefixCacheClient(FakeClient(reply="ok", latency=0.0), ttl=1, min_tokens=10)
+    short_lived.generate([SYSTEM, "task"])
+    # within the expiry margin: a fresh context is created instead of using a dying one
+    short_lived.generate([SYSTEM, "task"])
+    assert len(short_lived.client._contexts) == 2
@@ -0,0 +1,59 @@
+import json
+
+import utils.dataset as dataset
+from utils.dataset import ResultWriter, export_json, iter_samples, truncate_torn_tail
+
+
+def test_iter_json_array_across_read_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset, "READ_CHUNK", 7)
+    samples = [{"id": i, "text": "x" * i, "n": 12345} for i in range(20)]
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(samples, indent=2))
+    assert list(iter_samples(str(path))) == samples
+
+
+def test_writer_resumes_from_checkpoint(tmp_path):
+    out = str(tmp_path / "results.jsonl")
+    with ResultWriter(out) as w:
+        w.write({"id": 1, "score": 5})
+        w.write({"id": "1", "score": 6})
+
+    w = ResultWriter(out)
+    try:
+        assert w.is_done(1) and w.is_done("1") and not w.is_done(2)
+        w.write({"id": 2, "score": 7})
+    finally:
+        w.close()
+    assert [json.loads(l)["id"] for l in open(out)] == [1, "1", 2]
+
+
+def test_torn_tail_is_dropped_before_appending(tmp_path):
+    out = tmp_path / "results.jsonl"
+    out.write_text('{"id": 1}\n{"id": 2, "sco')
+    truncate_torn_tail(str(out))
+    assert out.read_text() == '{"id": 1}\n'
+
+
+def test_torn_checkpoint_id_is_dropped_and_rerun(tmp_path):
+    out = str(tmp_path / "results.jsonl")
+    with open(out, "w") as f:
+        f.write('{"id": 11}\n')
+    with open(out + ".ckpt", "w") as f:
+        f.write("11\n12")
+
+    with ResultWriter(out) as w:
+        assert w.is_done(11) and not w.is_done(12)
+        w.write({"id": 12})
+        w.write({"id": 13})
+    with open(out + ".ckpt") as f:
+        assert f.read() == "11\n12\n13\n"
+
+
+def test_export_keeps_one_result_per_id_in_dataset_order(tmp_path):
+    data = tmp_path / "data.json"
+    data.write_text(json.dumps([{"id": 2}, {"id": 1}]))
+    jsonl = tmp_path / "results.jsonl"
+    jsonl.write_text('{"id": 1, "v": "old"}\n{"id": 2, "v": "b"}\n{"id": 1, "v": "new"}\n')
+    out = tmp_path / "results.json"
+    assert export_json(str(jsonl), str(out), str(data)) == 2
+    assert json.loads(out.read_text()) == [{"id": 2, "v": "b"}, {"id": 1, "v": "new"}]
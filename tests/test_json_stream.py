@@ -0,0 +1,41 @@
+import pytest
+
+from utils.json_stream import ObjectStreamParser, StreamAbort, extract_json, stream_json
+
+
+def test_extract_json_skips_fences_and_prose():
+    text = 'Here you go:\n```json\n{"topic": "Fractions", "key_points": ["a", "b"]}\n```\nEnjoy!'
+    assert extract_json(text) == {"topic": "Fractions", "key_points": ["a", "b"]}
+
+
+def test_whitespace_inside_keys_is_kept():
+    assert extract_json('{"a b": 1, " padded ": {"x y": 2}}') == {"a b": 1, " padded ": {"x y": 2}}
+
+
+def test_fields_are_emitted_as_they_complete():
+    parser = ObjectStreamParser()
+    assert parser.feed('{"topic": "Fr') == []
+    assert parser.feed('actions", "n": 3') == [("topic", "Fractions")]
+    assert parser.feed("}") == [("n", 3)]
+    assert parser.close() == {"topic": "Fractions", "n": 3}
+
+
+def test_escaped_quotes_in_keys_and_values():
+    assert extract_json(r'{"say \"hi\"": "a \"quoted\" } brace"}') == {'say "hi"': 'a "quoted" } brace'}
+
+
+def test_stream_json_aborts_early_and_keeps_raw_text():
+    chunks = iter(['{"topic": "x",', ' oops', ' more text that is never read'])
+    with pytest.raises(StreamAbort) as info:
+        stream_json(chunks)
+    assert info.value.raw == '{"topic": "x", oops'
+
+
+def test_unclosed_object_fails_on_close():
+    with pytest.raises(StreamAbort):
+        extract_json('{"topic": "x"')
+
+
+def test_max_chars_stops_runaway_output():
+    with pytest.raises(StreamAbort):
+        stream_json(['{"topic": "', "x" * 100], max_chars=50)
@@ -0,0 +1,61 @@
+import asyncio
+import re
+
+from utils.judge import (BatchJudge, JUDGE_PROMPT, BATCH_PROMPT, build_batch_prompt,
+                         build_judge_prompt, parse_batch, read, score_problems)
+from utils.model_client import FAKE_SCORE, default_judge_reply, make_response, contents_to_text
+
+ITEMS = [{"id": i, "user_query": f"Q{i}?", "learner_data": {"level": "beginner"},
+          "expected": "ref", "model_answer": "answer"} for i in range(1, 7)]
+
+
+class DroppingJudge:
+    """Answers batches but leaves out sample `drop`, which only scores on its own."""
+
+    model_name = "scripted"
+
+    def __init__(self, drop):
+        self.drop = str(drop)
+        self.prompts = []
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        self.prompts.append(contents)
+        text = contents_to_text(contents)
+        ids = re.findall(r"^Sample id: (.+)$", text, re.MULTILINE)
+        if ids:
+            ids = [i for i in ids if i != self.drop]
+            return make_response("[" + ", ".join(f'{{"id": {i}, {FAKE_SCORE}}}' for i in ids) + "]")
+        return make_response(default_judge_reply(text))
+
+
+def test_single_and_batch_prompts_state_one_output_shape_each():
+    rubric = read(JUDGE_PROMPT)
+    assert "Return JSON" not in rubric
+    single = "\n".join(build_judge_prompt(rubric, ITEMS[0]))
+    batch = "\n".join(build_batch_prompt(rubric, read(BATCH_PROMPT), ITEMS[:2]))
+    assert "a single object" in single and "an array" not in single
+    assert "an array" in batch and "a single object" not in batch
+
+
+def test_batch_splits_on_missing_items_and_scores_everything():
+    client = DroppingJudge(drop=3)
+    judge = BatchJudge(client, max_k=6, rps=0, retries=0, concurrency=1)
+    results = asyncio.run(judge.evaluate(ITEMS))
+    assert len(results) == len(ITEMS)
+    assert all(not score_problems(r) for r in results)
+    assert judge.splits >= 1
+    # multiplicative decrease after a split
+    assert judge.k < 6
+
+
+def test_clean_batches_grow_k_back():
+    client = DroppingJudge(drop=None)
+    judge = BatchJudge(client, max_k=4, rps=0, retries=0, concurrency=1)
+    judge.k = 1
+    asyncio.run(judge.evaluate(ITEMS))
+    assert judge.k > 1 and judge.splits == 0
+
+
+def test_parse_batch_keeps_only_valid_objects():
+    text = '[{"id": 1, ' + FAKE_SCORE + '}, {"id": 2, "relevance": 9}]'
+    assert set(parse_batch(text)) == {"1"}
@@ -0,0 +1,59 @@
+import json
+
+from utils.lesson_schema import repair_lesson, validate_lesson, local_repair
+from utils.model_client import FakeClient
+
+LESSON = {
+    "topic": "Fractions", "grade_level": "8", "learning_objective": "add fractions",
+    "lesson_summary": "common denominators", "key_points": ["a", "b"],
+    "worked_examples": [{"id": 1, "problem": "p", "solution_steps": ["s"], "final_answer": "a"}],
+    "practice_problems": [{"id": 1, "question": "q", "difficulty": "easy", "hints": [], "solution": "s"}],
+    "assessment_quiz": [{"id": 1, "question": "q", "options": ["a", "b"], "answer": "a"}],
+    "follow_up_recommendations": ["r"], "references": ["ref"], "estimated_time_minutes": 30,
+}
+
+
+def test_valid_lesson_needs_no_calls():
+    assert validate_lesson(LESSON) == []
+    lesson, errors, calls = repair_lesson(dict(LESSON), FakeClient(reply="{}", latency=0.0))
+    assert (errors, calls) == ([], 0)
+
+
+def test_errors_have_paths():
+    bad = dict(LESSON, practice_problems=[{"id": 1, "question": "q", "difficulty": "trivial",
+                                                "hints": [], "solution": "s"}])
+    del bad["topic"]
+    assert validate_lesson(bad) == [("topic", "missing"),
+                                    ("practice_problems[0].difficulty", "expected one of ['easy', 'hard', 'medium']")]
+
+
+def test_local_repair_fixes_common_slips():
+    sloppy = dict(LESSON, estimated_time_minutes="15 minutes", key_points="one point",
+                  worked_examples=[{"problem": "p", "solution_steps": ["s"], "final_answer": 4}],
+                  practice_problems=[{"id": 1.0, "question": "q", "difficulty": "Easy", "hints": [],
+                                      "solution": "s"}])
+    fixed = local_repair(sloppy)
+    assert validate_lesson(fixed) == []
+    assert fixed["estimated_time_minutes"] == 15 and fixed["key_points"] == ["one point"]
+    assert fixed["worked_examples"][0] == {"id": 1, "problem": "p", "solution_steps": ["s"], "final_answer": "4"}
+
+
+def test_model_repair_only_patches_invalid_fields():
+    prompts = []
+
+    def reply(text):
+        prompts.append(text)
+        return json.dumps({"references": ["a textbook"], "topic": "should be ignored"})
+
+    broken = dict(LESSON, references=[])
+    lesson, errors, calls = repair_lesson(broken, FakeClient(reply=reply, latency=0.0))
+    assert errors == [] and calls == 1
+    assert lesson["references"] == ["a textbook"] and lesson["topic"] == LESSON["topic"]
+    assert "references" in prompts[0] and "worked_examples" not in prompts[0]
+
+
+def test_unusable_repair_replies_are_skipped():
+    broken = dict(LESSON, references=[])
+    for reply in ("not json at all", "[1, 2]"):
+        lesson, errors, calls = repair_lesson(broken, FakeClient(reply=reply, latency=0.0), max_rounds=2)
+        assert calls == 2 and errors == [("references", "expected at least 1 item(s)")]
@@ -0,0 +1,43 @@
+import json
+import math
+
+import numpy as np
+
+from utils.prescore import local_scores, decide, calibrate, save_thresholds, load_thresholds
+
+
+def test_local_scores_rank_copies_above_unrelated_answers():
+    ref = "Photosynthesis turns light, water and carbon dioxide into glucose and oxygen."
+    scores = local_scores([ref, "The French revolution began in 1789."], [ref, ref])
+    assert set(scores) == {"cosine", "rouge_l", "token_f1", "combined"}
+    assert scores["combined"][0] > 0.99
+    assert scores["combined"][1] < 0.2
+
+
+def test_decide_bands():
+    thresholds = {"low": 0.1, "high": 0.8}
+    assert list(decide([0.05, 0.1, 0.5, 0.8, 0.95], thresholds)) == ["fail", "fail", "judge", "pass", "pass"]
+
+
+def test_calibrate_without_support_stays_in_unit_range():
+    # too few samples for either band: no ±inf, just the ends of [0, 1]
+    t = calibrate([0.2, 0.5, 0.7], [5, 6, 7])
+    assert (t["low"], t["high"]) == (0.0, 1.0)
+    assert all(math.isfinite(v) for v in t.values())
+
+
+def test_calibrate_finds_bands():
+    s = np.linspace(0, 1, 40)
+    y = np.where(s > 0.7, 9, np.where(s < 0.3, 2, 6))
+    t = calibrate(s, y, min_support=3)
+    assert 0.0 <= t["low"] < 0.3 and 0.7 < t["high"] <= 1.0
+    assert t["slope"] > 0
+
+
+def test_save_thresholds_writes_standard_json(tmp_path):
+    path = tmp_path / "thresholds.json"
+    save_thresholds({"low": float("-inf"), "high": float("inf"), "slope": 10.0, "intercept": 0.0}, str(path))
+    text = path.read_text()
+    assert "Infinity" not in text
+    assert json.loads(text)["low"] == 0.0
+    assert load_thresholds(str(path))["high"] == 1.0
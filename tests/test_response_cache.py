@@ -0,0 +1,83 @@
+import time
+import asyncio
+
+import pytest
+
+from utils.model_client import FakeClient
+from utils.response_cache import CachedClient, ResponseCache, cache_key
+
+
+def client_with_cache(tmp_path, mode="on", **kwargs):
+    backend = FakeClient(reply=lambda text: f"reply to {text}", latency=0.0)
+    return backend, CachedClient(backend, ResponseCache(str(tmp_path / "responses.sqlite"), **kwargs), mode=mode)
+
+
+def test_key_ignores_dict_order_and_none_values():
+    a = cache_key("m", ["p"], None, {"temperature": 0.3, "top_p": 0.9, "top_k": None})
+    b = cache_key("m", ["p"], None, {"top_p": 0.9, "temperature": 0.3})
+    assert a == b
+    assert a != cache_key("m", ["p"], None, {"temperature": 0.4, "top_p": 0.9})
+    assert a != cache_key("other", ["p"], None, {"temperature": 0.3, "top_p": 0.9})
+
+
+def test_hits_skip_the_backend(tmp_path):
+    backend, client = client_with_cache(tmp_path)
+    first = client.generate(["hello"])
+    second = client.generate(["hello"])
+    assert second.text == first.text == "reply to hello"
+    assert getattr(second, "cached", False) and backend.calls == 1
+    assert (client.hits, client.misses) == (1, 1)
+
+
+def test_off_and_refresh_modes(tmp_path):
+    backend, off = client_with_cache(tmp_path, mode="off")
+    off.generate(["x"])
+    off.generate(["x"])
+    assert backend.calls == 2
+
+    backend, refresh = client_with_cache(tmp_path, mode="refresh")
+    refresh.generate(["y"])
+    refresh.generate(["y"])
+    assert backend.calls == 2
+    _, on = client_with_cache(tmp_path)
+    assert on.generate(["y"]).cached
+
+
+def test_async_hits_skip_the_backend(tmp_path):
+    backend, client = client_with_cache(tmp_path)
+
+    async def go():
+        return [await client.agenerate(["hello"]) for _ in range(2)]
+
+    first, second = asyncio.run(go())
+    assert second.text == first.text and second.cached and backend.calls == 1
+
+
+def test_unknown_mode_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setenv("SMARTTUTOR_CACHE", "yes")
+    with pytest.raises(ValueError, match="on, off, refresh"):
+        CachedClient(FakeClient(), ResponseCache(str(tmp_path / "responses.sqlite")))
+
+
+def test_stream_is_cached_only_when_fully_consumed(tmp_path):
+    backend, client = client_with_cache(tmp_path)
+    stream = client.generate_stream(["long prompt " * 5])
+    next(stream)
+    stream.close()
+    assert "".join(client.generate_stream(["long prompt " * 5])).startswith("reply to")
+    assert backend.calls == 2
+    assert "".join(client.generate_stream(["long prompt " * 5])).startswith("reply to")
+    assert backend.calls == 2
+
+
+def test_lru_eviction_and_expiry(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=10, evict_every=1)
+    cache.put("old", "m", "aaaaaa")
+    time.sleep(0.01)
+    cache.put("new", "m", "bbbbbb")
+    assert cache.get("old") is None and cache.get("new")["text"] == "bbbbbb"
+
+    expiring = ResponseCache(str(tmp_path / "other.sqlite"), max_age=0.01)
+    expiring.put("k", "m", "text")
+    time.sleep(0.02)
+    assert expiring.get("k") is None
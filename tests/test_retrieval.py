@@ -0,0 +1,84 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from utils.retrieval import VectorIndex, chunk_text, retrieve_context, main
+
+DOCS = {
+    "bio": "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "cs": "A binary search halves the sorted search interval on every comparison.",
+    "hist": "The printing press spread books across Europe in the fifteenth century.",
+}
+
+
+def build(path):
+    index = VectorIndex(str(path))
+    for subject, text in DOCS.items():
+        index.add([text], source=f"{subject}.md", subject=subject)
+    return index
+
+
+def test_chunk_text_overlaps_long_paragraphs():
+    words = [f"w{i}" for i in range(50)]
+    chunks = chunk_text(" ".join(words), chunk_words=20, overlap=5)
+    assert chunks[0].split()[-5:] == chunks[1].split()[:5]
+    assert chunks[-1].split()[-1] == "w49"
+
+
+def test_overlap_must_be_smaller_than_the_chunk(tmp_path, capsys):
+    for overlap in (20, 25, -1):
+        with pytest.raises(ValueError):
+            chunk_text("a b c", chunk_words=20, overlap=overlap)
+    with pytest.raises(SystemExit):
+        main(["--index", str(tmp_path), "add", "notes.md", "--chunk-words", "10", "--overlap", "10"])
+    assert "--overlap" in capsys.readouterr().err
+
+
+def test_readding_a_source_continues_its_chunk_ids(tmp_path):
+    index = build(tmp_path)
+    index.add(["Binary search needs sorted input.", "Its cost is logarithmic."], source="cs.md", subject="cs")
+    index = VectorIndex(str(tmp_path))
+    index.add(["A linear search checks every item."], source="cs.md", subject="cs")
+    ids = [index.chunk(row)["id"] for row in range(len(index))]
+    assert len(set(ids)) == len(ids)
+    assert [i for i in ids if i.startswith("cs.md")] == ["cs.md#0", "cs.md#1", "cs.md#2", "cs.md#3"]
+
+
+def test_non_string_subject_does_not_crash_search(tmp_path):
+    index = build(tmp_path)
+    assert index.search("binary search", k=1, subject=7) == []
+    assert "binary search" in retrieve_context(index, "binary search", {"subject": ["cs"]})
+
+
+def test_add_search_and_reopen(tmp_path):
+    build(tmp_path)
+    index = VectorIndex(str(tmp_path))
+    assert len(index) == 3
+    hit = index.search("how does binary search work", k=1)[0]
+    assert hit["source"] == "cs.md"
+    assert index.search("binary search", k=3, subject="bio")[0]["subject"] == "bio"
+    assert "binary search" in retrieve_context(index, "binary search", {"subject": "cs"})
+
+
+def test_orphan_rows_from_a_crashed_add_are_dropped(tmp_path):
+    build(tmp_path)
+    # simulate a crash after the sidecars were appended but before the manifest
+    with open(tmp_path / "chunks.jsonl", "ab") as f:
+        f.write(b'{"id": "orphan", "text": "half written')
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.ones((2, 384), dtype=np.float32).tobytes())
+    with open(tmp_path / "subjects.u16", "ab") as f:
+        f.write(np.zeros(2, dtype=np.uint16).tobytes())
+
+    index = VectorIndex(str(tmp_path))
+    assert os.path.getsize(tmp_path / "vectors.f32") == 3 * 384 * 4
+    index.add(["Mitochondria release energy from glucose during respiration."], source="bio2.md", subject="bio")
+    assert len(index) == 4
+    for row in range(len(index)):
+        chunk = index.chunk(row)
+        assert chunk["id"] != "orphan"
+        assert np.allclose(index.vectors[row], index.embedder.embed([chunk["text"]])[0])
+    with open(tmp_path / "chunks.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["source"] for line in f] == ["bio.md", "cs.md", "hist.md", "bio2.md"]
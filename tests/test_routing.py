@@ -0,0 +1,105 @@
+import asyncio
+import itertools
+
+import pytest
+
+from utils.model_client import FakeClient, ModelClient, TransientError, make_response
+from utils.routing import HedgedClient, RoutedClient, Tier, deadline, cache_counts, build_client
+
+_names = itertools.count()
+
+
+def fake(**kwargs):
+    # trackers are process-wide per model name; keep tests independent
+    return FakeClient(reply="ok", model_name=f"test-model-{next(_names)}", **kwargs)
+
+
+class SlowFirst(ModelClient):
+    """The first call stalls; later ones answer at once."""
+
+    def __init__(self, stall=1.0):
+        self.model_name = f"test-model-{next(_names)}"
+        self.stall = stall
+        self.calls = 0
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(self.stall)
+            return make_response("slow")
+        return make_response("fast")
+
+
+def test_slow_calls_are_hedged():
+    client = HedgedClient(SlowFirst(), initial_delay=0.02, max_hedge_ratio=1.0)
+    resp = asyncio.run(client.agenerate(["x"]))
+    assert resp.text == "fast"
+    assert (client.hedges, client.hedge_wins) == (1, 1)
+
+
+def test_deadline_raises_a_transient_timeout():
+    client = HedgedClient(SlowFirst(stall=5.0), deadline=60.0)
+
+    async def go():
+        with deadline(0.05):
+            return await client.agenerate(["x"])
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(go())
+    # the attempt the deadline cancelled counts against the model
+    assert client.tracker.error_rate() == 1.0
+
+
+def test_hedge_that_lost_the_race_is_not_an_error():
+    client = HedgedClient(SlowFirst(), initial_delay=0.02, max_hedge_ratio=1.0)
+    asyncio.run(client.agenerate(["x"]))
+    assert len(client.tracker) == 2 and client.tracker.error_rate() == 0.0
+
+
+def test_blocking_deadline_counts_the_attempt_as_failed():
+    client = HedgedClient(fake(latency=0.3), deadline=0.05)
+    with pytest.raises(TimeoutError):
+        client.generate(["x"])
+    assert len(client.tracker) == 1 and client.tracker.error_rate() == 1.0
+    client._pool.shutdown(wait=True)
+    # the abandoned thread finishing later doesn't record a second, successful sample
+    assert len(client.tracker) == 1
+
+
+def test_router_prefers_cheap_tiers_that_fit():
+    small, standard = fake(latency=0.0), fake(latency=0.0)
+    router = RoutedClient([Tier("small", small, 50, 4.0), Tier("standard", standard, 10_000, 8.0),
+                           Tier("large", fake(latency=0.0), 10**6, 20.0)], task="judge")
+    assert [t.name for t in router.tiers] == ["small", "standard"]
+    router.generate(["short prompt"])
+    router.generate(["a much longer prompt " * 50])
+    assert router.routes() == {"small": 1, "standard": 1}
+
+
+def test_router_falls_through_on_transient_errors():
+    flaky = fake(latency=0.0, fail_rate=1.0)
+    router = RoutedClient([Tier("small", flaky, 10_000, 4.0), Tier("standard", fake(latency=0.0), 10_000, 8.0)],
+                          task="judge")
+    assert router.generate(["x"]).text == "ok"
+    with pytest.raises(TransientError):
+        RoutedClient([Tier("small", fake(latency=0.0, fail_rate=1.0), 10_000, 4.0)], task="judge").generate(["x"])
+
+
+def test_degraded_tiers_move_to_the_back():
+    slow, ok = fake(latency=0.0), fake(latency=0.0)
+    tiers = [Tier("small", slow, 10_000, 0.5), Tier("standard", ok, 10_000, 8.0)]
+    for _ in range(10):
+        tiers[0].tracker.observe(2.0)
+    router = RoutedClient(tiers, task="judge", probe_every=3)
+    assert [t.name for t in router.candidates(["x"])] == ["standard", "small"]
+    router.candidates(["x"])
+    # every probe_every-th call tries the degraded tier first so it can recover
+    assert [t.name for t in router.candidates(["x"])] == ["small", "standard"]
+
+
+def test_build_client_stacks_count_cache_hits(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = build_client("t", task="judge", fake=True, route=True, cache_mode="on")
+    client.generate(["same prompt"])
+    client.generate(["same prompt"])
+    assert cache_counts(client) == (1, 1)
@@ -0,0 +1,81 @@
+import time
+import asyncio
+
+import pytest
+
+from utils.model_client import TransientError
+from utils.runner import TokenBucket, call_with_retry, run_all, run_stream
+
+
+def test_run_all_keeps_order_and_bounds_concurrency():
+    active = peak = 0
+
+    async def worker(item):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01 * (5 - item))
+        active -= 1
+        return item * 10
+
+    assert asyncio.run(run_all(list(range(5)), worker, concurrency=2)) == [0, 10, 20, 30, 40]
+    assert peak == 2
+
+
+def test_transient_errors_are_retried_and_others_are_returned():
+    attempts = {"flaky": 0, "broken": 0}
+
+    async def worker(item):
+        attempts[item] += 1
+        if item == "flaky" and attempts[item] < 3:
+            raise TransientError("503")
+        if item == "broken":
+            raise ValueError("bad request")
+        return "ok"
+
+    results = asyncio.run(run_all(["flaky", "broken"], worker, retries=4, base_delay=0.001))
+    assert results[0] == "ok" and attempts["flaky"] == 3
+    assert isinstance(results[1], ValueError) and attempts["broken"] == 1
+
+
+def test_retries_give_up_after_the_limit():
+    async def always_busy():
+        raise TransientError("429")
+
+    with pytest.raises(TransientError):
+        asyncio.run(call_with_retry(always_busy, retries=2, base_delay=0.001))
+
+
+def test_token_bucket_limits_the_rate():
+    async def go():
+        bucket = TokenBucket(20, capacity=1)
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(go()) >= 0.18
+
+
+def test_run_stream_pulls_lazily():
+    pulled = []
+
+    def items():
+        for i in range(6):
+            pulled.append(i)
+            yield i
+
+    async def worker(item):
+        await asyncio.sleep(0.001)
+        return item
+
+    async def go():
+        seen = []
+        async for item, result in run_stream(items(), worker, concurrency=2):
+            if not seen:
+                # only the first `concurrency` items were pulled before the first result
+                assert len(pulled) == 2
+            seen.append(result)
+        return seen
+
+    assert sorted(asyncio.run(go())) == list(range(6))
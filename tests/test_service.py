@@ -0,0 +1,119 @@
+import json
+import asyncio
+
+import pytest
+
+from utils import service
+from utils.model_client import FakeClient
+from utils.service import TutorService, serve, HTTPError
+from utils.sessions import SessionStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def started(**kwargs):
+    svc = TutorService(FakeClient(reply="an explanation", latency=0.05), **kwargs)
+    svc.start()
+    return svc
+
+
+def test_coalesced_session_requests_record_one_exchange():
+    async def go():
+        svc = await started(sessions=SessionStore())
+        body = {"user_query": "what is recursion?", "session_id": "s1"}
+        results = await asyncio.gather(*(svc.handle("dynamic", body) for _ in range(3)))
+        await svc.stop()
+        return svc, results
+
+    svc, results = run(go())
+    assert results == [{"explanation": "an explanation"}] * 3
+    assert svc.upstream_calls == 1 and svc.coalescer.joined == 2
+    assert [role for role, _, _ in svc.sessions.get("s1").turns] == ["user", "model"]
+
+
+def test_each_session_gets_its_own_exchange():
+    async def go():
+        svc = await started(sessions=SessionStore())
+        await asyncio.gather(*(svc.handle("dynamic", {"user_query": "hi", "session_id": sid})
+                               for sid in ("a", "b")))
+        await svc.stop()
+        return svc
+
+    svc = run(go())
+    assert svc.upstream_calls == 2
+    assert all(len(svc.sessions.get(sid).turns) == 2 for sid in ("a", "b"))
+
+
+def test_saturated_queue_answers_429():
+    async def go():
+        svc = await started(workers=1, queue_size=1)
+        results = await asyncio.gather(*(svc.handle("dynamic", {"user_query": f"q{i}"}) for i in range(4)),
+                                       return_exceptions=True)
+        await svc.stop()
+        return svc, results
+
+    svc, results = run(go())
+    rejected = [r for r in results if isinstance(r, HTTPError)]
+    # one request in flight plus one queued; the rest are turned away
+    assert rejected and all(r.status == 429 for r in rejected)
+    assert svc.rejected == len(rejected) and len(rejected) + svc.upstream_calls == 4
+
+
+def test_field_types_are_validated():
+    async def go():
+        svc = await started()
+        try:
+            await svc.handle("dynamic", {"user_query": 5})
+        finally:
+            await svc.stop()
+
+    with pytest.raises(HTTPError) as e:
+        run(go())
+    assert e.value.status == 400 and "user_query" in str(e.value)
+
+
+async def exchange(port, raw):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = json.loads(await reader.readexactly(int(headers["content-length"])))
+    writer.close()
+    return status, body
+
+
+def post(path, payload):
+    body = json.dumps(payload).encode()
+    return (f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+def test_http_errors_are_answered(monkeypatch):
+    async def broken_finish(svc, resp):
+        raise RuntimeError("repair blew up")
+
+    monkeypatch.setitem(service.FLOWS, "lesson", (service.FLOWS["lesson"][0], broken_finish))
+
+    async def go():
+        svc = TutorService(FakeClient(reply="{}", latency=0.0))
+        server = await serve(svc, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return [
+                await exchange(port, post("/dynamic", {"user_query": 5})),
+                await exchange(port, b"POST /dynamic HTTP/1.1\r\nContent-Length: abc\r\n\r\n"),
+                await exchange(port, post("/lesson", {"topic": "fractions", "grade": 5})),
+                await exchange(port, post("/dynamic", {"user_query": "ok"})),
+            ]
+        finally:
+            server.close()
+            await svc.stop()
+
+    replies = run(go())
+    assert [status for status, _ in replies] == [400, 400, 500, 200]
+    assert "RuntimeError" in replies[2][1]["error"]
@@ -0,0 +1,61 @@
+import os
+
+from utils.context_cache import estimate_tokens
+from utils.sessions import SessionStore, SQLiteSessions
+from utils.strategies import read
+
+
+def chat(store, session_id, n, words=30):
+    for i in range(n):
+        store.add_exchange(session_id, f"question {i} " + "why " * words, f"Answer {i}. " + "because " * words)
+
+
+def test_new_session_has_no_context():
+    assert SessionStore().context("s") == ""
+
+
+def test_recent_turns_are_rendered_in_order():
+    store = SessionStore()
+    store.add_exchange("s", "What is a loop?", "A loop repeats steps.")
+    context = store.context("s")
+    assert context.index("Learner: What is a loop?") < context.index("Tutor: A loop repeats steps.")
+    # cached until the next turn
+    assert store.context("s") is context
+    store.add_turn("s", "user", "And recursion?")
+    assert "And recursion?" in store.context("s")
+
+
+def test_old_turns_fold_into_a_summary_within_budget():
+    store = SessionStore(budget=300, summary_budget=80)
+    chat(store, "s", 10)
+    context = store.context("s")
+    session = store.get("s")
+    assert session.folded > 0 and store.summaries >= 1
+    assert "Summary of earlier turns" in context and "Answer 9." in context
+    assert session.summary_tokens <= 80
+    with open("prompts/conversation_context.txt", encoding="utf-8") as f:
+        overhead = estimate_tokens(f.read())
+    assert estimate_tokens(context) <= 300 + overhead
+
+
+def test_sqlite_backend_reloads_evicted_sessions(tmp_path):
+    backend = SQLiteSessions(str(tmp_path / "sessions.sqlite"))
+    store = SessionStore(budget=300, summary_budget=80, max_sessions=1, backend=backend)
+    chat(store, "a", 6)
+    before = store.context("a")
+    store.context("b")
+    assert store.evicted == 1
+
+    reloaded = SessionStore(budget=300, summary_budget=80, backend=backend)
+    assert reloaded.context("a") == before
+    assert len(reloaded.get("a").turns) == 12
+
+
+def test_prompt_files_are_reread_when_they_change(tmp_path):
+    path = tmp_path / "prompt.txt"
+    path.write_text("  first version \n")
+    assert read(str(path)) == "first version"
+    path.write_text("second version\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert read(str(path)) == "second version"
@@ -0,0 +1,75 @@
+import json
+import asyncio
+
+from utils.model_client import FakeClient
+from utils.strategies import dynamic, dynamic_prompt
+from utils.sweep import Sweep, Cell, config_grid
+
+SAMPLES = [{"id": i, "user_query": f"question {i}", "learner_data": {"level": "beginner"},
+            "expected": "ref"} for i in range(6)]
+
+
+def judge_by_temperature(prompt_text):
+    # lower temperature answers score higher, so halving has a clear winner
+    temp = float(prompt_text.split("temp=")[1].split()[0]) if "temp=" in prompt_text else 0.5
+    total = round(10 - 10 * temp)
+    return json.dumps({"relevance": 2, "style": 2, "accuracy": 2, "completeness": 2, "clarity": 2,
+                       "total_score": total, "comments": "ok"})
+
+
+class TempEcho(FakeClient):
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        self.reply = f"answer temp={(generation_config or {}).get('temperature', 0.5)} end"
+        return await super().agenerate(contents, generation_config, tools)
+
+
+def test_config_grid():
+    assert config_grid(temperature=[0.2, 0.8], top_p=[0.9], top_k=[]) == [
+        {"temperature": 0.2, "top_p": 0.9}, {"temperature": 0.8, "top_p": 0.9}]
+    assert config_grid(temperature=None) == [{}]
+
+
+def test_halving_keeps_the_best_cell_and_times_only_the_model_call():
+    cells = [Cell("zero-shot", {"temperature": t}) for t in (0.1, 0.5, 0.9, 0.7)]
+    sweep = Sweep(TempEcho(latency=0.01), FakeClient(reply=judge_by_temperature, latency=0.0),
+                  "rubric", concurrency=4, rps=10)
+    ranked = asyncio.run(sweep.run(cells, SAMPLES, initial=1, eta=2))
+
+    assert ranked[0].config == {"temperature": 0.1} and ranked[0].eliminated_in is None
+    # 4 cells x 1 sample, then 2 x 2, then 1 x 3
+    assert sum(len(c.scores) for c in cells) == 4 + 4 + 3
+    assert {c.eliminated_in for c in ranked[1:]} == {0, 1}
+    # the limiter spreads 22 calls over ~1.2s; none of that wait is model latency
+    assert max(max(c.latencies) for c in cells) < 0.1
+
+
+class CacheHit(FakeClient):
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        resp = await super().agenerate(contents, generation_config, tools)
+        resp.cached = True
+        return resp
+
+
+def test_cache_hits_are_scored_but_not_timed():
+    cell = Cell("zero-shot", {})
+    sweep = Sweep(CacheHit(), FakeClient(reply=judge_by_temperature), "rubric", rps=0)
+    asyncio.run(sweep.run([cell], SAMPLES[:2], initial=2))
+
+    assert len(cell.scores) == 2 and cell.latencies == []
+    assert cell.row()["p50_latency_s"] is None
+
+
+def test_dynamic_strategy_includes_retrieved_course_material(tmp_path, monkeypatch):
+    from utils import strategies
+    from utils.retrieval import VectorIndex
+
+    index = VectorIndex(str(tmp_path))
+    index.add(["Recursion is when a function calls itself on a smaller input."], source="cs.md")
+    monkeypatch.setattr(strategies, "_index", index)
+
+    sample = {"user_query": "what is recursion?", "learner_data": {"level": "beginner"},
+              "history": "Learner: hi"}
+    [prompt] = dynamic(sample)
+    assert "calls itself on a smaller input" in prompt and "Learner: hi" in prompt
+    assert prompt == dynamic_prompt(sample["user_query"], sample["learner_data"], index=index,
+                                    history="Learner: hi")
@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from utils.model_client import FakeClient, TransientError
+from utils.telemetry import TelemetrySink, get_sink, instrumented, parse_legacy_line, read_events, summarize
+
+
+def test_sink_batches_and_flushes(tmp_path):
+    path = str(tmp_path / "t.jsonl")
+    sink = TelemetrySink(path, flush_interval=0.01)
+    for i in range(100):
+        sink.record({"i": i})
+    sink.flush()
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["i"] for line in f] == list(range(100))
+    sink.close()
+    sink.record({"i": "after close"})
+    assert sum(1 for _ in open(path, encoding="utf-8")) == 100
+
+
+def test_instrumented_client_logs_usage_and_errors():
+    sink = get_sink()
+    sink.flush()
+    before = os.path.getsize(sink.path) if os.path.exists(sink.path) else 0
+
+    client = instrumented(FakeClient(reply="four words of reply", latency=0.0), tag="unit-test")
+    client.generate(["a prompt of some length"], {"temperature": 0.2})
+    failing = instrumented(FakeClient(latency=0.0, fail_rate=1.0), tag="unit-test")
+    with pytest.raises(TransientError):
+        failing.generate(["x"])
+    assert "".join(client.generate_stream(["streamed"])) == "four words of reply"
+    sink.flush()
+
+    with open(sink.path, encoding="utf-8") as f:
+        f.seek(before)
+        ok, failed, streamed = [json.loads(line) for line in f]
+    assert ok["tag"] == "unit-test" and ok["generation_config"] == {"temperature": 0.2}
+    assert ok["prompt_tokens"] > 0 and ok["prompt_estimate"] > 0 and ok["cache"] == "miss"
+    assert "simulated 503" in failed["error"]
+    assert streamed["completion_chars"] == len("four words of reply") and streamed["ttft_s"] is not None
+
+
+def test_legacy_lines_are_imported(tmp_path):
+    assert parse_legacy_line("one-shot | prompt:961 cand:748 total:1709")["prompt_tokens"] == 961
+    event = parse_legacy_line("[one-shot] Tokens → prompt:961 completion:796 total:1757 | temp=0.8 top_p=0.9")
+    assert event["tag"] == "one-shot" and event["generation_config"] == {"temperature": 0.8, "top_p": 0.9}
+    assert parse_legacy_line("something else") is None
+
+    path = tmp_path / "mixed.log"
+    path.write_text('{"tag": "new", "latency_s": 0.5}\n\none-shot | prompt:1 cand:2 total:3\nnoise\n')
+    assert [e["tag"] for e in read_events(str(path))] == ["new", "one-shot"]
+
+
+def test_summarize_per_tag():
+    events = [{"tag": "a", "latency_s": s, "prompt_tokens": 1000, "completion_tokens": 100,
+               "cache": "hit" if s < 0.2 else "miss"} for s in (0.1, 0.2, 0.3, 0.4)]
+    events.append({"tag": "b", "error": "boom"})
+    a, b = summarize(events, price_in=1.0, price_out=10.0)
+    assert (a["tag"], a["calls"], a["cache_hit_rate"], a["p50_s"], a["p95_s"]) == ("a", 4, 0.25, 0.2, 0.4)
+    assert a["cost_usd"] == pytest.approx((4000 * 1.0 + 400 * 10.0) / 1e6)
+    assert b["errors"] == 1 and b["p50_s"] is None
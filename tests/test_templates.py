@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from utils.templates import Template, TemplateError, load_template
+
+
+def test_only_identifiers_are_placeholders():
+    tpl = Template('Hi {name}! JSON stays: { "level": "x" } and {not a slot} and {{name}}.')
+    assert tpl.placeholders == {"name"}
+    assert tpl.render(name="Ada") == 'Hi Ada! JSON stays: { "level": "x" } and {not a slot} and {Ada}.'
+
+
+def test_values_are_not_rescanned():
+    tpl = Template("{a} then {b}")
+    assert tpl.render(a="{b}", b="B") == "{b} then B"
+
+
+def test_missing_or_unknown_values_raise():
+    tpl = Template("{a} {b}", name="t.txt")
+    with pytest.raises(TemplateError, match=r"t.txt: missing placeholders \['b'\], unknown \['c'\]"):
+        tpl.render(a="1", c="3")
+
+
+def test_loader_reparses_only_on_mtime_change(tmp_path):
+    path = tmp_path / "p.txt"
+    path.write_text("v1 {x}\n")
+    first = load_template(str(path))
+    assert load_template(str(path)) is first
+    assert load_template(str(path), strip=True).render(x="!") == "v1 !"
+
+    path.write_text("v2 {x}\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_template(str(path)).render(x="!") == "v2 !\n"
+
+
+def test_repo_prompts_render():
+    values = {"user_query": "What is recursion?", "learner_data": "{}"}
+    for name in ("system_prompt_dynamic.txt", "user_prompt_dynamic.txt"):
+        tpl = load_template(os.path.join("prompts", name))
+        assert "What is recursion?" in tpl.render(**{k: values[k] for k in tpl.placeholders})
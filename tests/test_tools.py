@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Literal
+
+from utils.context_cache import PrefixCacheClient, split_static
+from utils.model_client import FakeClient, ModelClient, make_response
+from utils.tools import ToolRegistry, as_history, run_tool_loop
+
+
+def registry():
+    tools = ToolRegistry()
+
+    @tools.register(idempotent=True)
+    def add(a: int, b: int = 0):
+        """Adds two numbers
+
+        Args:
+            a: first number
+            b: second number
+        """
+        return a + b
+
+    @tools.register
+    def units(unit: Literal["C", "F"]):
+        return {"unit": unit}
+
+    return tools
+
+
+def call_response(name, args):
+    part = SimpleNamespace(text=None, function_call=SimpleNamespace(name=name, args=args))
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class AlwaysCalls(ModelClient):
+    """Asks for a tool call on every request and records what it was sent."""
+    model_name = "scripted"
+
+    def __init__(self):
+        self.requests = []
+
+    def generate(self, contents, generation_config=None, tools=None):
+        self.requests.append((contents, tools))
+        return call_response("add", {"a": len(self.requests), "b": 1})
+
+
+def test_declarations_follow_signature_and_docstring():
+    decls = {d["name"]: d for d in registry().declarations()[0]["function_declarations"]}
+    add = decls["add"]
+    assert add["description"] == "Adds two numbers"
+    assert add["parameters"]["properties"]["a"] == {"type": "integer", "description": "first number"}
+    assert add["parameters"]["required"] == ["a"]
+    assert decls["units"]["parameters"]["properties"]["unit"] == {"type": "string", "enum": ["C", "F"]}
+
+
+def test_calls_run_in_order_and_idempotent_results_are_memoized():
+    tools = registry()
+    results = asyncio.run(tools.run_calls([("add", {"a": 2, "b": 3}), ("nope", {}), ("add", {"c": 1})]))
+    assert results[0] == 5
+    assert "unknown tool" in results[1]["error"] and "error" in results[2]
+    # defaults are applied before the memo lookup
+    assert asyncio.run(tools.run_calls([("add", {"a": 1})])) == [1]
+    assert asyncio.run(tools.run_calls([("add", {"a": 1, "b": 0})])) == [1]
+    assert tools.tools["add"].calls == 2 and tools.tools["add"].memo_hits == 1
+
+
+def test_history_keeps_the_system_prompt_cacheable():
+    history = as_history(["system prompt", "task"])
+    prefix, suffix = split_static(history + [{"role": "model", "parts": [{"text": "hi"}]}])
+    assert prefix == [{"role": "user", "parts": ["system prompt"]}]
+    assert suffix[0] == {"role": "user", "parts": ["task"]} and len(suffix) == 2
+
+    client = PrefixCacheClient(FakeClient(reply="done", latency=0.0), min_tokens=0)
+    tools = registry()
+    for task in ("first task", "second task"):
+        resp, _ = run_tool_loop(client, ["system prompt " * 50, task], tools)
+    assert getattr(resp, "context_cache", None) == "hit"
+    assert len(client._contexts) == 1
+
+
+def test_final_call_after_max_turns_still_sends_tools():
+    client = AlwaysCalls()
+    tools = registry()
+    resp, history = run_tool_loop(client, ["system", "task"], tools, max_turns=2)
+    assert len(client.requests) == 3
+    assert all(sent is not None for _, sent in client.requests)
+    assert [turn["role"] for turn in history] == ["user", "model", "function", "model", "function"]
+
+
+def test_text_reply_ends_the_loop():
+    class Answers(ModelClient):
+        def generate(self, contents, generation_config=None, tools=None):
+            return make_response("plain answer")
+
+    resp, history = run_tool_loop(Answers(), "question", registry())
+    assert resp.text == "plain answer" and history == [{"role": "user", "parts": ["question"]}]
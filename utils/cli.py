@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+# Startup stays at argparse + json: the client stack, prompt strategies and the
+# evaluation script are imported only on the paths that use them, so `--help`
+# and `--print-prompt` never load the model SDK.
+
+STRATEGY_COMMANDS = ["zero-shot", "one-shot", "multi-shot", "cot", "dynamic", "smart-tutor"]
+LESSON_COMMANDS = {"zero-shot", "one-shot", "smart-tutor"}
+TEXT_COMMANDS = {"dynamic", "cot"}
+CONFIG_FIELDS = ("temperature", "top_p", "top_k", "max_output_tokens")
+# run_evaluation flag -> Worker attribute it must agree with
+WORKER_FLAGS = {"fake": "fake", "route": "route", "cache": "cache_mode", "deadline": "deadline",
+                "compact": "compact", "max_prompt_tokens": "max_prompt_tokens"}
+
+
+class JobError(Exception):
+    """Raised for malformed jobs; reported back to the caller instead of stopping the worker."""
+
+
+def finish(command, client, resp):
+    from utils.json_stream import extract_json, StreamAbort
+
+    text = resp.text
+    if command in TEXT_COMMANDS:
+        return {"explanation": text}
+    try:
+        data = extract_json(text)
+    except StreamAbort as e:
+        if command in LESSON_COMMANDS:
+            raise JobError(f"model returned unparseable JSON: {e}")
+        return {"text": text}
+    if command not in LESSON_COMMANDS:
+        return {"data": data}
+
+    from utils.lesson_schema import repair_lesson, format_errors
+    data, errors, calls = repair_lesson(data, client)
+    out = {"lesson": data, "repair_calls": calls}
+    if errors:
+        out["invalid"] = format_errors(errors)
+    return out
+
+
+class Worker:
+    """
+    Runs jobs against clients that are built once and then kept warm: response
+    and context caches, latency trackers and parsed templates all carry over
+    from one job to the next.
+
+    A job is a JSON object: {"command": "<strategy>", "topic"/"grade" or
+    "user_query"/"learner_data", "generation_config": {...}, "print_prompt": bool}
+    or {"command": "evaluate", "args": [<run_evaluation flags>]}. An optional
+    "id" is echoed in the reply.
+
+    Evaluate jobs run one at a time, even across socket connections: they swap
+    the process-wide sys.stdout and share the results files.
+    """
+
+    def __init__(self, fake=False, route=False, cache_mode=None, deadline=60.0, compact=False,
+                 max_prompt_tokens=None):
+        self.fake = fake
+        self.route = route
+        self.cache_mode = cache_mode
+        self.deadline = deadline
+        self.compact = compact
+        self.max_prompt_tokens = max_prompt_tokens
+        self.jobs = 0
+        self.failed = 0
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._evaluate_lock = threading.Lock()
+
+    def client(self, task):
+        with self._lock:
+            if task not in self._clients:
+                from utils.routing import build_client
+
+                reply = None
+                if self.fake and task == "lesson":
+                    from utils.service import fake_lesson_reply
+                    reply = fake_lesson_reply
+                self._clients[task] = build_client("cli" if task == "lesson" else task, task=task,
+                                                   fake=self.fake, route=self.route,
+                                                   cache_mode=self.cache_mode,
+                                                   deadline=self.deadline, reply=reply,
+                                                   compact=self.compact,
+                                                   max_prompt_tokens=self.max_prompt_tokens)
+            return self._clients[task]
+
+    def run(self, job):
+        command = job.get("command")
+        if command == "evaluate":
+            return self.evaluate(job.get("args") or [])
+        if command not in STRATEGY_COMMANDS:
+            raise JobError(f"unknown command {command!r}")
+
+        from utils.strategies import STRATEGIES
+        try:
+            contents = STRATEGIES[command](job)
+        except KeyError as e:
+            raise JobError(f"{command}: missing field {e}")
+        if job.get("print_prompt"):
+            return {"prompt": contents}
+        client = self.client("lesson")
+        resp = client.generate(contents, job.get("generation_config"))
+        return finish(command, client, resp)
+
+    def evaluate(self, argv):
+        import contextlib
+        from scripts.run_evaluation import main as run_evaluation, parse_args
+
+        if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+            raise JobError("evaluate: args must be a list of strings")
+        # the evaluation reports progress (and argparse its usage) on stdout,
+        # which carries job replies here; the redirect is global, hence the lock
+        with self._evaluate_lock, contextlib.redirect_stdout(sys.stderr):
+            try:
+                args, defaults = parse_args(argv), parse_args([])
+            except SystemExit:
+                raise JobError(f"evaluate: invalid args {argv!r}")
+            # the judge client is the worker's, built from the worker's flags
+            conflicts = ["--" + flag.replace("_", "-") for flag, attr in WORKER_FLAGS.items()
+                         if getattr(args, flag) not in (getattr(defaults, flag), getattr(self, attr))]
+            if conflicts:
+                raise JobError(f"evaluate: {', '.join(conflicts)} differ from the worker's settings; "
+                               "pass them when starting the worker")
+            run_evaluation(argv, client=self.client("judge"))
+        return {"ok": True}
+
+    def handle(self, line):
+        """
+        Runs one JSON-lines job and returns the reply; never raises.
+        """
+        start = time.perf_counter()
+        job_id = None
+        try:
+            try:
+                job = json.loads(line)
+            except ValueError:
+                raise JobError("job is not valid JSON")
+            if not isinstance(job, dict):
+                raise JobError("job must be a JSON object")
+            job_id = job.get("id")
+            reply = {"id": job_id, "ok": True, "result": self.run(job)}
+        except Exception as e:
+            self.failed += 1
+            reply = {"id": job_id, "ok": False, "error": str(e) if isinstance(e, (JobError, ValueError)) else repr(e)}
+        self.jobs += 1
+        reply["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return reply
+
+
+# ---------- Worker transports ----------
+
+def serve_stdin(worker, inp=None, out=None):
+    inp = inp or sys.stdin
+    out = out or sys.stdout
+    for line in inp:
+        if line.strip():
+            out.write(json.dumps(worker.handle(line), ensure_ascii=False) + "\n")
+            out.flush()
+
+
+def serve_socket(worker, path):
+    """
+    JSON-lines jobs over a Unix socket; each connection gets its own thread
+    and its replies in job order.
+    """
+    import signal
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if line.strip():
+                    reply = json.dumps(worker.handle(line), ensure_ascii=False) + "\n"
+                    self.wfile.write(reply.encode("utf-8"))
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    server.daemon_threads = True
+    # exit through the finally below on `kill` too, so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"✅ Worker listening on {path}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+def submit(path, inp=None, out=None):
+    """
+    Streams JSON-lines jobs from `inp` to a worker socket and copies the replies to `out`.
+    """
+    import socket
+
+    inp = inp or sys.stdin
+    out = out or sys.stdout
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+
+    def send():
+        for line in inp:
+            if line.strip():
+                sock.sendall(line.rstrip("\n").encode("utf-8") + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+
+    # send on a thread so a long job list can't deadlock against unread replies
+    threading.Thread(target=send, daemon=True).start()
+    with sock, sock.makefile("r", encoding="utf-8") as replies:
+        for line in replies:
+            out.write(line)
+            out.flush()
+
+
+# ---------- Entry point ----------
+
+def backend_options(p):
+    p.add_argument("--fake", action="store_true", help="use the local fake model backend")
+    p.add_argument("--route", action="store_true", help="route across model tiers by prompt size and latency")
+    p.add_argument("--cache", choices=["on", "off", "refresh"], default=None,
+                   help="response cache mode (default: $SMARTTUTOR_CACHE or on)")
+    p.add_argument("--deadline", type=float, default=60.0, help="per-call deadline in seconds (hedged after p95)")
+    p.add_argument("--compact", action="store_true",
+                   help="compact prompts (minified JSON, collapsed whitespace) before sending them")
+    p.add_argument("--max-prompt-tokens", type=int, default=None,
+                   help="reject prompts estimated over this many tokens before calling the model")
+
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="python -m utils.cli", description="SmartTutorBot command line.")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    for name in STRATEGY_COMMANDS:
+        s = sub.add_parser(name, help=f"run the {name} prompt")
+        s.add_argument("--query", dest="user_query", help="learner question")
+        s.add_argument("--topic", help="lesson topic (defaults to --query)")
+        s.add_argument("--grade", help="learner grade (defaults to the learner data level)")
+        s.add_argument("--learner", type=json.loads, default={}, dest="learner_data",
+                       help="learner data as a JSON object")
+        for field in CONFIG_FIELDS:
+            s.add_argument("--" + field.replace("_", "-"), type=float if field in ("temperature", "top_p") else int)
+        s.add_argument("--print-prompt", action="store_true", help="print the prompt without calling the model")
+        backend_options(s)
+
+    # flags after `evaluate` go straight to scripts/run_evaluation.py (see main)
+    sub.add_parser("evaluate", add_help=False, help="score answers with the LLM judge (run_evaluation flags)")
+
+    w = sub.add_parser("worker", help="keep clients warm and run JSON-lines jobs from stdin or a socket")
+    w.add_argument("--socket", help="listen on this Unix socket instead of stdin")
+    backend_options(w)
+
+    s = sub.add_parser("submit", help="send JSON-lines jobs from stdin to a worker socket")
+    s.add_argument("--socket", required=True)
+    return p
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv[:1] == ["evaluate"]:
+        from scripts.run_evaluation import main as run_evaluation
+        run_evaluation(argv[1:])
+        return 0
+
+    args = build_parser().parse_args(argv)
+    if args.command == "submit":
+        submit(args.socket)
+        return 0
+
+    worker = Worker(fake=args.fake, route=args.route, cache_mode=args.cache, deadline=args.deadline,
+                    compact=args.compact, max_prompt_tokens=args.max_prompt_tokens)
+    if args.command == "worker":
+        try:
+            if args.socket:
+                serve_socket(worker, args.socket)
+            else:
+                serve_stdin(worker)
+        except KeyboardInterrupt:
+            pass
+        print(f"📦 {worker.jobs} job(s), {worker.failed} failed", file=sys.stderr)
+        return 0
+
+    job = {"command": args.command, "learner_data": args.learner_data, "print_prompt": args.print_prompt}
+    for field in ("user_query", "topic", "grade"):
+        if getattr(args, field) is not None:
+            job[field] = getattr(args, field)
+    config = {f: getattr(args, f) for f in CONFIG_FIELDS if getattr(args, f) is not None}
+    if config:
+        job["generation_config"] = config
+
+    reply = worker.handle(json.dumps(job))
+    if not reply["ok"]:
+        print(f"❌ {reply['error']}", file=sys.stderr)
+        return 1
+    result = reply["result"]
+    if "prompt" in result:
+        print("\n\n".join(str(part) for part in result["prompt"]))
+    else:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+import os
+import re
+import sys
+import json
+import argparse
+from functools import lru_cache
+
+from utils.model_client import ModelClient, contents_to_text
+
+DEFAULT_CALIBRATION = "evaluation/token_calibration.json"
+
+# ---------- Token estimation ----------
+# A rough SentencePiece-style count: words (long ones split), single digits,
+# punctuation runs and whitespace runs. It is scaled by a factor fitted against
+# the usage_metadata prompt counts in telemetry, so only the shape has to be right.
+
+WORD_RE = re.compile(r"[^\W\d_]+")
+DIGIT_RE = re.compile(r"\d")
+PUNCT_RE = re.compile(r"[^\w\s]+")
+SPACE_RE = re.compile(r"\n[ \t]*|[ \t]{2,}")
+
+
+def raw_tokens(text):
+    """
+    Uncalibrated token count of `text`.
+    """
+    words = WORD_RE.findall(text)
+    return (len(words) + sum(len(w) >> 3 for w in words)
+            + len(DIGIT_RE.findall(text))
+            + sum((len(p) + 1) >> 1 for p in PUNCT_RE.findall(text))
+            + len(SPACE_RE.findall(text)))
+
+
+class PromptTooLong(ValueError):
+    def __init__(self, tokens, budget):
+        super().__init__(f"prompt is ~{tokens} tokens, over the {budget}-token budget")
+        self.tokens = tokens
+        self.budget = budget
+
+
+class TokenEstimator:
+    """
+    raw_tokens() times a calibrated `scale`. calibrate() fits the scale from
+    telemetry events that carry both the estimate made at call time
+    ("prompt_estimate") and the billed "prompt_tokens".
+    """
+
+    def __init__(self, scale=1.0, samples=0):
+        self.scale = scale
+        self.samples = samples
+
+    def estimate(self, contents):
+        return round(raw_tokens(contents_to_text(contents)) * self.scale)
+
+    @classmethod
+    def calibrate(cls, events, min_samples=5):
+        """
+        Ratio of sums over usable events; None with fewer than `min_samples`.
+        """
+        raw = actual = n = 0
+        for e in events:
+            if e.get("prompt_estimate") and e.get("prompt_tokens") and not e.get("error"):
+                raw += e["prompt_estimate"]
+                actual += e["prompt_tokens"]
+                n += 1
+        if n < min_samples:
+            return None
+        return cls(actual / raw, n)
+
+    @classmethod
+    def load(cls, path=DEFAULT_CALIBRATION):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("scale", 1.0), data.get("samples", 0))
+
+    def save(self, path=DEFAULT_CALIBRATION):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"scale": round(self.scale, 4), "samples": self.samples}, f, indent=2)
+
+
+_estimator = None
+
+
+def default_estimator():
+    global _estimator
+    if _estimator is None:
+        _estimator = TokenEstimator.load()
+    return _estimator
+
+
+# ---------- Compaction steps ----------
+
+JSON_START_RE = re.compile(r"[\[{]")
+JSONISH_LINE_RE = re.compile(r"^[ \t]+(?=[\"{}\[\]])", re.MULTILINE)
+EXAMPLE_RE = re.compile(r"^\s*(?:#+\s*)?example\s*\d+\s*:", re.IGNORECASE)
+_decoder = json.JSONDecoder()
+
+
+def minify_json(text):
+    """
+    Re-serializes every embedded JSON object/array without indentation.
+    Pseudo-JSON schemas (`"n": <integer>`) don't parse and are left as they are.
+    """
+    out, pos = [], 0
+    for m in JSON_START_RE.finditer(text):
+        start = m.start()
+        if start < pos:
+            continue
+        try:
+            obj, end = _decoder.raw_decode(text, start)
+        except ValueError:
+            continue
+        if not isinstance(obj, (dict, list)) or not obj:
+            continue
+        out.append(text[pos:start])
+        out.append(json.dumps(obj, ensure_ascii=False, separators=(",", ":")))
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def collapse_whitespace(text):
+    """
+    Trailing spaces, runs of spaces, 3+ newlines, and the indentation of
+    JSON-looking lines (those starting with a quote or bracket).
+    """
+    text = JSONISH_LINE_RE.sub("", text)
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"(?<=\S)[ \t]{2,}", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def trim_examples(text, keep=1):
+    """
+    Keeps the first `keep` "Example N:" paragraphs of a few-shot prompt.
+    """
+    seen, out = 0, []
+    for para in text.split("\n\n"):
+        if EXAMPLE_RE.match(para):
+            seen += 1
+            if seen > keep:
+                continue
+        out.append(para)
+    return "\n\n".join(out)
+
+
+def dedupe_blocks(parts, min_chars=40):
+    """
+    Drops paragraphs that already appeared in an earlier part (e.g. the same
+    rules in a system prompt and a batch header). Repeats within one part are
+    kept: those are usually data, like two samples with the same answer.
+    A part left with nothing stays as "", so the part count (and with it the
+    static prefix split_static() caches) doesn't change.
+    """
+    seen, out = set(), []
+    for part in parts:
+        if not isinstance(part, str):
+            out.append(part)
+            continue
+        kept, mine = [], set()
+        for para in part.split("\n\n"):
+            key = " ".join(para.split())
+            if len(key) >= min_chars and key in seen:
+                continue
+            mine.add(key)
+            kept.append(para)
+        seen |= mine
+        text = "\n\n".join(kept)
+        out.append(text if text.strip() else "")
+    return out
+
+
+@lru_cache(maxsize=1024)
+def compact_text(text, keep_examples=None):
+    # memoized: system prompts and rubrics repeat on every call
+    text = minify_json(text)
+    if keep_examples is not None:
+        text = trim_examples(text, keep_examples)
+    return collapse_whitespace(text)
+
+
+def compact(contents, keep_examples=None):
+    """
+    Compacted copy of a prompt (a string or a list of parts). Chat-history
+    dicts have their text parts compacted; other parts pass through.
+    """
+    if isinstance(contents, str):
+        return compact_text(contents, keep_examples)
+    if contents and isinstance(contents[0], dict) and "role" in contents[0]:
+        return [dict(turn, parts=[{"text": compact_text(p["text"], keep_examples)}
+                                  if isinstance(p, dict) and set(p) == {"text"} else
+                                  compact_text(p, keep_examples) if isinstance(p, str) else p
+                                  for p in turn.get("parts", [])])
+                for turn in contents]
+    parts = [compact_text(p, keep_examples) if isinstance(p, str) else p for p in contents]
+    return dedupe_blocks(parts)
+
+
+# ---------- Budget ----------
+
+def truncate_middle(text, max_tokens, estimator):
+    """
+    Cuts the middle of `text` so the start (instructions) and the end (the
+    actual question) both survive.
+    """
+    tokens, keep, out = estimator.estimate(text), len(text), text
+    # token density isn't uniform, so shrink until the estimate fits
+    while tokens > max_tokens:
+        keep = int(keep * max_tokens / tokens * 0.95) - 3
+        if keep <= 0:
+            return ""
+        head = keep * 2 // 3
+        out = text[:head] + "\n…\n" + text[len(text) - (keep - head):]
+        tokens = estimator.estimate(out)
+    return out
+
+
+def fit_budget(contents, budget, estimator=None, truncate=False):
+    """
+    Returns `contents` if its estimate fits `budget`; otherwise raises
+    PromptTooLong, or with `truncate` cuts the middle of the longest part.
+    """
+    estimator = estimator or default_estimator()
+    tokens = estimator.estimate(contents)
+    if tokens <= budget:
+        return contents
+    if not truncate:
+        raise PromptTooLong(tokens, budget)
+    parts = [contents] if isinstance(contents, str) else list(contents)
+    strings = [i for i, p in enumerate(parts) if isinstance(p, str)]
+    if not strings:
+        raise PromptTooLong(tokens, budget)
+    i = max(strings, key=lambda i: len(parts[i]))
+    room = budget - (tokens - estimator.estimate(parts[i]))
+    if room <= 0:
+        raise PromptTooLong(tokens, budget)
+    parts[i] = truncate_middle(parts[i], room, estimator)
+    return parts[0] if isinstance(contents, str) else parts
+
+
+class CompactingClient(ModelClient):
+    """
+    Pipeline stage in front of the client stack: compacts every prompt (unless
+    `compact` is off), then rejects (PromptTooLong) or truncates ones whose
+    estimate is over `budget` tokens — before any cache lookup or network call.
+    """
+
+    def __init__(self, client, budget=None, truncate=False, keep_examples=None, estimator=None, compact=True):
+        self.client = client
+        self.compact = compact
+        self.model_name = client.model_name
+        self.budget = budget
+        self.truncate = truncate
+        self.keep_examples = keep_examples
+        self.estimator = estimator
+        self.rejected = 0
+        self.truncated = 0
+
+    def _prepare(self, contents):
+        if self.compact:
+            contents = compact(contents, self.keep_examples)
+        if self.budget is None:
+            return contents
+        try:
+            fitted = fit_budget(contents, self.budget, self.estimator, self.truncate)
+        except PromptTooLong:
+            self.rejected += 1
+            raise
+        if fitted is not contents:
+            self.truncated += 1
+        return fitted
+
+    def generate(self, contents, generation_config=None, tools=None):
+        return self.client.generate(self._prepare(contents), generation_config, tools)
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        return await self.client.agenerate(self._prepare(contents), generation_config, tools)
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        return self.client.generate_stream(self._prepare(contents), generation_config, tools)
+
+
+def compacted(client, budget=None, truncate=False, keep_examples=None, compact=True):
+    return CompactingClient(client, budget, truncate, keep_examples, compact=compact)
+
+
+# ---------- CLI ----------
+
+def report(paths, keep_examples=None, estimator=None):
+    estimator = estimator or default_estimator()
+    print(f"{'prompt':<44}{'tokens':>8}{'compact':>9}{'saved':>8}")
+    before_total = after_total = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        before = estimator.estimate(text)
+        after = estimator.estimate(compact_text(text, keep_examples))
+        before_total += before
+        after_total += after
+        print(f"{path:<44}{before:>8}{after:>9}{(before - after) / max(before, 1):>8.1%}")
+    print(f"{'total':<44}{before_total:>8}{after_total:>9}{(before_total - after_total) / max(before_total, 1):>8.1%}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m utils.compaction",
+                                description="Prompt compaction and offline token estimation.")
+    sub = p.add_subparsers(dest="command", required=True)
+    c = sub.add_parser("calibrate", help="fit the token estimator against telemetry usage counts")
+    c.add_argument("--telemetry", default="logs/telemetry.jsonl")
+    c.add_argument("--out", default=DEFAULT_CALIBRATION)
+    r = sub.add_parser("report", help="estimated tokens per prompt file, before and after compaction")
+    r.add_argument("paths", nargs="*")
+    r.add_argument("--keep-examples", type=int, default=None, help="trim few-shot prompts to this many examples")
+    args = p.parse_args(argv)
+
+    if args.command == "calibrate":
+        from utils.telemetry import read_events
+        if not os.path.exists(args.telemetry):
+            print(f"❌ No telemetry at {args.telemetry}")
+            return 1
+        estimator = TokenEstimator.calibrate(read_events(args.telemetry))
+        if estimator is None:
+            print("⚠️ Not enough calls with both an estimate and usage counts to calibrate.")
+            return 1
+        estimator.save(args.out)
+        print(f"✅ scale={estimator.scale:.3f} from {estimator.samples} calls → {args.out}")
+        return 0
+
+    paths = args.paths or sorted(os.path.join("prompts", f) for f in os.listdir("prompts") if f.endswith(".txt"))
+    report(paths, args.keep_examples)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import os
+import json
+import asyncio
+import threading
+
+from utils.model_client import ModelClient, contents_to_text
+from utils.response_cache import cache_key
+
+DEFAULT_REGISTRY = "cache/contexts.json"
+
+
+def split_static(contents):
+    """
+    Splits a request into (static prefix, dynamic suffix). By convention every
+    part but the last is static — system prompt, few-shot examples — and the
+    last part is the per-request input. Single-string prompts have no prefix.
+    For a chat history (tool loops) the static prefix is the first turn's
+    leading parts; its last part and every later turn are the suffix.
+    """
+    if isinstance(contents, str):
+        return None, contents
+    if is_history(contents):
+        first = contents[0]
+        parts = list(first.get("parts", []))
+        if len(parts) < 2:
+            return None, contents
+        return [dict(first, parts=parts[:-1])], [dict(first, parts=parts[-1:])] + list(contents[1:])
+    if len(contents) < 2:
+        return None, contents
+    return list(contents[:-1]), [contents[-1]]
+
+
+def is_history(contents):
+    return bool(contents) and isinstance(contents[0], dict) and "role" in contents[0]
+
+
+def estimate_tokens(parts):
+    # ~4 chars/token is close enough to decide whether a prefix is worth caching.
+    return len(contents_to_text(parts)) // 4
+
+
+class PrefixCacheClient(ModelClient):
+    """
+    Registers the static leading parts of a request (plus its tools) once as a
+    server-side cached context with a TTL, then sends only the dynamic suffix
+    on later calls. Prefixes shorter than the backend's minimum cacheable size
+    are sent in full, and so are prefixes the backend refused to cache (e.g.
+    an unsupported model). With `registry_path`, registered context names
+    survive across processes until they expire.
+    """
+
+    def __init__(self, client, ttl=3600, min_tokens=None, registry_path=None):
+        self.client = client
+        self.model_name = client.model_name
+        self.ttl = ttl
+        self.min_tokens = client.context_cache_min_tokens if min_tokens is None else min_tokens
+        self.registry_path = registry_path
+        self._contexts = {}
+        self._failed = set()
+        self.create_failures = 0
+        self._lock = threading.Lock()
+        self._load_registry()
+
+    # ---------- registry ----------
+
+    def _load_registry(self):
+        if not self.registry_path or not os.path.exists(self.registry_path):
+            return
+        try:
+            with open(self.registry_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except ValueError:
+            return
+        for key, entry in saved.items():
+            try:
+                handle = self.client.load_context(entry["name"], entry["token_count"], entry["expires_at"])
+            except Exception:
+                continue
+            if not handle.expired():
+                self._contexts[key] = handle
+
+    def _save_registry(self):
+        if not self.registry_path:
+            return
+        os.makedirs(os.path.dirname(self.registry_path) or ".", exist_ok=True)
+        data = {k: {"name": h.name, "token_count": h.token_count, "expires_at": h.expires_at}
+                for k, h in self._contexts.items() if not h.expired()}
+        tmp = self.registry_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.registry_path)
+
+    # ---------- context lookup ----------
+
+    def _lookup(self, prefix, tools):
+        """
+        Returns (key, live handle or None); key is None when the prefix isn't cacheable.
+        """
+        if prefix is None or self.min_tokens is None or estimate_tokens(prefix) < self.min_tokens:
+            return None, None
+        key = cache_key(self.model_name, prefix, tools)
+        if key in self._failed:
+            return None, None
+        handle = self._contexts.get(key)
+        if handle is not None and handle.expired():
+            handle = None
+        return key, handle
+
+    def _register(self, key, prefix, tools):
+        """
+        Returns a live handle for the prefix, or None when the backend won't
+        create one; that prefix is then sent in full from now on.
+        """
+        with self._lock:
+            if key in self._failed:
+                return None
+            handle = self._contexts.get(key)
+            if handle is None or handle.expired():
+                try:
+                    handle = self.client.create_context(prefix, tools, self.ttl)
+                except Exception:
+                    self._failed.add(key)
+                    self.create_failures += 1
+                    return None
+                self._contexts[key] = handle
+                self._save_registry()
+        return handle
+
+    def _mark(self, resp):
+        try:
+            resp.context_cache = "hit"
+        except AttributeError:
+            pass
+        return resp
+
+    def generate(self, contents, generation_config=None, tools=None):
+        prefix, suffix = split_static(contents)
+        key, handle = self._lookup(prefix, tools)
+        if key is None:
+            return self.client.generate(contents, generation_config, tools)
+        if handle is None:
+            handle = self._register(key, prefix, tools)
+        if handle is None:
+            return self.client.generate(contents, generation_config, tools)
+        return self._mark(self.client.generate_cached(handle, suffix, generation_config))
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        prefix, suffix = split_static(contents)
+        key, handle = self._lookup(prefix, tools)
+        if key is None:
+            return await self.client.agenerate(contents, generation_config, tools)
+        if handle is None:
+            # Creating a context is a blocking network call; keep it off the event loop.
+            handle = await asyncio.to_thread(self._register, key, prefix, tools)
+        if handle is None:
+            return await self.client.agenerate(contents, generation_config, tools)
+        return self._mark(await self.client.agenerate_cached(handle, suffix, generation_config))
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        # Streaming calls are rare and short-lived; send them uncached.
+        return self.client.generate_stream(contents, generation_config, tools)
+
+
+def context_cached(client, ttl=3600, registry_path=None):
+    return PrefixCacheClient(client, ttl=ttl, registry_path=registry_path)
@@ -0,0 +1,205 @@
+import os
+import json
+
+READ_CHUNK = 1 << 16
+
+
+def iter_json_array(path):
+    """
+    Yields the elements of a top-level JSON array one at a time, reading the
+    file in chunks instead of json.load()-ing it whole.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, started = "", 0, False
+        eof = False
+        while True:
+            # skip whitespace and separators between elements
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                buf, pos = f.read(READ_CHUNK), 0
+                eof = not buf
+            if pos >= len(buf):
+                return
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{path}: expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                # a number cut at the buffer edge would decode short
+                complete = end < len(buf) or eof
+            except ValueError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                more = f.read(READ_CHUNK)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+            pos = end
+
+
+def iter_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_samples(path):
+    """
+    Lazily yields samples from a JSONL file or a JSON array file.
+    """
+    if path.endswith(".jsonl"):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def checkpoint_path(out_path):
+    return out_path + ".ckpt"
+
+
+def load_checkpoint(out_path):
+    """
+    Returns the set of ids already written to `out_path` (as JSON-encoded
+    strings, so 1 and "1" stay distinct).
+    """
+    path = checkpoint_path(out_path)
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.endswith("\n")}
+
+
+def id_key(sample_id):
+    return json.dumps(sample_id, ensure_ascii=False)
+
+
+def truncate_torn_tail(path):
+    """
+    Drops a partially written last line (left by a crash) so appends start clean.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        pos = end
+        while pos > 0:
+            step = min(READ_CHUNK, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            nl = block.rfind(b"\n")
+            if nl >= 0:
+                pos = pos - step + nl + 1
+                break
+            pos -= step
+        if pos != end:
+            f.truncate(pos)
+
+
+class ResultWriter:
+    """
+    Appends one JSON result per line as soon as it is available, and records
+    its id in a small `.ckpt` sidecar so a rerun can skip finished samples.
+    A crash can at worst repeat the last few samples; export_json() keeps one
+    result per id.
+    """
+
+    def __init__(self, out_path, fresh=False, flush_every=16):
+        self.out_path = out_path
+        self.flush_every = flush_every
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        mode = "w" if fresh else "a"
+        if not fresh:
+            truncate_torn_tail(out_path)
+            # a torn id would otherwise be joined onto the next one ("12" + "13" -> "1213")
+            truncate_torn_tail(checkpoint_path(out_path))
+        self.done = set() if fresh else load_checkpoint(out_path)
+        self._out = open(out_path, mode, encoding="utf-8")
+        self._ckpt = open(checkpoint_path(out_path), mode, encoding="utf-8")
+        self._since_flush = 0
+
+    def is_done(self, sample_id):
+        return id_key(sample_id) in self.done
+
+    def write(self, result):
+        key = id_key(result["id"])
+        self._out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self._since_flush += 1
+        if self._since_flush >= self.flush_every:
+            self.flush()
+        # The id is only checkpointed once its result line is on disk.
+        self._ckpt.write(key + "\n")
+        self.done.add(key)
+
+    def flush(self):
+        self._out.flush()
+        os.fsync(self._out.fileno())
+        self._ckpt.flush()
+        self._since_flush = 0
+
+    def close(self):
+        self.flush()
+        self._out.close()
+        self._ckpt.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_json(jsonl_path, json_path, dataset_path=None):
+    """
+    Builds the legacy `results.json` array from the JSONL output. Only an
+    {id: byte offset} index is held in memory; results are streamed out in
+    dataset order when `dataset_path` is given, else in completion order.
+    """
+    offsets = {}
+    with open(jsonl_path, "rb") as f:
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            if not line.endswith(b"\n"):
+                break  # torn final line from a crash
+            try:
+                offsets[id_key(json.loads(line)["id"])] = pos
+            except ValueError:
+                continue
+
+    if dataset_path:
+        order = (id_key(s["id"]) for s in iter_samples(dataset_path))
+    else:
+        order = iter(sorted(offsets, key=offsets.get))
+
+    count = 0
+    tmp = json_path + ".tmp"
+    with open(jsonl_path, "rb") as src, open(tmp, "w", encoding="utf-8") as out:
+        out.write("[")
+        for key in order:
+            pos = offsets.get(key)
+            if pos is None:
+                continue
+            src.seek(pos)
+            result = json.loads(src.readline())
+            block = json.dumps(result, indent=2, ensure_ascii=False)
+            out.write(("," if count else "") + "\n  " + block.replace("\n", "\n  "))
+            count += 1
+        out.write("\n]\n" if count else "]\n")
+    os.replace(tmp, json_path)
+    return count
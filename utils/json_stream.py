@@ -0,0 +1,180 @@
+import json
+
+WS = " \t\r\n"
+OPENERS = {"{": "}", "[": "]"}
+
+
+class StreamAbort(ValueError):
+    """Raised as soon as the streamed text can no longer be a valid JSON object."""
+
+
+class ObjectStreamParser:
+    """
+    Incremental parser for a single top-level JSON object inside model output.
+    Text before the first `{` (code fences, prose) is skipped, and so is anything
+    after the object closes. feed() returns the (key, value) pairs of top-level
+    fields that completed in that chunk, so callers can use `topic`,
+    `key_points`, ... before generation ends. Structural errors raise StreamAbort
+    immediately instead of after the full response has arrived.
+    """
+
+    def __init__(self, max_chars=None):
+        self.max_chars = max_chars
+        self.fields = {}
+        self.done = False
+        self._state = "preamble"
+        self._seen = 0
+        self._key = []
+        self._value = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    def _fail(self, msg):
+        raise StreamAbort(f"{msg} (at char {self._seen})")
+
+    def _emit(self, out):
+        raw = "".join(self._value)
+        try:
+            value = json.loads(raw)
+        except ValueError as e:
+            self._fail(f"invalid value for {self._key_text!r}: {e}")
+        self.fields[self._key_text] = value
+        out.append((self._key_text, value))
+        self._value = []
+
+    def feed(self, chunk):
+        out = []
+        for ch in chunk:
+            self._seen += 1
+            state = self._state
+            if state == "trailer":
+                continue
+            if self.max_chars and self._seen > self.max_chars:
+                self._fail(f"response exceeded {self.max_chars} chars")
+            if state == "preamble":
+                if ch == "{":
+                    self._state = "key_or_end"
+                continue
+
+            if state == "value":
+                self._value.append(ch)
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == "\\":
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                        if not self._stack:
+                            self._emit(out)
+                            self._state = "after_value"
+                    continue
+                if ch == '"':
+                    self._in_string = True
+                elif ch in OPENERS:
+                    self._stack.append(OPENERS[ch])
+                elif ch in "]}":
+                    if not self._stack:
+                        # closing brace of the top-level object ends a bare scalar
+                        self._value.pop()
+                        if ch != "}":
+                            self._fail("unexpected ']'")
+                        self._emit(out)
+                        self._finish()
+                    elif self._stack.pop() != ch:
+                        self._fail(f"mismatched {ch!r}")
+                    elif not self._stack:
+                        self._emit(out)
+                        self._state = "after_value"
+                elif ch == "," and not self._stack:
+                    self._value.pop()
+                    self._emit(out)
+                    self._state = "key_or_end"
+                continue
+
+            # whitespace separates tokens; inside a key it is part of the key
+            if ch in WS and state != "key":
+                continue
+            if state == "key_or_end":
+                if ch == '"':
+                    self._key = []
+                    self._state = "key"
+                elif ch == "}" and not self.fields:
+                    self._finish()
+                else:
+                    self._fail(f"expected a key, got {ch!r}")
+            elif state == "key":
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._key_text = json.loads('"' + "".join(self._key) + '"')
+                    self._state = "colon"
+                    continue
+                self._key.append(ch)
+            elif state == "colon":
+                if ch != ":":
+                    self._fail(f"expected ':', got {ch!r}")
+                self._state = "value"
+            elif state == "after_value":
+                if ch == ",":
+                    self._state = "key_or_end"
+                elif ch == "}":
+                    self._finish()
+                else:
+                    self._fail(f"expected ',' or '}}', got {ch!r}")
+        return out
+
+    def _finish(self):
+        self.done = True
+        self._state = "trailer"
+
+    def close(self):
+        """
+        Returns the parsed object, raising StreamAbort if it never completed.
+        """
+        if not self.done:
+            self._fail("response ended before the JSON object closed")
+        return self.fields
+
+
+def extract_json(text):
+    """
+    Drop-in replacement for the old fence-stripping regex: returns the first
+    top-level JSON object in `text` as a dict.
+    """
+    parser = ObjectStreamParser()
+    parser.feed(text)
+    return parser.close()
+
+
+def stream_json(chunks, on_field=None, max_chars=None):
+    """
+    Feeds text chunks from a streaming model call into the parser, calling
+    `on_field(key, value)` for every completed top-level field. Stops consuming
+    the stream (which ends generation) as soon as the output turns invalid, or
+    when trailing text after the object runs past `max_chars`.
+    Returns (fields, raw_text); raw_text is whatever arrived, for debugging dumps.
+    """
+    parser = ObjectStreamParser(max_chars=max_chars)
+    raw = []
+    seen = 0
+    try:
+        for chunk in chunks:
+            raw.append(chunk)
+            seen += len(chunk)
+            for key, value in parser.feed(chunk):
+                if on_field is not None:
+                    on_field(key, value)
+            if parser.done and max_chars and seen > max_chars:
+                break
+        return parser.close(), "".join(raw)
+    except StreamAbort as e:
+        e.raw = "".join(raw)
+        raise
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
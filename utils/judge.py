@@ -0,0 +1,247 @@
+import json
+import asyncio
+from collections import deque
+
+from utils.json_stream import extract_json, StreamAbort
+from utils.context_cache import estimate_tokens
+from utils.templates import load_template
+from utils.runner import TokenBucket, call_with_retry, run_all, run_stream
+
+JUDGE_PROMPT = "prompts/judge_prompt.txt"
+BATCH_PROMPT = "prompts/judge_batch_prompt.txt"
+# The rubric is shared; each path states its own output shape.
+SINGLE_PROMPT = "prompts/judge_single_prompt.txt"
+
+SCORE_FIELDS = ("relevance", "style", "accuracy", "completeness", "clarity")
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def sample_block(item):
+    learner_data = json.dumps(item["learner_data"], indent=2)
+    return f"""
+User Query: {item["user_query"]}
+Learner Data: {learner_data}
+Expected Reference: {item["expected"]}
+Model Output: {item["model_answer"]}
+"""
+
+
+def build_judge_prompt(judge_template, item):
+    # The rubric and output shape lead as static parts so they can be served from a cached context
+    return [judge_template, load_template(SINGLE_PROMPT, strip=True).render(), sample_block(item)]
+
+
+def build_batch_prompt(judge_template, batch_header, items):
+    blocks = "\n".join(f"Sample id: {item['id']}{sample_block(item)}" for item in items)
+    return [judge_template, batch_header, blocks]
+
+
+def score_problems(obj):
+    """
+    Returns a list of problems with one judge score object; empty means valid.
+    """
+    if not isinstance(obj, dict):
+        return ["not an object"]
+    problems = []
+    for field in SCORE_FIELDS:
+        v = obj.get(field)
+        if not isinstance(v, int) or isinstance(v, bool) or not 0 <= v <= 2:
+            problems.append(f"{field} must be an int 0-2")
+    total = obj.get("total_score")
+    if not isinstance(total, int) or isinstance(total, bool) or not 0 <= total <= 10:
+        problems.append("total_score must be an int 0-10")
+    if not isinstance(obj.get("comments"), str):
+        problems.append("comments must be a string")
+    return problems
+
+
+def parse_score(text):
+    """
+    Parses a single judge reply (fenced or not) into a score dict.
+    """
+    try:
+        return extract_json(text)
+    except StreamAbort:
+        return {"error": "Could not parse", "raw": text}
+
+
+def parse_batch(text):
+    """
+    Parses a batched judge reply into {str(id): score} for the items that are
+    present and valid; anything else is left out so its sample gets retried.
+    """
+    start = text.find("[")
+    if start < 0:
+        return {}
+    try:
+        items, _ = json.JSONDecoder().raw_decode(text[start:])
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+    scores = {}
+    for obj in items:
+        if isinstance(obj, dict) and "id" in obj and not score_problems(obj):
+            score = dict(obj)
+            scores[str(score.pop("id"))] = score
+    return scores
+
+
+async def judge_single(client, judge_template, item):
+    resp = await client.agenerate(build_judge_prompt(judge_template, item))
+    return parse_score(resp.text.strip())
+
+
+async def evaluate_single(items, client, judge_template, concurrency=8, rps=5.0, retries=4):
+    """
+    One judge call per item. Returns evaluations in item order.
+    """
+    outcomes = await run_all(items, lambda item: judge_single(client, judge_template, item),
+                             concurrency=concurrency, rps=rps or None, retries=retries)
+    return [as_evaluation(o) for o in outcomes]
+
+
+async def stream_single(items, client, judge_template, concurrency=8, rps=5.0, retries=4):
+    """
+    Like evaluate_single() but lazy: yields (item, evaluation) as each finishes.
+    """
+    async for item, outcome in run_stream(items, lambda item: judge_single(client, judge_template, item),
+                                          concurrency=concurrency, rps=rps or None, retries=retries):
+        yield item, as_evaluation(outcome)
+
+
+def as_evaluation(outcome):
+    if isinstance(outcome, Exception):
+        return {"error": "Judge call failed", "raw": repr(outcome)}
+    return outcome
+
+
+class BatchJudge:
+    """
+    Packs several samples into one judge request and expects a JSON array
+    keyed by sample id. Missing or invalid items make the batch split in half
+    and retry; a single leftover sample falls back to the plain judge prompt.
+    The batch size K grows by one after each clean batch and halves after a
+    split (AIMD), and is always capped by `token_budget` prompt tokens.
+    """
+
+    def __init__(self, client, judge_template=None, batch_header=None, max_k=8,
+                 token_budget=6000, concurrency=4, rps=5.0, retries=4):
+        self.client = client
+        self.judge_template = judge_template or read(JUDGE_PROMPT)
+        self.batch_header = batch_header or read(BATCH_PROMPT)
+        self.max_k = max_k
+        self.k = max_k
+        self.token_budget = token_budget
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rps) if rps else None
+        self.retries = retries
+        self.calls = 0
+        self.splits = 0
+        self._fixed_tokens = estimate_tokens([self.judge_template, self.batch_header])
+
+    async def _call(self, contents):
+        self.calls += 1
+        resp, _ = await call_with_retry(lambda: self.client.agenerate(contents),
+                                        retries=self.retries, limiter=self.limiter)
+        return resp.text
+
+    def _take(self, pending):
+        batch, tokens = [], self._fixed_tokens
+        while pending and len(batch) < self.k:
+            cost = estimate_tokens(sample_block(pending[0])) + 8
+            if batch and tokens + cost > self.token_budget:
+                break
+            batch.append(pending.popleft())
+            tokens += cost
+        return batch
+
+    async def judge(self, items):
+        """
+        Returns {str(id): evaluation} for every item.
+        """
+        if len(items) == 1:
+            item = items[0]
+            try:
+                text = await self._call(build_judge_prompt(self.judge_template, item))
+            except Exception as e:
+                return {str(item["id"]): {"error": "Judge call failed", "raw": repr(e)}}
+            score = parse_score(text.strip())
+            if not score_problems(score):
+                # additive increase here too, or K could never leave 1
+                self.k = min(self.max_k, self.k + 1)
+            return {str(item["id"]): score}
+
+        try:
+            scores = parse_batch(await self._call(
+                build_batch_prompt(self.judge_template, self.batch_header, items)))
+        except Exception:
+            scores = {}
+        wanted = {str(item["id"]) for item in items}
+        scores = {k: v for k, v in scores.items() if k in wanted}
+        missing = [item for item in items if str(item["id"]) not in scores]
+        if not missing:
+            self.k = min(self.max_k, self.k + 1)
+            return scores
+
+        self.splits += 1
+        self.k = max(1, self.k // 2)
+        mid = len(missing) // 2 or 1
+        halves = [h for h in (missing[:mid], missing[mid:]) if h]
+        for part in await asyncio.gather(*(self.judge(h) for h in halves)):
+            scores.update(part)
+        return scores
+
+    async def stream(self, items):
+        """
+        Pulls items lazily and yields (item, evaluation) as each batch finishes,
+        with up to `concurrency` batches in flight.
+        """
+        it = iter(items)
+        pending = deque()
+        done = asyncio.Queue()
+
+        def refill():
+            # keep just enough read-ahead to form the next batch
+            while len(pending) < self.max_k:
+                try:
+                    pending.append(next(it))
+                except StopIteration:
+                    return
+
+        async def worker():
+            while True:
+                refill()
+                if not pending:
+                    return
+                batch = self._take(pending)
+                scores = await self.judge(batch)
+                for item in batch:
+                    done.put_nowait((item, scores[str(item["id"])]))
+
+        async def run_workers():
+            try:
+                await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+            finally:
+                done.put_nowait(None)
+
+        runner = asyncio.ensure_future(run_workers())
+        while True:
+            entry = await done.get()
+            if entry is None:
+                break
+            yield entry
+        await runner
+
+    async def evaluate(self, items):
+        """
+        Judges all items and returns evaluations in item order.
+        """
+        results = {}
+        async for item, evaluation in self.stream(items):
+            results[str(item["id"])] = evaluation
+        return [results[str(item["id"])] for item in items]
@@ -0,0 +1,227 @@
+import re
+import json
+
+from utils.json_stream import extract_json, StreamAbort
+from utils.templates import load_template
+
+# The lesson format from [F] in prompts/system_prompt_one_shot.txt (a small JSON-schema subset).
+STR = {"type": "string"}
+STR_LIST = {"type": "array", "items": STR, "minItems": 1}
+ID = {"type": "integer"}
+
+LESSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "topic": STR,
+        "grade_level": STR,
+        "learning_objective": STR,
+        "lesson_summary": STR,
+        "key_points": STR_LIST,
+        "worked_examples": {"type": "array", "minItems": 1, "items": {
+            "type": "object",
+            "properties": {"id": ID, "problem": STR, "solution_steps": STR_LIST, "final_answer": STR},
+        }},
+        "practice_problems": {"type": "array", "minItems": 1, "items": {
+            "type": "object",
+            "properties": {
+                "id": ID, "question": STR,
+                "difficulty": {"type": "string", "enum": ["easy", "medium", "hard"]},
+                "hints": {"type": "array", "items": STR},
+                "solution": STR,
+            },
+        }},
+        "assessment_quiz": {"type": "array", "minItems": 1, "items": {
+            "type": "object",
+            "properties": {"id": ID, "question": STR, "options": STR_LIST, "answer": STR},
+        }},
+        "follow_up_recommendations": STR_LIST,
+        "references": STR_LIST,
+        "estimated_time_minutes": {"type": "integer", "minimum": 1},
+    },
+}
+
+REQ_KEYS = set(LESSON_SCHEMA["properties"])
+
+REPAIR_PROMPT = "prompts/repair_prompt.txt"
+
+
+def compile_schema(schema):
+    """
+    Compiles a schema into a checker(value, path, errors) closure tree once, so
+    validating a lesson is plain function calls with no schema interpretation.
+    Every property of an object schema is required.
+    """
+    kind = schema["type"]
+
+    if kind == "string":
+        enum = set(schema["enum"]) if "enum" in schema else None
+
+        def check(value, path, errors):
+            if not isinstance(value, str):
+                errors.append((path, "expected string"))
+            elif enum is not None and value not in enum:
+                errors.append((path, f"expected one of {sorted(enum)}"))
+        return check
+
+    if kind == "integer":
+        minimum = schema.get("minimum")
+
+        def check(value, path, errors):
+            if not isinstance(value, int) or isinstance(value, bool):
+                errors.append((path, "expected integer"))
+            elif minimum is not None and value < minimum:
+                errors.append((path, f"expected >= {minimum}"))
+        return check
+
+    if kind == "array":
+        item_check = compile_schema(schema["items"])
+        min_items = schema.get("minItems", 0)
+
+        def check(value, path, errors):
+            if not isinstance(value, list):
+                errors.append((path, "expected array"))
+                return
+            if len(value) < min_items:
+                errors.append((path, f"expected at least {min_items} item(s)"))
+            for i, item in enumerate(value):
+                item_check(item, f"{path}[{i}]", errors)
+        return check
+
+    if kind == "object":
+        props = [(name, compile_schema(sub)) for name, sub in schema["properties"].items()]
+
+        def check(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append((path, "expected object"))
+                return
+            for name, sub_check in props:
+                sub_path = f"{path}.{name}" if path else name
+                if name not in value:
+                    errors.append((sub_path, "missing"))
+                else:
+                    sub_check(value[name], sub_path, errors)
+        return check
+
+    raise ValueError(f"unsupported schema type: {kind}")
+
+
+_check_lesson = compile_schema(LESSON_SCHEMA)
+
+
+def validate_lesson(data):
+    """
+    Returns a list of (path, problem) tuples; empty means the lesson is valid.
+    """
+    errors = []
+    _check_lesson(data, "", errors)
+    return errors
+
+
+def validate_batch(lessons):
+    return [validate_lesson(d) for d in lessons]
+
+
+def describe(schema):
+    """
+    Compact type signature of a schema, used to tell the model what to return.
+    """
+    kind = schema["type"]
+    if kind == "string":
+        return "|".join(schema["enum"]) if "enum" in schema else "string"
+    if kind == "integer":
+        return "integer"
+    if kind == "array":
+        return f"[{describe(schema['items'])}, ...]"
+    return "{" + ", ".join(f'"{k}": {describe(v)}' for k, v in schema["properties"].items()) + "}"
+
+
+# ---------- Local fixes ----------
+
+def _coerce(value, schema, index=None):
+    kind = schema["type"]
+    if kind == "integer":
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str):
+            m = re.search(r"-?\d+", value)
+            if m:
+                return int(m.group(0))
+        return value
+    if kind == "string":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if isinstance(value, str) and "enum" in schema:
+            low = value.strip().lower()
+            if low in schema["enum"]:
+                return low
+        return value
+    if kind == "array":
+        if isinstance(value, (str, dict)):
+            value = [value]
+        if isinstance(value, list):
+            return [_coerce(v, schema["items"], i) for i, v in enumerate(value)]
+        return value
+    if kind == "object" and isinstance(value, dict):
+        fixed = dict(value)
+        props = schema["properties"]
+        if "id" in props and "id" not in fixed and index is not None:
+            fixed["id"] = index + 1
+        for name, sub in props.items():
+            if name in fixed:
+                fixed[name] = _coerce(fixed[name], sub)
+        return fixed
+    return value
+
+
+def local_repair(data):
+    """
+    Cheap fixes that need no model call: "15 minutes" -> 15, a bare string
+    where a list is expected, missing item ids, "Easy" -> "easy", and so on.
+    """
+    return _coerce(data, LESSON_SCHEMA)
+
+
+# ---------- Targeted model repair ----------
+
+def invalid_fields(errors):
+    return sorted({path.split(".")[0].split("[")[0] for path, _ in errors})
+
+
+def build_repair_prompt(data, fields, errors):
+    props = LESSON_SCHEMA["properties"]
+    fmt = "{\n" + ",\n".join(f'  "{f}": {describe(props[f])}' for f in fields) + "\n}"
+    problems = "\n".join(f"- {path}: {msg}" for path, msg in errors)
+    return load_template(REPAIR_PROMPT).render(
+        topic=str(data.get("topic", "unknown")),
+        grade_level=str(data.get("grade_level", "unknown")),
+        problems=problems,
+        format=fmt,
+    )
+
+
+def repair_lesson(data, client=None, max_rounds=2):
+    """
+    Validates `data`, applies local fixes, then re-requests only the fields
+    that are still missing or invalid (instead of regenerating the whole
+    lesson). Returns (lesson, remaining_errors, model_calls).
+    """
+    data = local_repair(data)
+    errors = validate_lesson(data)
+    calls = 0
+    while errors and client is not None and calls < max_rounds:
+        fields = invalid_fields(errors)
+        resp = client.generate(build_repair_prompt(data, fields, errors))
+        calls += 1
+        try:
+            patch = extract_json(resp.text)
+        except StreamAbort:
+            continue
+        if not isinstance(patch, dict):
+            continue
+        data = local_repair({**data, **{k: v for k, v in patch.items() if k in fields}})
+        errors = validate_lesson(data)
+    return data, errors, calls
+
+
+def format_errors(errors):
+    return json.dumps([f"{path}: {msg}" for path, msg in errors], ensure_ascii=False)
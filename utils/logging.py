@@ -1,20 +1,15 @@
-import os
+from utils.telemetry import log_call
 
-def log_usage(resp, tag="default"):
+def log_usage(resp, tag="default", latency=None, generation_config=None):
     """
     Logs token usage from a Gemini response object.
+    Kept for older callers; events go to the buffered telemetry sink
+    (logs/telemetry.jsonl) instead of being appended to logs/tokens.log.
     """
     try:
-        usage = resp.usage_metadata
-        prompt = usage.prompt_token_count
-        cand = usage.candidates_token_count
-        total = usage.total_token_count
-
-        print(f"[{tag}] Tokens → prompt: {prompt}, completion: {cand}, total: {total}")
-
-        os.makedirs("logs", exist_ok=True)
-        with open("logs/tokens.log", "a", encoding="utf-8") as fh:
-            fh.write(f"{tag} | prompt:{prompt} cand:{cand} total:{total}\n")
+        event = log_call(tag, resp=resp, latency=latency, generation_config=generation_config)
+        print(f"[{tag}] Tokens → prompt: {event['prompt_tokens']}, "
+              f"completion: {event['completion_tokens']}, total: {event['total_tokens']}")
 
     except Exception as e:
         print(f"⚠️ Could not log tokens ({tag}):", e)
@@ -0,0 +1,277 @@
+import os
+import re
+import json
+import time
+import asyncio
+import random
+from types import SimpleNamespace
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+# CachedContent.create only accepts versioned model names; aliases map to
+# the stable version they currently point at.
+PINNED_MODELS = {
+    "gemini-1.5-flash": "gemini-1.5-flash-002",
+    "gemini-1.5-flash-8b": "gemini-1.5-flash-8b-001",
+    "gemini-1.5-pro": "gemini-1.5-pro-002",
+}
+
+
+class ModelClient:
+    """
+    Pluggable interface around a `generate_content`-style backend.
+    Backends return Gemini-shaped responses (`.text`, `.candidates`, `.usage_metadata`)
+    so the existing parsing and `log_usage` code keeps working unchanged.
+    """
+    model_name = DEFAULT_MODEL
+
+    def generate(self, contents, generation_config=None, tools=None):
+        raise NotImplementedError
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        # Blocking SDKs are pushed to a worker thread so the event loop stays free.
+        return await asyncio.to_thread(self.generate, contents, generation_config, tools)
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        """
+        Yields the response text in chunks as it is generated. Backends without
+        streaming support yield the whole text once.
+        """
+        yield self.generate(contents, generation_config, tools).text
+
+    # Server-side context caching (see utils/context_cache.py). Backends that
+    # support it register static leading parts once and then only get the suffix.
+    context_cache_min_tokens = None
+
+    def create_context(self, parts, tools=None, ttl=3600):
+        raise NotImplementedError
+
+    def load_context(self, name, token_count=0, expires_at=0.0):
+        raise NotImplementedError
+
+    def generate_cached(self, context, contents, generation_config=None):
+        raise NotImplementedError
+
+    async def agenerate_cached(self, context, contents, generation_config=None):
+        return await asyncio.to_thread(self.generate_cached, context, contents, generation_config)
+
+
+class ContextHandle:
+    """A registered cached prefix: backend name, its token count and local expiry time."""
+
+    def __init__(self, name, token_count, expires_at, backend=None):
+        self.name = name
+        self.token_count = token_count
+        self.expires_at = expires_at
+        self.backend = backend
+        self.model = None
+
+    def expired(self, margin=30.0):
+        return time.time() + margin >= self.expires_at
+
+
+class GeminiClient(ModelClient):
+    """
+    Real Gemini backend. The SDK is imported on first use so fake/offline runs
+    don't need `google.generativeai` or an API key.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, api_key=None):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._model = None
+
+    def _get_model(self):
+        if self._model is None:
+            from dotenv import load_dotenv
+            import google.generativeai as genai
+
+            load_dotenv()
+            api_key = self._api_key or os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                raise ValueError("❌ GOOGLE_API_KEY not found in .env")
+            genai.configure(api_key=api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, contents, generation_config=None, tools=None):
+        kwargs = {}
+        if generation_config is not None:
+            kwargs["generation_config"] = generation_config
+        if tools is not None:
+            kwargs["tools"] = tools
+        return self._get_model().generate_content(contents, **kwargs)
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        kwargs = {"stream": True}
+        if generation_config is not None:
+            kwargs["generation_config"] = generation_config
+        if tools is not None:
+            kwargs["tools"] = tools
+        resp = self._get_model().generate_content(contents, **kwargs)
+        for chunk in resp:
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield chunk.text
+
+    # Explicit caches need a versioned model (see PINNED_MODELS) and at least
+    # this many tokens; shorter prefixes are simply sent in full.
+    context_cache_min_tokens = 32768
+
+    def create_context(self, parts, tools=None, ttl=3600):
+        import datetime
+        from google.generativeai import caching
+
+        self._get_model()  # configures the SDK
+        cache = caching.CachedContent.create(
+            model=PINNED_MODELS.get(self.model_name, self.model_name), contents=parts, tools=tools,
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+        return ContextHandle(cache.name, cache.usage_metadata.total_token_count,
+                             time.time() + ttl, backend=cache)
+
+    def load_context(self, name, token_count=0, expires_at=0.0):
+        from google.generativeai import caching
+
+        self._get_model()
+        return ContextHandle(name, token_count, expires_at, backend=caching.CachedContent.get(name))
+
+    def generate_cached(self, context, contents, generation_config=None):
+        import google.generativeai as genai
+
+        if context.model is None:
+            context.model = genai.GenerativeModel.from_cached_content(cached_content=context.backend)
+        kwargs = {}
+        if generation_config is not None:
+            kwargs["generation_config"] = generation_config
+        return context.model.generate_content(contents, **kwargs)
+
+
+def make_response(text, prompt_tokens=0, completion_tokens=0, cached_tokens=0):
+    """
+    Builds a Gemini-shaped response object from plain text.
+    """
+    part = SimpleNamespace(text=text, function_call=None)
+    candidate = SimpleNamespace(content=SimpleNamespace(parts=[part], role="model"))
+    usage = SimpleNamespace(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=completion_tokens,
+        total_token_count=prompt_tokens + completion_tokens,
+        cached_content_token_count=cached_tokens,
+    )
+    return SimpleNamespace(text=text, candidates=[candidate], usage_metadata=usage)
+
+
+def contents_to_text(contents):
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(p if isinstance(p, str) else str(p) for p in contents)
+
+
+class FakeClient(ModelClient):
+    """
+    Local stand-in backend for benchmarks and offline runs.
+    `reply` is a string or a callable(prompt_text) -> str; latency is uniform
+    in [latency - jitter, latency + jitter] seconds, and `fail_rate` raises a
+    transient error on that fraction of calls.
+    """
+
+    context_cache_min_tokens = 0
+
+    def __init__(self, reply=None, latency=0.05, jitter=0.0, fail_rate=0.0,
+                 model_name="fake-model", seed=None, prefill_per_token=0.0):
+        self.model_name = model_name
+        self.reply = reply if reply is not None else default_judge_reply
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.prefill_per_token = prefill_per_token
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._contexts = {}
+
+    def _delay(self, prompt_tokens=0):
+        base = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, base + prompt_tokens * self.prefill_per_token)
+
+    def _respond(self, contents, context=None):
+        self.calls += 1
+        if self.fail_rate and self._rng.random() < self.fail_rate:
+            raise TransientError("fake backend: simulated 503")
+        text = contents_to_text(contents)
+        cached = 0
+        if context is not None:
+            prefix = self._contexts[context.name]
+            text = prefix + "\n" + text
+            cached = context.token_count
+        out = self.reply(text) if callable(self.reply) else self.reply
+        return make_response(out, prompt_tokens=len(text) // 4,
+                             completion_tokens=len(out) // 4, cached_tokens=cached)
+
+    def _uncached_tokens(self, contents):
+        return len(contents_to_text(contents)) // 4
+
+    def generate(self, contents, generation_config=None, tools=None):
+        time.sleep(self._delay(self._uncached_tokens(contents)))
+        return self._respond(contents)
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        await asyncio.sleep(self._delay(self._uncached_tokens(contents)))
+        return self._respond(contents)
+
+    def create_context(self, parts, tools=None, ttl=3600):
+        text = contents_to_text(parts)
+        name = f"cachedContents/fake-{len(self._contexts)}"
+        self._contexts[name] = text
+        return ContextHandle(name, len(text) // 4, time.time() + ttl)
+
+    def load_context(self, name, token_count=0, expires_at=0.0):
+        if name not in self._contexts:
+            raise KeyError(name)
+        return ContextHandle(name, token_count, expires_at)
+
+    def generate_cached(self, context, contents, generation_config=None):
+        # Only the suffix pays prefill time, like a real cached-context call.
+        time.sleep(self._delay(self._uncached_tokens(contents)))
+        return self._respond(contents, context)
+
+    async def agenerate_cached(self, context, contents, generation_config=None):
+        await asyncio.sleep(self._delay(self._uncached_tokens(contents)))
+        return self._respond(contents, context)
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        # Emit ~16-char chunks with the latency spread across them, like a streamed reply.
+        delay = self._delay(self._uncached_tokens(contents))
+        text = self._respond(contents).text
+        pieces = [text[i:i + 16] for i in range(0, len(text), 16)] or [""]
+        for piece in pieces:
+            time.sleep(delay / len(pieces))
+            yield piece
+
+
+FAKE_SCORE = ('"relevance": 2, "style": 2, "accuracy": 2, "completeness": 1, '
+              '"clarity": 2, "total_score": 9, "comments": "fake judge"')
+
+
+def default_judge_reply(prompt_text):
+    # Batched judge prompts list "Sample id: <id>" per sample and expect an array back.
+    ids = re.findall(r"^Sample id: (.+)$", prompt_text, re.MULTILINE)
+    if ids:
+        return "[" + ", ".join(f'{{"id": {json.dumps(i)}, {FAKE_SCORE}}}' for i in ids) + "]"
+    return "{" + FAKE_SCORE + "}"
+
+
+class TransientError(Exception):
+    """Raised for errors that are worth retrying (rate limits, 5xx, timeouts)."""
+
+
+# Exception class names raised by google-api-core / the Gemini SDK for retryable failures.
+TRANSIENT_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "Aborted",
+}
+
+
+def is_transient(exc):
+    if isinstance(exc, (TransientError, TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    return type(exc).__name__ in TRANSIENT_ERROR_NAMES
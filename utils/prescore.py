@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import zlib
+
+import numpy as np
+
+DEFAULT_THRESHOLDS = "evaluation/prescore_thresholds.json"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Weights of the combined local score; all three metrics are in [0, 1].
+WEIGHTS = {"cosine": 0.4, "rouge_l": 0.3, "token_f1": 0.3}
+
+# Judge total_score (0-10) at or above PASS_MARK counts as a pass, at or below FAIL_MARK as a fail.
+PASS_MARK = 8
+FAIL_MARK = 4
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def _bucket(token, dim):
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(token.encode("utf-8")) % dim
+
+
+def hashed_counts(token_lists, dim=4096, ngrams=(1, 2)):
+    """
+    Hashed n-gram count matrix, shape (len(token_lists), dim), float32.
+    """
+    rows, cols = [], []
+    for i, toks in enumerate(token_lists):
+        for n in ngrams:
+            for j in range(len(toks) - n + 1):
+                rows.append(i)
+                cols.append(_bucket(" ".join(toks[j:j + n]), dim))
+    flat = np.asarray(rows, dtype=np.int64) * dim + np.asarray(cols, dtype=np.int64)
+    counts = np.bincount(flat, minlength=len(token_lists) * dim)
+    return counts.reshape(len(token_lists), dim).astype(np.float32)
+
+
+def rowwise_cosine(a, b):
+    num = np.einsum("ij,ij->i", a, b)
+    den = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+
+def token_f1(a_counts, b_counts):
+    """
+    Bag-of-unigram F1 from hashed unigram count matrices, one value per row.
+    """
+    overlap = np.minimum(a_counts, b_counts).sum(axis=1)
+    a_len = a_counts.sum(axis=1)
+    b_len = b_counts.sum(axis=1)
+    p = np.divide(overlap, a_len, out=np.zeros_like(overlap), where=a_len > 0)
+    r = np.divide(overlap, b_len, out=np.zeros_like(overlap), where=b_len > 0)
+    return np.divide(2 * p * r, p + r, out=np.zeros_like(p), where=(p + r) > 0)
+
+
+def rouge_l(token_lists_a, token_lists_b, max_tokens=256):
+    """
+    ROUGE-L F1 for every pair at once. The LCS table is filled one row of `a`
+    at a time for all pairs together: with padded id matrices A (n, la) and
+    B (n, lb), each row is cur = cummax(max(prev, match ? prev_shifted + 1 : 0)).
+    """
+    n = len(token_lists_a)
+    vocab = {}
+
+    def ids(lists, pad):
+        width = max((min(len(t), max_tokens) for t in lists), default=0)
+        out = np.full((n, max(width, 1)), pad, dtype=np.int64)
+        lens = np.zeros(n, dtype=np.int64)
+        for i, toks in enumerate(lists):
+            toks = toks[:max_tokens]
+            out[i, :len(toks)] = [vocab.setdefault(t, len(vocab)) for t in toks]
+            lens[i] = len(toks)
+        return out, lens
+
+    A, la = ids(token_lists_a, -1)
+    B, lb = ids(token_lists_b, -2)
+    prev = np.zeros((n, B.shape[1] + 1), dtype=np.int32)
+    for i in range(A.shape[1]):
+        match = A[:, i:i + 1] == B
+        t = np.maximum(prev[:, 1:], np.where(match, prev[:, :-1] + 1, 0))
+        prev[:, 1:] = np.maximum.accumulate(t, axis=1)
+    lcs = prev[:, -1].astype(np.float32)
+
+    p = np.divide(lcs, la, out=np.zeros_like(lcs), where=la > 0)
+    r = np.divide(lcs, lb, out=np.zeros_like(lcs), where=lb > 0)
+    return np.divide(2 * p * r, p + r, out=np.zeros_like(p), where=(p + r) > 0)
+
+
+def local_scores(answers, references, dim=4096):
+    """
+    Scores every (answer, reference) pair in one vectorized pass.
+    Returns a dict of float32 arrays: cosine, rouge_l, token_f1 and combined.
+    """
+    ta = [tokenize(t) for t in answers]
+    tb = [tokenize(t) for t in references]
+    cos = rowwise_cosine(hashed_counts(ta, dim), hashed_counts(tb, dim))
+    f1 = token_f1(hashed_counts(ta, dim, ngrams=(1,)), hashed_counts(tb, dim, ngrams=(1,)))
+    rl = rouge_l(ta, tb)
+    combined = WEIGHTS["cosine"] * cos + WEIGHTS["rouge_l"] * rl + WEIGHTS["token_f1"] * f1
+    return {"cosine": cos, "rouge_l": rl, "token_f1": f1, "combined": combined}
+
+
+# ---------- Thresholds ----------
+
+def load_thresholds(path=DEFAULT_THRESHOLDS):
+    """
+    Returns {"low", "high", "slope", "intercept"}; the defaults only auto-score
+    near-copies of the reference and near-zero overlap until calibrated.
+    """
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"low": 0.05, "high": 0.9, "slope": 10.0, "intercept": 0.0}
+
+
+def clamp_unit(value):
+    return min(max(float(value), 0.0), 1.0)
+
+
+def save_thresholds(thresholds, path=DEFAULT_THRESHOLDS):
+    # local scores are in [0, 1]; clamping also keeps ±inf out of the JSON file
+    thresholds = dict(thresholds, low=clamp_unit(thresholds["low"]), high=clamp_unit(thresholds["high"]))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(thresholds, f, indent=2, allow_nan=False)
+
+
+def predicted_total(score, thresholds):
+    return int(np.clip(np.rint(thresholds["slope"] * score + thresholds["intercept"]), 0, 10))
+
+
+def decide(combined, thresholds):
+    """
+    Returns an array of "pass", "fail" or "judge" per sample.
+    """
+    # Compare at the 4-decimal precision local_score is stored with, so
+    # thresholds calibrated from stored results apply to the same samples.
+    combined = np.round(np.asarray(combined, dtype=np.float64), 4)
+    out = np.full(combined.shape, "judge", dtype=object)
+    out[combined >= thresholds["high"]] = "pass"
+    out[combined <= thresholds["low"]] = "fail"
+    return out
+
+
+def auto_evaluation(score, decision, thresholds):
+    return {
+        "total_score": predicted_total(score, thresholds),
+        "comments": f"auto-scored locally ({decision}, similarity {score:.3f})",
+        "auto_scored": True,
+        "local_score": round(float(score), 4),
+    }
+
+
+def calibrate(combined, judge_totals, precision=0.95, min_support=5):
+    """
+    Picks the loosest thresholds whose auto-pass / auto-fail bands still agree
+    with the judge at least `precision` of the time, and fits a linear map from
+    local score to judge total_score for auto-scored samples. A band with no
+    qualifying threshold is pinned to the end of [0, 1] (exact copies pass,
+    zero overlap fails).
+    """
+    s = np.asarray(combined, dtype=np.float64)
+    y = np.asarray(judge_totals, dtype=np.float64)
+    order = np.argsort(-s)
+
+    # high: walk down from the most similar; precision of "pass" among s >= t
+    passed = np.cumsum(y[order] >= PASS_MARK)
+    n = np.arange(1, len(s) + 1)
+    ok = (passed / n >= precision) & (n >= min_support)
+    high = float(s[order][np.nonzero(ok)[0].max()]) if ok.any() else 1.0
+
+    # low: walk up from the least similar; precision of "fail" among s <= t
+    asc = order[::-1]
+    failed = np.cumsum(y[asc] <= FAIL_MARK)
+    ok = (failed / n >= precision) & (n >= min_support)
+    low = float(s[asc][np.nonzero(ok)[0].max()]) if ok.any() else 0.0
+    if low >= high:
+        low = 0.0
+
+    slope, intercept = (np.polyfit(s, y, 1) if len(s) >= 2 and np.ptp(s) > 0 else (10.0, 0.0))
+    return {"low": clamp_unit(low), "high": clamp_unit(high), "slope": float(slope), "intercept": float(intercept)}
+
+
+def agreement(combined, judge_totals, thresholds):
+    """
+    How well local decisions match the judge on samples that have both.
+    """
+    s = np.asarray(combined, dtype=np.float64)
+    y = np.asarray(judge_totals, dtype=np.float64)
+    d = decide(s, thresholds)
+    pred = np.clip(np.rint(thresholds["slope"] * s + thresholds["intercept"]), 0, 10)
+    report = {"samples": int(len(s))}
+    for band, ok in (("pass", y >= PASS_MARK), ("fail", y <= FAIL_MARK)):
+        mask = d == band
+        report[f"auto_{band}"] = int(mask.sum())
+        report[f"auto_{band}_precision"] = float(ok[mask].mean()) if mask.any() else None
+    auto = d != "judge"
+    report["judge_fraction"] = float(1 - auto.mean()) if len(s) else None
+    report["auto_mae"] = float(np.abs(pred[auto] - y[auto]).mean()) if auto.any() else None
+    report["pearson"] = float(np.corrcoef(s, y)[0, 1]) if len(s) > 1 and np.ptp(s) and np.ptp(y) else None
+    return report
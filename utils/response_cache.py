@@ -0,0 +1,226 @@
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import threading
+import dataclasses
+
+from utils.model_client import ModelClient, make_response
+
+DEFAULT_PATH = "cache/responses.sqlite"
+
+# SMARTTUTOR_CACHE=off skips the cache entirely, =refresh re-calls the model and overwrites entries.
+CACHE_MODE_ENV = "SMARTTUTOR_CACHE"
+CACHE_MODES = ("on", "off", "refresh")
+
+
+def canonical(obj):
+    """
+    Turns prompt parts, tools and generation configs (dicts or SDK objects)
+    into plain JSON-able values so equal requests hash identically.
+    """
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, dict):
+        return {str(k): canonical(v) for k, v in obj.items() if v is not None}
+    if isinstance(obj, (list, tuple)):
+        return [canonical(v) for v in obj]
+    if dataclasses.is_dataclass(obj):
+        return canonical(dataclasses.asdict(obj))
+    for attr in ("to_dict", "_asdict"):
+        if hasattr(obj, attr):
+            return canonical(getattr(obj, attr)())
+    if hasattr(obj, "to_proto"):
+        return str(obj.to_proto())
+    return repr(obj)
+
+
+def cache_key(model_name, contents, tools=None, generation_config=None):
+    payload = json.dumps(
+        [model_name, canonical(contents), canonical(tools), canonical(generation_config)],
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def response_text(resp):
+    """
+    Returns the text of a response, or None when it isn't plain text
+    (e.g. a function call), which we never cache.
+    """
+    try:
+        parts = resp.candidates[0].content.parts
+        if any(getattr(p, "function_call", None) for p in parts):
+            return None
+        return resp.text
+    except Exception:
+        return None
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of model responses in SQLite (WAL mode, so
+    several processes can read and write it). Entries are evicted least-recently-
+    used first once the cache exceeds `max_bytes`, and dropped after `max_age` seconds.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=256 * 1024 * 1024,
+                 max_age=30 * 24 * 3600, evict_every=64):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_every = evict_every
+        self._puts = 0
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    text TEXT,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    size INTEGER,
+                    created_at REAL,
+                    accessed_at REAL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed_at)")
+        self.evict()
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads; keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT text, prompt_tokens, completion_tokens, created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if self.max_age and now - row[3] > self.max_age:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return {"text": row[0], "prompt_tokens": row[1], "completion_tokens": row[2]}
+
+    def put(self, key, model_name, text, prompt_tokens=0, completion_tokens=0):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model_name, text, prompt_tokens, completion_tokens,
+                 len(text.encode("utf-8")), now, now),
+            )
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        """
+        Drops expired entries, then least-recently-used ones until under `max_bytes`.
+        """
+        with self._conn() as conn:
+            if self.max_age:
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            excess = total - self.max_bytes
+            freed, doomed = 0, []
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                doomed.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+class CachedClient(ModelClient):
+    """
+    Wraps any ModelClient with the response cache. `mode` is "on", "off"
+    (bypass) or "refresh" (always call the model, then overwrite the entry).
+    """
+
+    def __init__(self, client, cache=None, mode=None):
+        self.client = client
+        self.model_name = client.model_name
+        self.cache = cache if cache is not None else ResponseCache()
+        self.mode = mode or os.getenv(CACHE_MODE_ENV) or "on"
+        if self.mode not in CACHE_MODES:
+            raise ValueError(f"unknown cache mode {self.mode!r} (expected one of: {', '.join(CACHE_MODES)})")
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        if self.mode != "on":
+            return None
+        hit = self.cache.get(key)
+        if hit is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        resp = make_response(hit["text"], hit["prompt_tokens"], hit["completion_tokens"])
+        resp.cached = True
+        return resp
+
+    def _store(self, key, resp):
+        if self.mode == "off":
+            return
+        text = response_text(resp)
+        if text is None:
+            return
+        usage = getattr(resp, "usage_metadata", None)
+        self.cache.put(key, self.model_name, text,
+                       getattr(usage, "prompt_token_count", 0) or 0,
+                       getattr(usage, "candidates_token_count", 0) or 0)
+
+    def generate(self, contents, generation_config=None, tools=None):
+        key = cache_key(self.model_name, contents, tools, generation_config)
+        resp = self._lookup(key)
+        if resp is None:
+            resp = self.client.generate(contents, generation_config, tools)
+            self._store(key, resp)
+        return resp
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        key = cache_key(self.model_name, contents, tools, generation_config)
+        # sqlite may wait out another writer's lock; don't stall the event loop on it
+        resp = await asyncio.to_thread(self._lookup, key)
+        if resp is None:
+            resp = await self.client.agenerate(contents, generation_config, tools)
+            await asyncio.to_thread(self._store, key, resp)
+        return resp
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        key = cache_key(self.model_name, contents, tools, generation_config)
+        resp = self._lookup(key)
+        if resp is not None:
+            yield resp.text
+            return
+        chunks = []
+        for chunk in self.client.generate_stream(contents, generation_config, tools):
+            chunks.append(chunk)
+            yield chunk
+        # Only reached when the caller consumed the whole stream (not aborted early).
+        if self.mode != "off":
+            self.cache.put(key, self.model_name, "".join(chunks))
+
+
+def cached(client, path=DEFAULT_PATH, mode=None):
+    return CachedClient(client, ResponseCache(path), mode=mode)
@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from utils.prescore import tokenize, hashed_counts
+from utils.context_cache import estimate_tokens
+from utils.templates import load_template
+
+DEFAULT_INDEX = "index"
+CONTEXT_PROMPT = "prompts/retrieved_context.txt"
+
+# Rows scored per block during search; bounds the temporary score buffer.
+SEARCH_BLOCK = 1 << 16
+
+# Function words carry no topic signal and would otherwise dominate short queries.
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from how i if in into is it its
+me my of on or so than that the their them then there these they this to was we what
+when where which who why will with would you your
+""".split())
+
+
+class HashedEmbedder:
+    """
+    Default offline embedder: hashed presence of word uni/bi-grams (stopwords
+    dropped), L2-normalized, so repeated filler can't drown out rarer terms.
+    Any object with `name`, `dim` and embed(texts) -> float32 array of shape
+    (len(texts), dim) can be used instead.
+    """
+    name = "hashed-ngram"
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def embed(self, texts):
+        tokens = [[t for t in tokenize(text) if t not in STOPWORDS] for text in texts]
+        vecs = np.minimum(hashed_counts(tokens, self.dim), 1.0)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        return np.divide(vecs, norms, out=np.zeros_like(vecs), where=norms > 0)
+
+
+def chunk_text(text, chunk_words=200, overlap=40):
+    """
+    Splits text into ~chunk_words-word chunks on paragraph boundaries where
+    possible, repeating the last `overlap` words so answers aren't cut in half.
+    """
+    if not 0 <= overlap < chunk_words:
+        # the window below advances by chunk_words - overlap words and would never finish
+        raise ValueError(f"overlap must be >= 0 and < chunk_words ({chunk_words}), got {overlap}")
+    words, chunks = [], []
+    for para in text.split("\n\n"):
+        para_words = para.split()
+        # close the chunk at the paragraph break unless the paragraph is too
+        # long for one chunk anyway, in which case the window below splits it
+        if words and len(words) + len(para_words) > chunk_words and len(para_words) <= chunk_words:
+            chunks.append(" ".join(words))
+            words = words[-overlap:] if overlap and len(words) > overlap else []
+        words.extend(para_words)
+        while len(words) > chunk_words:
+            chunks.append(" ".join(words[:chunk_words]))
+            words = words[chunk_words - overlap:]
+    if words and (not chunks or len(words) > overlap):
+        chunks.append(" ".join(words))
+    return chunks
+
+
+class VectorIndex:
+    """
+    On-disk vector store in `path`:
+      manifest.json  embedder name, dim, row count, subject codes, chunks per source
+      vectors.f32    float32 matrix, memory-mapped for search (never fully loaded)
+      subjects.u16   subject code per row, for filtered search
+      chunks.jsonl   {"id", "source", "subject", "text"} per row
+      offsets.u64    byte offset of each row in chunks.jsonl
+    add() appends to these files, so documents can be added without a rebuild.
+    The manifest is written last; rows past its count (left by a crash mid-add)
+    are truncated away on open and before the next append.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX, embedder=None):
+        self.path = path
+        self.embedder = embedder or HashedEmbedder()
+        os.makedirs(path, exist_ok=True)
+        manifest = self._file("manifest.json")
+        if os.path.exists(manifest):
+            with open(manifest, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+            if (self.manifest["embedder"], self.manifest["dim"]) != (self.embedder.name, self.embedder.dim):
+                raise ValueError(f"{path} was built with {self.manifest['embedder']}/{self.manifest['dim']}, "
+                                 f"not {self.embedder.name}/{self.embedder.dim}")
+        else:
+            self.manifest = {"embedder": self.embedder.name, "dim": self.embedder.dim,
+                             "count": 0, "subjects": {}}
+        self._truncate()
+        self._open()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        n, dim = self.manifest["count"], self.manifest["dim"]
+        if n:
+            self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(n, dim))
+            self.subjects = np.memmap(self._file("subjects.u16"), dtype=np.uint16, mode="r", shape=(n,))
+            self.offsets = np.memmap(self._file("offsets.u64"), dtype=np.uint64, mode="r", shape=(n,))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+            self.subjects = np.zeros(0, dtype=np.uint16)
+            self.offsets = np.zeros(0, dtype=np.uint64)
+
+    def _truncate(self):
+        """
+        Cuts every file back to the manifest's row count, and chunks.jsonl to
+        the end of the last counted row.
+        """
+        n, dim = self.manifest["count"], self.manifest["dim"]
+        chunks_end = 0
+        if n:
+            last = np.fromfile(self._file("offsets.u64"), dtype=np.uint64, count=1, offset=(n - 1) * 8)
+            with open(self._file("chunks.jsonl"), "rb") as f:
+                f.seek(int(last[0]))
+                chunks_end = f.tell() + len(f.readline())
+        sizes = {"vectors.f32": n * dim * 4, "subjects.u16": n * 2, "offsets.u64": n * 8,
+                 "chunks.jsonl": chunks_end}
+        for name, size in sizes.items():
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def __len__(self):
+        return self.manifest["count"]
+
+    def _subject_code(self, subject):
+        codes = self.manifest["subjects"]
+        key = (subject or "").strip().lower()
+        if key not in codes:
+            codes[key] = len(codes)
+        return codes[key]
+
+    def add(self, texts, source="", subject=None, batch=1024):
+        """
+        Embeds and appends chunks. Returns the number of rows added.
+        """
+        self._truncate()
+        code = self._subject_code(subject)
+        # chunk ids continue from earlier adds of the same source, so they stay unique
+        first = self.manifest.setdefault("sources", {}).get(source, 0)
+        added = 0
+        chunks_path = self._file("chunks.jsonl")
+        for start in range(0, len(texts), batch):
+            part = texts[start:start + batch]
+            vecs = self.embedder.embed(part).astype(np.float32)
+            offsets = []
+            with open(chunks_path, "ab") as f:
+                for i, text in enumerate(part):
+                    offsets.append(f.tell())
+                    row = {"id": f"{source}#{first + start + i}", "source": source,
+                           "subject": subject, "text": text}
+                    f.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vecs.tobytes())
+            with open(self._file("subjects.u16"), "ab") as f:
+                f.write(np.full(len(part), code, dtype=np.uint16).tobytes())
+            with open(self._file("offsets.u64"), "ab") as f:
+                f.write(np.asarray(offsets, dtype=np.uint64).tobytes())
+            added += len(part)
+
+        # manifest last: a crash before this leaves rows that _truncate() drops
+        self.manifest["count"] += added
+        self.manifest["sources"][source] = first + added
+        tmp = self._file("manifest.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self._file("manifest.json"))
+        self._open()
+        return added
+
+    def add_file(self, path, subject=None, chunk_words=200, overlap=40):
+        with open(path, "r", encoding="utf-8") as f:
+            return self.add(chunk_text(f.read(), chunk_words, overlap), source=path, subject=subject)
+
+    def chunk(self, row):
+        with open(self._file("chunks.jsonl"), "rb") as f:
+            f.seek(int(self.offsets[row]))
+            return json.loads(f.readline())
+
+    def search(self, query, k=5, subject=None):
+        """
+        Top-k chunks by cosine similarity, optionally restricted to one subject.
+        Scans the memory-mapped matrix block by block with argpartition, so
+        only one block of scores is in memory at a time.
+        """
+        n = len(self)
+        if n == 0 or k <= 0:
+            return []
+        code = None
+        if subject is not None:
+            code = self.manifest["subjects"].get(str(subject).strip().lower())
+            if code is None:
+                return []
+        q = self.embedder.embed([query])[0].astype(np.float32)
+
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for start in range(0, n, SEARCH_BLOCK):
+            block = self.vectors[start:start + SEARCH_BLOCK]
+            scores = block @ q
+            rows = np.arange(start, start + len(block))
+            if code is not None:
+                keep = self.subjects[start:start + len(block)] == code
+                scores, rows = scores[keep], rows[keep]
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                scores, rows = scores[top], rows[top]
+            best_scores = np.concatenate([best_scores, scores])
+            best_rows = np.concatenate([best_rows, rows])
+            if len(best_scores) > k:
+                top = np.argpartition(-best_scores, k - 1)[:k]
+                best_scores, best_rows = best_scores[top], best_rows[top]
+
+        order = np.argsort(-best_scores)
+        return [dict(self.chunk(int(best_rows[i])), score=float(best_scores[i])) for i in order]
+
+
+def format_context(passages, token_budget=600):
+    """
+    Renders retrieved passages into the course-material prompt block, adding
+    them best-first until the estimated token budget is used up.
+    """
+    kept, used = [], 0
+    for p in passages:
+        block = f"[{p['source']}] {p['text']}"
+        cost = estimate_tokens(block)
+        if used + cost > token_budget:
+            if not kept:
+                # always include something: trim the best passage to fit
+                kept.append(block[:token_budget * 4])
+            break
+        kept.append(block)
+        used += cost
+    if not kept:
+        return ""
+    return load_template(CONTEXT_PROMPT).render(passages="\n\n".join(kept))
+
+
+def retrieve_context(index, user_query, learner_data, k=5, token_budget=600, min_score=0.05):
+    """
+    Course-material block for a prompt, searched within the learner's subject
+    first and the whole index if that subject has no material. Returns "" when
+    nothing scores above `min_score`.
+    """
+    subject = (learner_data or {}).get("subject")
+    passages = index.search(user_query, k=k, subject=subject)
+    if not passages and subject is not None:
+        passages = index.search(user_query, k=k)
+    return format_context([p for p in passages if p["score"] > min_score], token_budget)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m utils.retrieval",
+                                description="Build and query the course-material index.")
+    p.add_argument("--index", default=DEFAULT_INDEX)
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    add = sub.add_parser("add", help="chunk and index text/markdown files")
+    add.add_argument("paths", nargs="+")
+    add.add_argument("--subject", help="e.g. 'Computer Science' (matches learner_data['subject'])")
+    add.add_argument("--chunk-words", type=int, default=200)
+    add.add_argument("--overlap", type=int, default=40)
+
+    search = sub.add_parser("search", help="top-k chunks for a query")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=5)
+    search.add_argument("--subject")
+
+    args = p.parse_args(argv)
+    if args.cmd == "add" and not 0 <= args.overlap < args.chunk_words:
+        p.error("--overlap must be >= 0 and smaller than --chunk-words")
+    index = VectorIndex(args.index)
+    if args.cmd == "add":
+        files = []
+        for path in args.paths:
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    files += [os.path.join(root, n) for n in sorted(names) if n.endswith((".txt", ".md"))]
+            else:
+                files.append(path)
+        total = sum(index.add_file(f, args.subject, args.chunk_words, args.overlap) for f in files)
+        print(f"✅ Indexed {total} chunks from {len(files)} file(s) → {args.index} ({len(index)} total)")
+    else:
+        for hit in index.search(args.query, args.k, args.subject):
+            print(f"{hit['score']:.3f}  {hit['id']}  {hit['text'][:100]!r}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.model_client import ModelClient, is_transient
+from utils.compaction import default_estimator
+from utils.telemetry import percentile
+
+# ---------- Latency / error tracking ----------
+
+class LatencyTracker:
+    """
+    Rolling window of recent call latencies and outcomes for one model.
+    Attempts abandoned by a hedge are recorded with their elapsed time as a
+    lower bound, so the tail estimate doesn't shrink just because slow calls
+    get cut short.
+    """
+
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, latency, ok=True):
+        with self._lock:
+            self.latencies.append(latency)
+            self.outcomes.append(ok)
+
+    def quantile(self, q):
+        with self._lock:
+            values = sorted(self.latencies)
+        return percentile(values, q) if values else None
+
+    def error_rate(self):
+        with self._lock:
+            outcomes = list(self.outcomes)
+        return 1 - sum(outcomes) / len(outcomes) if outcomes else 0.0
+
+    def __len__(self):
+        return len(self.latencies)
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def tracker_for(model_name):
+    """
+    Process-wide tracker per model, shared by the hedging layer and the router.
+    """
+    with _trackers_lock:
+        if model_name not in _trackers:
+            _trackers[model_name] = LatencyTracker()
+        return _trackers[model_name]
+
+
+# ---------- Deadlines ----------
+
+# Per-call deadline override in seconds; None falls back to the client default.
+call_deadline = contextvars.ContextVar("call_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    `with deadline(5): await client.agenerate(...)` caps calls made inside the block.
+    """
+    token = call_deadline.set(seconds)
+    try:
+        yield
+    finally:
+        call_deadline.reset(token)
+
+
+# ---------- Hedged requests ----------
+
+class HedgedClient(ModelClient):
+    """
+    Sends a second copy of a slow request once it has run longer than the
+    model's recent p95 latency, and returns whichever copy finishes first.
+    Hedges are capped at `max_hedge_ratio` of calls so a slow backend can't
+    double the load on itself. Every call is bounded by `deadline` seconds
+    (TimeoutError, which the retry loop treats as transient).
+
+    Blocking calls are hedged on a small thread pool; the losing thread can't
+    be interrupted, so its result is simply dropped.
+
+    An attempt cut off by the deadline counts as a failure in the latency
+    tracker; a hedge cancelled because the other copy won counts as a success.
+    """
+
+    def __init__(self, client, deadline=60.0, quantile=95, min_samples=20,
+                 initial_delay=None, min_delay=0.05, max_hedge_ratio=0.1):
+        self.client = client
+        self.model_name = client.model_name
+        self.context_cache_min_tokens = client.context_cache_min_tokens
+        self.deadline = deadline
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.tracker = tracker_for(client.model_name)
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._pool = None
+
+    def _hedge_delay(self):
+        """
+        Seconds to wait before hedging, or None to not hedge this call.
+        """
+        if self.hedges >= self.max_hedge_ratio * max(self.calls, 1):
+            return None
+        if len(self.tracker) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, self.tracker.quantile(self.quantile))
+
+    def _deadline(self):
+        override = call_deadline.get()
+        return override if override is not None else self.deadline
+
+    # ---------- async ----------
+
+    async def _attempt(self, make_call, call):
+        start = time.perf_counter()
+        try:
+            resp = await make_call()
+        except asyncio.CancelledError:
+            self.tracker.observe(time.perf_counter() - start, ok=not call["timed_out"])
+            raise
+        except Exception:
+            self.tracker.observe(time.perf_counter() - start, ok=False)
+            raise
+        self.tracker.observe(time.perf_counter() - start, ok=True)
+        return resp
+
+    async def _hedged(self, make_call):
+        self.calls += 1
+        limit = self._deadline()
+        end = None if limit is None else time.monotonic() + limit
+
+        def remaining():
+            return None if end is None else max(0.0, end - time.monotonic())
+
+        call = {"timed_out": False}
+        tasks = [asyncio.ensure_future(self._attempt(make_call, call))]
+        try:
+            delay = self._hedge_delay()
+            if delay is not None and (end is None or delay < remaining()):
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self.hedges += 1
+                    tasks.append(asyncio.ensure_future(self._attempt(make_call, call)))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=remaining(),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    call["timed_out"] = True
+                    raise TimeoutError(f"{self.model_name}: no response within {limit}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        return await self._hedged(lambda: self.client.agenerate(contents, generation_config, tools))
+
+    async def agenerate_cached(self, context, contents, generation_config=None):
+        return await self._hedged(lambda: self.client.agenerate_cached(context, contents, generation_config))
+
+    # ---------- blocking ----------
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+        return self._pool
+
+    def _timed(self, fn, call):
+        start = time.perf_counter()
+        ok = False
+        try:
+            resp = fn()
+            ok = True
+            return resp
+        finally:
+            # a deadline that gave up on this attempt has already counted it as failed
+            if not call["timed_out"]:
+                self.tracker.observe(time.perf_counter() - start, ok=ok)
+
+    def _hedged_sync(self, fn):
+        self.calls += 1
+        limit = self._deadline()
+        end = None if limit is None else time.monotonic() + limit
+
+        def remaining():
+            return None if end is None else max(0.0, end - time.monotonic())
+
+        pool = self._executor()
+        call = {"timed_out": False}
+        started = time.perf_counter()
+        futures = [pool.submit(self._timed, fn, call)]
+        delay = self._hedge_delay()
+        if delay is not None and (end is None or delay < remaining()):
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                self.hedges += 1
+                hedge_started = time.perf_counter()
+                futures.append(pool.submit(self._timed, fn, call))
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                call["timed_out"] = True
+                now = time.perf_counter()
+                for future in pending:
+                    self.tracker.observe(now - (started if future is futures[0] else hedge_started), ok=False)
+                raise TimeoutError(f"{self.model_name}: no response within {limit}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def generate(self, contents, generation_config=None, tools=None):
+        return self._hedged_sync(lambda: self.client.generate(contents, generation_config, tools))
+
+    def generate_cached(self, context, contents, generation_config=None):
+        return self._hedged_sync(lambda: self.client.generate_cached(context, contents, generation_config))
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        # A stream is already delivering tokens; hedging it would duplicate output.
+        return self.client.generate_stream(contents, generation_config, tools)
+
+    def create_context(self, parts, tools=None, ttl=3600):
+        return self.client.create_context(parts, tools, ttl)
+
+    def load_context(self, name, token_count=0, expires_at=0.0):
+        return self.client.load_context(name, token_count, expires_at)
+
+
+def hedged(client, deadline=60.0, **kwargs):
+    return HedgedClient(client, deadline=deadline, **kwargs)
+
+
+# ---------- Tiered routing ----------
+
+class Tier:
+    """
+    One model option: `max_prompt_tokens` is the largest prompt it should get,
+    `slo` the p95 latency (seconds) above which it counts as degraded.
+    """
+
+    def __init__(self, name, client, max_prompt_tokens, slo):
+        self.name = name
+        self.client = client
+        self.max_prompt_tokens = max_prompt_tokens
+        self.slo = slo
+        self.tracker = tracker_for(client.model_name)
+        self.calls = 0
+
+    def healthy(self, max_error_rate=0.25):
+        p95 = self.tracker.quantile(95)
+        return self.tracker.error_rate() <= max_error_rate and (p95 is None or p95 <= self.slo)
+
+
+# Default model tiers, cheapest first, and which tiers each task may use.
+DEFAULT_TIERS = [
+    ("small", "gemini-1.5-flash-8b", 8000, 4.0),
+    ("standard", "gemini-1.5-flash", 100000, 8.0),
+    ("large", "gemini-1.5-pro", 1000000, 20.0),
+]
+
+TASK_TIERS = {
+    "judge": ("small", "standard"),
+    "lesson": ("standard", "large"),
+}
+
+
+class RoutedClient(ModelClient):
+    """
+    Picks a model tier per call: the cheapest tier allowed for `task` whose
+    prompt limit fits the request and whose observed p95 and error rate are
+    within bounds. If none is healthy, the least-bad eligible tier is used.
+    A transient failure falls through to the next eligible tier. Every
+    `probe_every`-th call goes to a degraded tier first so it can recover.
+    """
+
+    def __init__(self, tiers, task, probe_every=20):
+        allowed = TASK_TIERS.get(task)
+        self.tiers = [t for t in tiers if allowed is None or t.name in allowed]
+        if not self.tiers:
+            raise ValueError(f"no tiers configured for task {task!r}")
+        self.task = task
+        self.probe_every = probe_every
+        self.model_name = f"route:{task}"
+        self._routed = 0
+
+    def candidates(self, contents):
+        """
+        Eligible tiers for this request, best choice first.
+        """
+        tokens = default_estimator().estimate(contents)
+        fits = [t for t in self.tiers if tokens <= t.max_prompt_tokens] or self.tiers[-1:]
+        healthy = [t for t in fits if t.healthy()]
+        degraded = [t for t in fits if t not in healthy]
+        self._routed += 1
+        if degraded and healthy and self._routed % self.probe_every == 0:
+            return degraded + healthy
+        degraded.sort(key=lambda t: (t.tracker.error_rate(), t.tracker.quantile(95) or 0.0))
+        return healthy + degraded
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        error = None
+        for tier in self.candidates(contents):
+            tier.calls += 1
+            try:
+                return await tier.client.agenerate(contents, generation_config, tools)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                error = e
+        raise error
+
+    def generate(self, contents, generation_config=None, tools=None):
+        error = None
+        for tier in self.candidates(contents):
+            tier.calls += 1
+            try:
+                return tier.client.generate(contents, generation_config, tools)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                error = e
+        raise error
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        tier = self.candidates(contents)[0]
+        tier.calls += 1
+        return tier.client.generate_stream(contents, generation_config, tools)
+
+    def routes(self):
+        return {t.name: t.calls for t in self.tiers}
+
+
+# ---------- Client stacks ----------
+
+def build_client(tag, task=None, fake=False, route=False, cache_mode=None, deadline=60.0, reply=None,
+                 compact=False, max_prompt_tokens=None, truncate=False):
+    """
+    The standard stack, per model: instrumented(cached(context_cached(hedged(backend)))).
+    With `route`, one stack per tier behind a RoutedClient for `task`.
+    With `compact` prompts are compacted, and with a `max_prompt_tokens` budget
+    checked against it, in a stage in front of everything else.
+    """
+    from utils.model_client import GeminiClient, FakeClient
+    from utils.response_cache import cached
+    from utils.context_cache import context_cached, DEFAULT_REGISTRY
+    from utils.telemetry import instrumented
+
+    def stack(model_name, fake_latency):
+        if fake:
+            backend = FakeClient(reply=reply, latency=fake_latency, jitter=fake_latency / 2,
+                                 model_name=f"fake-{model_name}")
+            inner = context_cached(hedged(backend, deadline))
+        else:
+            inner = context_cached(hedged(GeminiClient(model_name), deadline), registry_path=DEFAULT_REGISTRY)
+        return instrumented(cached(inner, mode=cache_mode), tag=tag)
+
+    if not route:
+        client = stack("gemini-1.5-flash", 0.05)
+    else:
+        tiers = [Tier(name, stack(model, 0.03 * (i + 1)), max_tokens, slo)
+                 for i, (name, model, max_tokens, slo) in enumerate(DEFAULT_TIERS)]
+        client = RoutedClient(tiers, task)
+    if compact or max_prompt_tokens:
+        from utils.compaction import compacted
+        client = compacted(client, budget=max_prompt_tokens, truncate=truncate, compact=compact)
+    return client
+
+
+def layers(client):
+    """
+    Every wrapper layer under `client`, following tiers and `.client` links.
+    """
+    stack = [client]
+    while stack:
+        c = stack.pop()
+        yield c
+        stack.extend(t.client for t in getattr(c, "tiers", []) if isinstance(t, Tier))
+        if getattr(c, "client", None) is not None:
+            stack.append(c.client)
+
+
+def cache_counts(client):
+    """
+    (hits, misses) summed over all response-cache layers under `client`.
+    """
+    hits = misses = 0
+    for layer in layers(client):
+        if hasattr(layer, "hits") and hasattr(layer, "misses"):
+            hits += layer.hits
+            misses += layer.misses
+    return hits, misses
@@ -0,0 +1,122 @@
+import time
+import asyncio
+import random
+import contextvars
+
+from utils.model_client import is_transient
+
+# Retry attempt of the call currently in flight (0 = first try); read by telemetry.
+current_attempt = contextvars.ContextVar("current_attempt", default=0)
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter: `rate` requests/second with bursts up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+def backoff_delay(attempt, base=0.5, cap=20.0):
+    """
+    Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)].
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def call_with_retry(fn, retries=4, base_delay=0.5, max_delay=20.0, limiter=None):
+    """
+    Awaits `fn()` (a coroutine factory), retrying transient errors with jittered backoff.
+    Returns (result, attempts_used).
+    """
+    attempt = 0
+    while True:
+        if limiter is not None:
+            await limiter.acquire()
+        current_attempt.set(attempt)
+        try:
+            return await fn(), attempt
+        except Exception as e:
+            if attempt >= retries or not is_transient(e):
+                raise
+            await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
+            attempt += 1
+
+
+async def run_all(items, worker, concurrency=8, rps=None, retries=4, base_delay=0.5):
+    """
+    Runs `worker(item)` for every item with at most `concurrency` in flight and at
+    most `rps` calls per second. Results come back in the original item order;
+    a job that still fails after retries yields its exception instead of a result.
+    """
+    limiter = TokenBucket(rps) if rps else None
+    sem = asyncio.Semaphore(concurrency)
+    results = [None] * len(items)
+
+    async def run_one(i, item):
+        async with sem:
+            try:
+                results[i], _ = await call_with_retry(
+                    lambda: worker(item), retries=retries,
+                    base_delay=base_delay, limiter=limiter,
+                )
+            except Exception as e:
+                results[i] = e
+
+    await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+    return results
+
+
+async def run_stream(items, worker, concurrency=8, rps=None, retries=4, base_delay=0.5):
+    """
+    Streaming counterpart of run_all(): pulls from any iterable lazily, keeps at
+    most `concurrency` jobs in flight, and yields (item, result_or_exception)
+    as each job finishes, so memory stays bounded for very large inputs.
+    """
+    limiter = TokenBucket(rps) if rps else None
+    it = iter(items)
+    in_flight = set()
+
+    async def run_one(item):
+        try:
+            result, _ = await call_with_retry(
+                lambda: worker(item), retries=retries,
+                base_delay=base_delay, limiter=limiter,
+            )
+        except Exception as e:
+            result = e
+        return item, result
+
+    def fill():
+        while len(in_flight) < concurrency:
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            in_flight.add(asyncio.ensure_future(run_one(item)))
+
+    fill()
+    while in_flight:
+        finished, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            in_flight.discard(task)
+            yield task.result()
+        fill()
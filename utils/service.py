@@ -0,0 +1,394 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from utils.response_cache import cache_key
+from utils.json_stream import extract_json, StreamAbort
+from utils.lesson_schema import repair_lesson, format_errors
+from utils.runner import call_with_retry
+from utils.routing import build_client, cache_counts
+from utils.strategies import smart_tutor, zero_shot, dynamic
+from utils.sessions import SessionStore, SQLiteSessions, ModelSummarizer
+from utils.compaction import PromptTooLong
+
+# Largest request body accepted; tutor requests are a few hundred bytes.
+MAX_BODY = 64 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+           502: "Bad Gateway"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Saturated(HTTPError):
+    def __init__(self):
+        super().__init__(429, "server busy, retry shortly")
+
+
+class Coalescer:
+    """
+    Runs at most one job per key at a time: callers asking for a key that is
+    already in flight await the same future instead of starting a new job.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.joined = 0
+
+    def get(self, key):
+        return self._inflight.get(key)
+
+    def add(self, key, future):
+        self._inflight[key] = future
+        self.started += 1
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    def __len__(self):
+        return len(self._inflight)
+
+
+# ---------- Flows ----------
+
+# expected JSON types of the request fields the flows read
+FIELD_TYPES = {"topic": str, "grade": (str, int), "user_query": str, "learner_data": dict,
+               "generation_config": dict, "history": str}
+
+
+def require(body, *fields):
+    missing = [f for f in fields if f not in body]
+    if missing:
+        raise HTTPError(400, f"missing field(s): {', '.join(missing)}")
+    wrong = [f for f, t in FIELD_TYPES.items() if body.get(f) is not None and not isinstance(body[f], t)]
+    if wrong:
+        raise HTTPError(400, f"wrong type for field(s): {', '.join(wrong)}")
+
+
+def needs(build, *fields):
+    def checked(body):
+        require(body, *fields)
+        return build(body)
+    return checked
+
+
+def parse_json_reply(text):
+    try:
+        return extract_json(text)
+    except StreamAbort as e:
+        raise HTTPError(502, f"model returned unparseable JSON: {e}")
+
+
+async def finish_lesson(service, resp):
+    data = parse_json_reply(resp.text)
+    # repair_lesson() makes blocking calls, so it runs on a worker thread
+    data, errors, calls = await asyncio.to_thread(repair_lesson, data, service.client)
+    out = {"lesson": data, "repair_calls": calls}
+    if errors:
+        out["invalid"] = format_errors(errors)
+    return out
+
+
+async def finish_smart_tutor(service, resp):
+    return {"lesson": parse_json_reply(resp.text)}
+
+
+async def finish_dynamic(service, resp):
+    return {"explanation": resp.text}
+
+
+# flow name -> (build contents from request body, turn the model response into the reply)
+FLOWS = {
+    "smart-tutor": (needs(smart_tutor, "topic", "grade"), finish_smart_tutor),
+    "lesson": (needs(zero_shot, "topic", "grade"), finish_lesson),
+    "dynamic": (needs(dynamic, "user_query"), finish_dynamic),
+}
+
+# flows that accept a "session_id" -> reply field recorded as the tutor's turn
+SESSION_FLOWS = {"dynamic": "explanation"}
+
+
+class TutorService:
+    """
+    Serves the tutor flows over one shared model client.
+
+    Identical in-flight requests (same flow, prompt and config) are coalesced
+    onto one upstream call. New work goes through a bounded queue drained by
+    `workers` tasks; when the queue is full the request is refused with a 429
+    instead of piling up latency for everyone.
+
+    Requests to a session flow with a "session_id" get that learner's
+    conversation so far (see utils/sessions.py); the job records the exchange
+    once, after the upstream call. Session requests only coalesce with requests
+    for the same session, so every learner's history gets its own exchange.
+    """
+
+    def __init__(self, client, workers=8, queue_size=64, retries=2, timeout=60.0, sessions=None):
+        self.client = client
+        self.sessions = sessions
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.coalescer = Coalescer()
+        self.requests = 0
+        self.rejected = 0
+        self.upstream_calls = 0
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _worker(self):
+        while True:
+            flow, contents, config, exchange, future = await self.queue.get()
+            try:
+                result = await self._run(flow, contents, config, exchange)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, flow, contents, config, exchange=None):
+        _, finish = FLOWS[flow]
+        self.upstream_calls += 1
+        try:
+            resp, _ = await asyncio.wait_for(
+                call_with_retry(lambda: self.client.agenerate(contents, config), retries=self.retries),
+                self.timeout)
+        except HTTPError:
+            raise
+        except PromptTooLong as e:
+            raise HTTPError(413, str(e))
+        except Exception as e:
+            raise HTTPError(502, f"upstream call failed: {e!r}")
+        result = await finish(self, resp)
+        if exchange is not None:
+            session_id, user_text = exchange
+            await asyncio.to_thread(self.sessions.add_exchange, session_id, user_text,
+                                    result[SESSION_FLOWS[flow]])
+        return result
+
+    async def handle(self, flow, body):
+        """
+        Runs one request and returns its JSON-able reply; raises HTTPError.
+        """
+        if flow not in FLOWS:
+            raise HTTPError(404, f"unknown flow {flow!r}")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        self.requests += 1
+        session_id = body.get("session_id") if self.sessions is not None and flow in SESSION_FLOWS else None
+        exchange = None
+        if session_id is not None:
+            require(body, "user_query")
+            session_id = str(session_id)
+            history = await asyncio.to_thread(self.sessions.context, session_id, body.get("learner_data"))
+            body = dict(body, history=history)
+            exchange = (session_id, body["user_query"])
+        build, _ = FLOWS[flow]
+        # builders read templates and search the course index: keep that off the event loop
+        contents = await asyncio.to_thread(build, body)
+        config = body.get("generation_config")
+        key = (flow, session_id, cache_key(self.client.model_name, contents, None, config))
+
+        future = self.coalescer.get(key)
+        if future is not None:
+            self.coalescer.joined += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            try:
+                self.queue.put_nowait((flow, contents, config, exchange, future))
+            except asyncio.QueueFull:
+                self.rejected += 1
+                raise Saturated()
+            self.coalescer.add(key, future)
+        # shield: one caller disconnecting must not cancel the shared job
+        return await asyncio.shield(future)
+
+    def stats(self):
+        stats = {
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalescer.joined,
+            "rejected": self.rejected,
+            "in_flight": len(self.coalescer),
+            "queued": self.queue.qsize(),
+            "cache_hits": cache_counts(self.client)[0],
+        }
+        if self.sessions is not None:
+            stats.update(self.sessions.stats())
+        return stats
+
+
+# ---------- HTTP ----------
+
+async def read_request(reader):
+    """
+    Reads one HTTP/1.1 request. Returns (method, path, headers, body) or None at EOF.
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "invalid Content-Length")
+    if length < 0:
+        raise HTTPError(400, "invalid Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path.split("?", 1)[0], headers, body
+
+
+def write_response(writer, status, payload, keep_alive=True, extra_headers=None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{k}: {v}" for k, v in (extra_headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+
+async def dispatch(service, method, path, body):
+    if path == "/health":
+        return {"ok": True}
+    if path == "/stats":
+        return service.stats()
+    flow = path.strip("/")
+    if flow not in FLOWS:
+        raise HTTPError(404, f"no route {path}")
+    if method != "POST":
+        raise HTTPError(405, "use POST")
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "body is not valid JSON")
+    return await service.handle(flow, payload)
+
+
+def connection_handler(service):
+    async def on_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    start = time.perf_counter()
+                    payload = await dispatch(service, method, path, body)
+                    status, extra = 200, {"X-Elapsed-Ms": f"{(time.perf_counter() - start) * 1000:.1f}"}
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    if not isinstance(e, HTTPError):
+                        # a bug or bad input past validation: answer instead of dropping the socket
+                        status = 400 if isinstance(e, (ValueError, TypeError)) else 500
+                        e = HTTPError(status, f"{type(e).__name__}: {e}")
+                    keep_alive = e.status < 500 and e.status != 413
+                    status, payload = e.status, {"error": str(e)}
+                    extra = {"Retry-After": "1"} if e.status == 429 else None
+                write_response(writer, status, payload, keep_alive, extra)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return on_connection
+
+
+async def serve(service, host="127.0.0.1", port=8000):
+    """
+    Starts the service and its HTTP listener; returns the asyncio server.
+    """
+    service.start()
+    return await asyncio.start_server(connection_handler(service), host, port)
+
+
+FAKE_LESSON = {
+    "topic": "Fake topic", "grade_level": "8", "learning_objective": "fake objective",
+    "lesson_summary": "fake summary", "key_points": ["a", "b"],
+    "worked_examples": [{"id": 1, "problem": "p", "solution_steps": ["s"], "final_answer": "a"}],
+    "practice_problems": [{"id": 1, "question": "q", "difficulty": "easy", "hints": [], "solution": "s"}],
+    "assessment_quiz": [{"id": 1, "question": "q", "options": ["a", "b"], "answer": "a"}],
+    "follow_up_recommendations": ["r"], "references": ["ref"], "estimated_time_minutes": 30,
+}
+
+
+def fake_lesson_reply(prompt_text):
+    # fenced like the real model's replies, so the parsing path is exercised too
+    return "```json\n" + json.dumps(FAKE_LESSON) + "\n```"
+
+
+async def run_forever(args):
+    client = build_client("service", task="lesson", fake=args.fake, route=args.route,
+                          deadline=args.deadline, reply=fake_lesson_reply if args.fake else None,
+                          compact=args.compact, max_prompt_tokens=args.max_prompt_tokens)
+    sessions = SessionStore(summarizer=None if args.fake else ModelSummarizer(client),
+                            budget=args.history_tokens,
+                            backend=SQLiteSessions(args.sessions_db) if args.sessions_db else None)
+    service = TutorService(client, workers=args.workers, queue_size=args.queue_size, timeout=args.deadline * 2,
+                           sessions=sessions)
+    server = await serve(service, args.host, args.port)
+    print(f"✅ SmartTutor service on http://{args.host}:{args.port} "
+          f"(flows: {', '.join(FLOWS)}; workers={args.workers}, queue={args.queue_size})")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m utils.service", description="Serve the tutor flows over HTTP.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--workers", type=int, default=8, help="concurrent upstream calls")
+    p.add_argument("--queue-size", type=int, default=64, help="queued requests before answering 429")
+    p.add_argument("--fake", action="store_true", help="use the local fake model backend")
+    p.add_argument("--route", action="store_true", help="route across model tiers by prompt size and latency")
+    p.add_argument("--deadline", type=float, default=30.0, help="per-call deadline in seconds (hedged after p95)")
+    p.add_argument("--history-tokens", type=int, default=1500,
+                   help="token budget for the conversation history of session requests")
+    p.add_argument("--compact", action="store_true",
+                   help="compact prompts (minified JSON, collapsed whitespace) before sending them")
+    p.add_argument("--max-prompt-tokens", type=int, default=None,
+                   help="answer 413 for prompts estimated over this many tokens, before calling the model")
+    p.add_argument("--sessions-db", help="persist sessions in this SQLite file (default: memory only)")
+    args = p.parse_args(argv)
+    try:
+        asyncio.run(run_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
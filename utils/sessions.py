@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from utils.context_cache import estimate_tokens
+from utils.templates import load_template
+
+DEFAULT_PATH = "cache/sessions.sqlite"
+CONTEXT_PROMPT = "prompts/conversation_context.txt"
+SUMMARY_PROMPT = "prompts/session_summary.txt"
+
+ROLE_LABELS = {"user": "Learner", "model": "Tutor"}
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def format_turn(role, text):
+    return f"{ROLE_LABELS.get(role, role)}: {text}"
+
+
+def trim_to_tokens(text, max_tokens):
+    # same ~4 chars/token rule as estimate_tokens
+    return text if estimate_tokens(text) <= max_tokens else text[:max_tokens * 4].rstrip() + " …"
+
+
+class Session:
+    """
+    One learner's conversation. `turns` is the full history as (role, text, tokens);
+    the first `folded` turns are covered by `summary`, the rest are sent verbatim.
+    """
+
+    def __init__(self, session_id, learner_data=None):
+        self.session_id = session_id
+        self.learner_data = learner_data or {}
+        self.turns = []
+        self.folded = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self.recent_tokens = 0
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+        self._rendered = None
+
+    def add(self, role, text):
+        tokens = estimate_tokens(format_turn(role, text))
+        self.turns.append((role, text, tokens))
+        self.recent_tokens += tokens
+        return tokens
+
+    @property
+    def recent(self):
+        return self.turns[self.folded:]
+
+
+# ---------- Summarizers ----------
+# summarize(previous_summary, [(role, text, tokens)], max_tokens) -> new summary
+
+def extractive_summary(previous, turns, max_tokens):
+    """
+    Model-free fallback: the first sentence of every turn, oldest lines dropped
+    once over `max_tokens`.
+    """
+    lines = previous.splitlines() if previous else []
+    for role, text, _ in turns:
+        first = SENTENCE_RE.split(" ".join(text.split()), 1)[0]
+        lines.append(f"- {'Learner asked' if role == 'user' else 'Tutor explained'}: {first[:300]}")
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ModelSummarizer:
+    """
+    Folds turns into the running summary with one model call; falls back to the
+    extractive summary if the call fails.
+    """
+
+    def __init__(self, client, generation_config=None):
+        self.client = client
+        self.generation_config = generation_config or {"temperature": 0.2}
+        self.calls = 0
+
+    def __call__(self, previous, turns, max_tokens):
+        prompt = load_template(SUMMARY_PROMPT).render(
+            summary=previous or "(none yet)",
+            turns="\n".join(format_turn(role, text) for role, text, _ in turns),
+            max_words=str(max_tokens * 3 // 4),
+        )
+        self.calls += 1
+        try:
+            return self.client.generate([prompt], self.generation_config).text.strip()
+        except Exception:
+            return extractive_summary(previous, turns, max_tokens)
+
+
+# ---------- Persistence ----------
+
+class SQLiteSessions:
+    """
+    Write-through SQLite backing for SessionStore: every turn and summary update
+    is stored, so sessions evicted from memory (or from another process) reload
+    with their full history.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    learner_data TEXT,
+                    summary TEXT,
+                    summary_tokens INTEGER,
+                    folded INTEGER,
+                    updated_at REAL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS turns (
+                    session_id TEXT,
+                    seq INTEGER,
+                    role TEXT,
+                    text TEXT,
+                    tokens INTEGER,
+                    PRIMARY KEY (session_id, seq)
+                )""")
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads; keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id):
+        with self._conn() as conn:
+            row = conn.execute("SELECT learner_data, summary, summary_tokens, folded FROM sessions WHERE id = ?",
+                               (session_id,)).fetchone()
+            if row is None:
+                return None
+            turns = conn.execute("SELECT role, text, tokens FROM turns WHERE session_id = ? ORDER BY seq",
+                                 (session_id,)).fetchall()
+        session = Session(session_id, json.loads(row[0] or "{}"))
+        session.summary, session.summary_tokens, session.folded = row[1] or "", row[2] or 0, row[3] or 0
+        session.turns = [tuple(t) for t in turns]
+        session.recent_tokens = sum(t[2] for t in session.recent)
+        return session
+
+    def save(self, session):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                         (session.session_id, json.dumps(session.learner_data), session.summary,
+                          session.summary_tokens, session.folded, time.time()))
+
+    def add_turn(self, session, role, text, tokens):
+        seq = len(session.turns) - 1
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO turns VALUES (?, ?, ?, ?, ?)",
+                         (session.session_id, seq, role, text, tokens))
+            conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (time.time(), session.session_id))
+
+    def delete(self, session_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+# ---------- Store ----------
+
+class SessionStore:
+    """
+    Per-learner conversation memory that builds each prompt's history block
+    under a fixed token budget.
+
+    Recent turns are kept verbatim. Once they outgrow the budget, the oldest
+    ones are folded into a rolling summary, down to `keep_ratio` of the budget
+    so the summary is recomputed every few turns rather than on every one.
+    The summary and the rendered block are cached on the session and only
+    rebuilt when a turn is added or folded.
+
+    At most `max_sessions` sessions stay in memory; the least recently used
+    ones (and any idle for `idle_ttl` seconds) are evicted. Without a `backend`
+    an evicted session starts over; with SQLiteSessions it reloads.
+    """
+
+    def __init__(self, summarizer=None, budget=1500, summary_budget=300, keep_ratio=0.6,
+                 min_recent=2, max_sessions=1000, idle_ttl=3600.0, backend=None):
+        self.summarizer = summarizer or extractive_summary
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.keep_ratio = keep_ratio
+        self.min_recent = min_recent
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.backend = backend
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.summaries = 0
+
+    def get(self, session_id, learner_data=None):
+        """
+        The session for `session_id`, loaded from the backend or created on first use.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self.backend.load(session_id) if self.backend is not None else None
+                if session is None:
+                    session = Session(session_id, learner_data)
+                    if self.backend is not None:
+                        self.backend.save(session)
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            if learner_data and learner_data != session.learner_data:
+                session.learner_data = learner_data
+                if self.backend is not None:
+                    self.backend.save(session)
+            self._evict()
+        return session
+
+    def _evict(self):
+        cutoff = time.time() - self.idle_ttl
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and oldest.last_used >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def add_turn(self, session_id, role, text):
+        session = self.get(session_id)
+        with session.lock:
+            tokens = session.add(role, text)
+            session._rendered = None
+            if self.backend is not None:
+                self.backend.add_turn(session, role, text, tokens)
+        return session
+
+    def add_exchange(self, session_id, user_text, model_text):
+        self.add_turn(session_id, "user", user_text)
+        return self.add_turn(session_id, "model", model_text)
+
+    def _fold(self, session):
+        recent_budget = self.budget - self.summary_budget
+        if session.recent_tokens <= recent_budget:
+            return
+        target = recent_budget * self.keep_ratio
+        start = session.folded
+        while (session.recent_tokens > target
+               and len(session.turns) - session.folded > self.min_recent):
+            session.recent_tokens -= session.turns[session.folded][2]
+            session.folded += 1
+        if session.folded == start:
+            return
+        summary = self.summarizer(session.summary, session.turns[start:session.folded], self.summary_budget)
+        session.summary = trim_to_tokens(summary, self.summary_budget)
+        session.summary_tokens = estimate_tokens(session.summary)
+        self.summaries += 1
+        if self.backend is not None:
+            self.backend.save(session)
+
+    def context(self, session_id, learner_data=None):
+        """
+        The conversation block for the next prompt ("" for a new session):
+        the rolling summary, then the recent turns, within `budget` tokens.
+        """
+        session = self.get(session_id, learner_data)
+        with session.lock:
+            if session._rendered is not None:
+                return session._rendered
+            self._fold(session)
+            lines = [f"Summary of earlier turns:\n{session.summary}"] if session.summary else []
+            # min_recent can leave more than the budget; trim the oldest kept turns
+            room = self.budget - session.summary_tokens
+            recent = []
+            for role, text, tokens in reversed(session.recent):
+                if room <= 0:
+                    break
+                recent.append(format_turn(role, text) if tokens <= room
+                              else trim_to_tokens(format_turn(role, text), room))
+                room -= tokens
+            lines += reversed(recent)
+            session._rendered = load_template(CONTEXT_PROMPT).render(history="\n".join(lines)) if lines else ""
+            return session._rendered
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.backend is not None:
+            self.backend.delete(session_id)
+
+    def stats(self):
+        return {"sessions": len(self._sessions), "evicted": self.evicted, "summaries": self.summaries}
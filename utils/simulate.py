@@ -0,0 +1,158 @@
+import re
+import json
+import time
+import asyncio
+
+from utils.model_client import (FakeClient, TransientError, make_response, contents_to_text,
+                                default_judge_reply)
+from utils.telemetry import read_events
+
+LEGACY_LOG = "logs/tokens.log"
+
+
+class TokenProfile:
+    """
+    Empirical prompt/completion token counts, e.g. from logs/tokens.log or a
+    telemetry JSONL file. Completion sizes are drawn from the recorded ones.
+    """
+
+    def __init__(self, completions, prompts=None):
+        if not completions:
+            raise ValueError("token profile needs at least one completion count")
+        self.completions = list(completions)
+        self.prompts = list(prompts or [])
+
+    @classmethod
+    def from_log(cls, path=LEGACY_LOG, tag=None):
+        events = [e for e in read_events(path)
+                  if e.get("completion_tokens") and (tag is None or e.get("tag") == tag)]
+        return cls([e["completion_tokens"] for e in events],
+                   [e["prompt_tokens"] for e in events if e.get("prompt_tokens")])
+
+    def sample(self, rng):
+        return rng.choice(self.completions)
+
+
+class LatencyModel:
+    """
+    Latency = (ttft + prompt_tokens * per_prompt_token
+               + completion_tokens * per_output_token) * lognormal(0, sigma),
+    all multiplied by `time_scale` so benchmarks can run a "day" in seconds.
+    Defaults are in the range of gemini-1.5-flash.
+    """
+
+    def __init__(self, ttft=0.35, per_prompt_token=0.00002, per_output_token=0.004,
+                 sigma=0.25, time_scale=1.0):
+        self.ttft = ttft
+        self.per_prompt_token = per_prompt_token
+        self.per_output_token = per_output_token
+        self.sigma = sigma
+        self.time_scale = time_scale
+
+    def sample(self, rng, prompt_tokens, completion_tokens):
+        base = self.ttft + prompt_tokens * self.per_prompt_token + completion_tokens * self.per_output_token
+        return base * rng.lognormvariate(0.0, self.sigma) * self.time_scale
+
+
+# ---------- Output corruption ----------
+
+def fence(text, rng):
+    # the shapes seen in evaluation/*_raw.txt
+    return rng.choice([
+        "```json\n{}\n```",
+        "```\n{}\n```",
+        "Here is the lesson:\n```json\n{}\n```\nLet me know if you need anything else!",
+    ]).format(text)
+
+
+def malform(text, rng):
+    """
+    Breaks a JSON reply the ways models do: cut off mid-generation, trailing
+    commas, single quotes, or an unescaped quote inside a string.
+    """
+    kind = rng.choice(["truncate", "trailing_comma", "single_quotes", "bad_quote"])
+    if kind == "truncate":
+        return text[:max(1, int(len(text) * rng.uniform(0.3, 0.9)))]
+    if kind == "trailing_comma":
+        return re.sub(r"(\"|\d|\]|\})(\s*)\}\s*$", r"\1,\2}", text, count=1)
+    if kind == "single_quotes":
+        return text.replace('"', "'")
+    return text.replace('": "', '": "he said "', 1)
+
+
+class SimulatedClient(FakeClient):
+    """
+    Deterministic stand-in for `generate_content`: completion sizes follow a
+    TokenProfile, latency follows a LatencyModel, and `fence_rate` /
+    `malformed_rate` of replies are wrapped in code fences or corrupted.
+    Two clients with the same seed produce the same sequence of replies.
+    """
+
+    def __init__(self, reply=None, profile=None, latency_model=None, fence_rate=0.0,
+                 malformed_rate=0.0, fail_rate=0.0, model_name="simulated-gemini", seed=0):
+        super().__init__(reply=reply or default_judge_reply, fail_rate=fail_rate,
+                         model_name=model_name, seed=seed)
+        self.profile = profile or TokenProfile.from_log()
+        self.latency_model = latency_model or LatencyModel()
+        self.fence_rate = fence_rate
+        self.malformed_rate = malformed_rate
+        self.fenced = 0
+        self.malformed = 0
+
+    def _plan(self, contents, context=None):
+        """
+        Draws this call's reply, usage and latency up front, so concurrent
+        calls can't interleave their random draws differently between runs.
+        """
+        self.calls += 1
+        if self.fail_rate and self._rng.random() < self.fail_rate:
+            raise TransientError("simulated backend: 503")
+        text = contents_to_text(contents)
+        out = self.reply(text) if callable(self.reply) else self.reply
+        if self.malformed_rate and self._rng.random() < self.malformed_rate:
+            out = malform(out, self._rng)
+            self.malformed += 1
+        if self.fence_rate and self._rng.random() < self.fence_rate:
+            out = fence(out, self._rng)
+            self.fenced += 1
+        prompt_tokens = len(text) // 4
+        completion_tokens = self.profile.sample(self._rng)
+        delay = self.latency_model.sample(self._rng, prompt_tokens, completion_tokens)
+        cached = context.token_count if context is not None else 0
+        return make_response(out, prompt_tokens + cached, completion_tokens, cached), delay
+
+    def generate(self, contents, generation_config=None, tools=None):
+        resp, delay = self._plan(contents)
+        time.sleep(delay)
+        return resp
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        resp, delay = self._plan(contents)
+        await asyncio.sleep(delay)
+        return resp
+
+    def generate_cached(self, context, contents, generation_config=None):
+        resp, delay = self._plan(contents, context)
+        time.sleep(delay)
+        return resp
+
+    async def agenerate_cached(self, context, contents, generation_config=None):
+        resp, delay = self._plan(contents, context)
+        await asyncio.sleep(delay)
+        return resp
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        resp, delay = self._plan(contents)
+        pieces = [resp.text[i:i + 16] for i in range(0, len(resp.text), 16)] or [""]
+        for piece in pieces:
+            time.sleep(delay / len(pieces))
+            yield piece
+
+
+def lesson_reply(path="evaluation/one_shot_latest_output.json"):
+    """
+    Reply callable returning a real lesson from the repo's saved outputs.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = json.dumps(json.load(f), indent=2, ensure_ascii=False)
+    return lambda prompt_text: text
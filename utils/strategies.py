@@ -0,0 +1,108 @@
+import json
+import os
+
+from utils.templates import load_template
+
+INDEX_DIR = "index"
+
+_index = None
+
+
+def read(path):
+    """
+    Stripped contents of a placeholder-free prompt file, from the mtime-cached
+    template loader, so a long-lived process doesn't hit the disk for every prompt.
+    """
+    return load_template(path, strip=True).render()
+
+
+def topic_line(sample):
+    """
+    "Topic: ...; Grade: ..." as in prompts/user_prompt_*_shot.txt, built from
+    an evaluation sample ({"user_query", "learner_data"}) or {"topic", "grade"}.
+    """
+    learner = sample.get("learner_data") or {}
+    topic = sample.get("topic") or sample["user_query"]
+    grade = sample.get("grade") or learner.get("grade") or learner.get("level", "unknown")
+    return f"Topic: {topic}; Grade: {grade}"
+
+
+def zero_shot(sample):
+    return [read("prompts/system_prompt_zero_shot.txt"), topic_line(sample)]
+
+
+def one_shot(sample):
+    # system prompt + worked example is the static prefix; only the task varies
+    return [read("prompts/system_prompt_one_shot.txt"), f"# New Task\n{topic_line(sample)}"]
+
+
+def multi_shot(sample):
+    return [read("prompts/system_prompt_multi_shot.txt"), sample.get("user_query") or sample["topic"]]
+
+
+def smart_tutor(sample):
+    return [read("prompts/system_prompt_smart_tutor.txt"), topic_line(sample)]
+
+
+def chain_of_thought(sample):
+    base = load_template("prompts/system_prompt_chain_of_thought.txt")
+    return [base.render(user_query=sample["user_query"],
+                        learner_data=json.dumps(sample.get("learner_data", {})))]
+
+
+def open_index(path=INDEX_DIR):
+    # retrieval is optional: only pull in numpy once an index has been built
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        return None
+    from utils.retrieval import VectorIndex
+    return VectorIndex(path)
+
+
+def dynamic_prompt(user_query, learner_data, index=None, context_budget=600, history=None):
+    """
+    The dynamic system + user prompt, with retrieved course material when an
+    index is given. `history` is the conversation block from
+    SessionStore.context() for follow-up questions in a multi-turn session.
+    """
+    system_prompt = load_template("prompts/system_prompt_dynamic.txt")
+    user_prompt = load_template("prompts/user_prompt_dynamic.txt")
+
+    values = {"user_query": user_query, "learner_data": json.dumps(learner_data, indent=2)}
+    parts = [system_prompt.render(**values)]
+    if index is not None:
+        from utils.retrieval import retrieve_context
+        context = retrieve_context(index, user_query, learner_data, token_budget=context_budget)
+        if context:
+            parts.append(context)
+    if history:
+        parts.append(history)
+    parts.append(user_prompt.render(**values))
+    return "\n\n".join(parts)
+
+
+def course_index():
+    """
+    The retrieval index, opened on first use once it has been built (None before).
+    """
+    global _index
+    if _index is None:
+        _index = open_index()
+    return _index
+
+
+def dynamic(sample):
+    # same prompt as scripts/test_dynamic_prompt.py, course material included;
+    # "history" is the conversation block from utils.sessions
+    return [dynamic_prompt(sample["user_query"], sample.get("learner_data", {}),
+                           index=course_index(), history=sample.get("history"))]
+
+
+# strategy name -> build(sample) -> contents
+STRATEGIES = {
+    "zero-shot": zero_shot,
+    "one-shot": one_shot,
+    "multi-shot": multi_shot,
+    "cot": chain_of_thought,
+    "dynamic": dynamic,
+    "smart-tutor": smart_tutor,
+}
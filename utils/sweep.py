@@ -0,0 +1,138 @@
+import math
+import time
+import asyncio
+import itertools
+
+from utils.judge import judge_single
+from utils.runner import TokenBucket, call_with_retry
+from utils.strategies import STRATEGIES
+from utils.telemetry import usage_counts, percentile
+
+
+def config_grid(**values):
+    """
+    Cartesian product of GenerationConfig values, e.g.
+    config_grid(temperature=[0.2, 0.8], top_p=[0.9]) -> [{...}, {...}].
+    Options given as None or [] are left out of the configs.
+    """
+    names = [k for k, v in values.items() if v]
+    return [dict(zip(names, combo)) for combo in itertools.product(*(values[k] for k in names))] or [{}]
+
+
+class Cell:
+    """
+    One (strategy, generation config) combination and everything measured for it.
+    """
+
+    def __init__(self, strategy, config):
+        self.strategy = strategy
+        self.config = config
+        self.scores = []
+        self.prompt_tokens = []
+        self.completion_tokens = []
+        self.latencies = []
+        self.errors = 0
+        self.eliminated_in = None
+
+    @property
+    def label(self):
+        params = " ".join(f"{k}={v}" for k, v in self.config.items())
+        return f"{self.strategy} {params}".strip()
+
+    def mean_score(self):
+        return sum(self.scores) / len(self.scores) if self.scores else None
+
+    def row(self):
+        lat = sorted(self.latencies)
+        mean = lambda xs: round(sum(xs) / len(xs), 1) if xs else None
+        return {
+            "strategy": self.strategy,
+            "config": self.config,
+            "samples": len(self.scores) + self.errors,
+            "score": None if self.mean_score() is None else round(self.mean_score(), 2),
+            "errors": self.errors,
+            "prompt_tokens": mean(self.prompt_tokens),
+            "completion_tokens": mean(self.completion_tokens),
+            "p50_latency_s": round(percentile(lat, 50), 3) if lat else None,
+            "p95_latency_s": round(percentile(lat, 95), 3) if lat else None,
+            "status": "kept" if self.eliminated_in is None else f"dropped r{self.eliminated_in}",
+        }
+
+
+class Sweep:
+    """
+    Scores every cell of a strategy x GenerationConfig grid with the LLM judge
+    using successive halving: each round runs the surviving cells on the next
+    batch of samples (the batch grows `eta`x per round), then keeps the best
+    1/eta of them by mean judge score. Generation and judge calls share one
+    rate limiter and one concurrency limit.
+    """
+
+    def __init__(self, client, judge_client, judge_template, concurrency=8, rps=5.0, retries=4):
+        self.client = client
+        self.judge_client = judge_client
+        self.judge_template = judge_template
+        self.sem = asyncio.Semaphore(concurrency)
+        self.limiter = TokenBucket(rps) if rps else None
+        self.retries = retries
+
+    async def _score(self, cell, sample):
+        contents = STRATEGIES[cell.strategy](sample)
+        async with self.sem:
+            async def timed_generate():
+                # timed per attempt: rate-limiter waits and retry backoff aren't model latency
+                start = time.perf_counter()
+                resp = await self.client.agenerate(contents, cell.config or None)
+                return resp, time.perf_counter() - start
+
+            try:
+                (resp, latency), _ = await call_with_retry(timed_generate, retries=self.retries,
+                                                           limiter=self.limiter)
+                if not getattr(resp, "cached", False):
+                    # a response-cache hit returns in ~0s and would drag p50 to nothing
+                    cell.latencies.append(latency)
+                prompt, cand, _, _ = usage_counts(resp)
+                cell.prompt_tokens.append(prompt)
+                cell.completion_tokens.append(cand)
+
+                item = dict(sample, model_answer=resp.text)
+                score, _ = await call_with_retry(
+                    lambda: judge_single(self.judge_client, self.judge_template, item),
+                    retries=self.retries, limiter=self.limiter)
+            except Exception:
+                cell.errors += 1
+                return
+        total = score.get("total_score") if isinstance(score, dict) else None
+        if isinstance(total, (int, float)) and not isinstance(total, bool):
+            cell.scores.append(total)
+        else:
+            cell.errors += 1
+
+    async def run(self, cells, samples, initial=2, eta=2, on_round=None):
+        """
+        Returns the cells, best first; eliminated cells keep their partial results.
+        """
+        alive, used, rnd = list(cells), 0, 0
+        while alive:
+            batch = samples[used:used + initial * eta ** rnd]
+            if not batch:
+                break
+            await asyncio.gather(*(self._score(c, s) for c in alive for s in batch))
+            used += len(batch)
+            alive.sort(key=rank, reverse=True)
+            if on_round is not None:
+                on_round(rnd, alive, len(batch))
+            if len(alive) == 1:
+                break
+            keep = max(1, math.ceil(len(alive) / eta))
+            for cell in alive[keep:]:
+                cell.eliminated_in = rnd
+            alive = alive[:keep]
+            rnd += 1
+        return sorted(cells, key=lambda c: (c.eliminated_in is None, c.eliminated_in or 0, rank(c)),
+                      reverse=True)
+
+
+def rank(cell):
+    score = cell.mean_score()
+    return float("-inf") if score is None else score
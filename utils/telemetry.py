@@ -0,0 +1,376 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import queue
+import atexit
+import argparse
+import threading
+from collections import defaultdict
+
+from utils.model_client import ModelClient, contents_to_text
+from utils.compaction import raw_tokens
+from utils.response_cache import canonical
+from utils.runner import current_attempt
+
+DEFAULT_PATH = "logs/telemetry.jsonl"
+
+# USD per 1M tokens (gemini-1.5-flash, prompts <= 128k); override with --price-in/--price-out.
+PRICE_IN = 0.075
+PRICE_OUT = 0.30
+# Cached-context prompt tokens are billed at this fraction of PRICE_IN.
+CACHED_PRICE_RATIO = 0.25
+
+
+class TelemetrySink:
+    """
+    Buffered JSONL writer. record() only enqueues, so it is cheap and safe to
+    call from threads and from the event loop; a daemon thread batches events
+    and appends them with one open/write per flush.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, flush_interval=1.0, max_batch=512):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, event):
+        if self._closed:
+            return
+        with self._flushed:
+            self._pending += 1
+        self._queue.put(event)
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            if batch[0] is None:
+                return
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    event = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    stop = True
+                    break
+                batch.append(event)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in batch))
+        except Exception as e:
+            print(f"⚠️ Could not write telemetry ({len(batch)} events):", e)
+        with self._flushed:
+            self._pending -= len(batch)
+            self._flushed.notify_all()
+
+    def flush(self, timeout=5.0):
+        """
+        Blocks until every event recorded so far has been written.
+        """
+        with self._flushed:
+            self._flushed.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = TelemetrySink(os.getenv("SMARTTUTOR_TELEMETRY", DEFAULT_PATH))
+    return _sink
+
+
+def usage_counts(resp):
+    usage = getattr(resp, "usage_metadata", None)
+    prompt = getattr(usage, "prompt_token_count", None)
+    cand = getattr(usage, "candidates_token_count", None)
+    total = getattr(usage, "total_token_count", None)
+    cached = getattr(usage, "cached_content_token_count", None)
+    return prompt, cand, total, cached
+
+
+def log_call(tag, model=None, resp=None, latency=None, ttft=None, retries=None,
+             cache=None, generation_config=None, error=None, **extra):
+    """
+    Records one model call as a telemetry event.
+    """
+    prompt, cand, total, cached = usage_counts(resp) if resp is not None else (None,) * 4
+    if cache is None and resp is not None:
+        cache = "hit" if getattr(resp, "cached", False) else "miss"
+    event = {
+        "ts": round(time.time(), 3),
+        "tag": tag,
+        "model": model,
+        "prompt_tokens": prompt,
+        "completion_tokens": cand,
+        "total_tokens": total,
+        "cached_prompt_tokens": cached,
+        "latency_s": None if latency is None else round(latency, 4),
+        "ttft_s": None if ttft is None else round(ttft, 4),
+        "retries": current_attempt.get() if retries is None else retries,
+        "cache": cache,
+        "context_cache": getattr(resp, "context_cache", None),
+        "generation_config": canonical(generation_config),
+    }
+    if error is not None:
+        event["error"] = error
+    event.update(extra)
+    get_sink().record(event)
+    return event
+
+
+class InstrumentedClient(ModelClient):
+    """
+    Wraps a ModelClient and records a telemetry event for every call:
+    tokens, wall-clock latency, time-to-first-chunk for streams, retry
+    attempt, cache hit/miss and generation config. The offline prompt
+    estimate is logged next to the billed count so the estimator in
+    utils/compaction.py can be calibrated against it.
+    """
+
+    def __init__(self, client, tag="default"):
+        self.client = client
+        self.model_name = client.model_name
+        self.tag = tag
+
+    def _log(self, start, generation_config, resp=None, error=None, ttft=None, **extra):
+        log_call(self.tag, self.model_name, resp, time.perf_counter() - start, ttft=ttft,
+                 generation_config=generation_config,
+                 error=None if error is None else repr(error), **extra)
+
+    def generate(self, contents, generation_config=None, tools=None):
+        start = time.perf_counter()
+        estimate = raw_tokens(contents_to_text(contents))
+        try:
+            resp = self.client.generate(contents, generation_config, tools)
+        except Exception as e:
+            self._log(start, generation_config, error=e, prompt_estimate=estimate)
+            raise
+        self._log(start, generation_config, resp, prompt_estimate=estimate)
+        return resp
+
+    async def agenerate(self, contents, generation_config=None, tools=None):
+        start = time.perf_counter()
+        estimate = raw_tokens(contents_to_text(contents))
+        try:
+            resp = await self.client.agenerate(contents, generation_config, tools)
+        except Exception as e:
+            self._log(start, generation_config, error=e, prompt_estimate=estimate)
+            raise
+        self._log(start, generation_config, resp, prompt_estimate=estimate)
+        return resp
+
+    def generate_stream(self, contents, generation_config=None, tools=None):
+        start = time.perf_counter()
+        estimate = raw_tokens(contents_to_text(contents))
+        ttft, chars, error = None, 0, None
+        try:
+            for chunk in self.client.generate_stream(contents, generation_config, tools):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                chars += len(chunk)
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Streams don't carry usage here; completion size is logged in chars.
+            self._log(start, generation_config, error=error, ttft=ttft, completion_chars=chars,
+                      prompt_estimate=estimate)
+
+
+def instrumented(client, tag="default"):
+    return InstrumentedClient(client, tag)
+
+
+# ---------- Legacy tokens.log import ----------
+
+# Matches all three historical formats:
+#   one-shot | prompt:961 cand:748 total:1709
+#   [one-shot] Tokens → prompt:961 completion:810 total:1771
+#   [one-shot] Tokens → prompt:961 completion:796 total:1757 | temp=0.8 top_p=0.9
+LEGACY_RE = re.compile(
+    r"^\[?(?P<tag>[^\]|]+?)\]?\s*(?:\||Tokens\s*→)\s*prompt:\s*(?P<prompt>\d+)"
+    r",?\s*(?:cand|completion):\s*(?P<cand>\d+),?\s*total:\s*(?P<total>\d+)"
+    r"(?:\s*\|\s*(?P<params>.*))?$"
+)
+LEGACY_PARAM_NAMES = {"temp": "temperature"}
+
+
+def parse_legacy_line(line):
+    m = LEGACY_RE.match(line.strip())
+    if not m:
+        return None
+    config = {}
+    for item in re.findall(r"(\w+)=(\[.*?\]|\S+)", m.group("params") or ""):
+        name, value = item
+        try:
+            value = json.loads(value.replace("'", '"'))
+        except ValueError:
+            pass
+        config[LEGACY_PARAM_NAMES.get(name, name)] = value
+    return {
+        "ts": None,
+        "tag": m.group("tag").strip(),
+        "model": None,
+        "prompt_tokens": int(m.group("prompt")),
+        "completion_tokens": int(m.group("cand")),
+        "total_tokens": int(m.group("total")),
+        "latency_s": None,
+        "ttft_s": None,
+        "retries": None,
+        "cache": None,
+        "generation_config": config or None,
+        "source": "legacy",
+    }
+
+
+def read_events(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                yield json.loads(line)
+            else:
+                event = parse_legacy_line(line)
+                if event is not None:
+                    yield event
+
+
+# ---------- Aggregation ----------
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    idx = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[idx]
+
+
+def summarize(events, price_in=PRICE_IN, price_out=PRICE_OUT):
+    by_tag = defaultdict(list)
+    for e in events:
+        by_tag[e.get("tag") or "default"].append(e)
+
+    rows = []
+    for tag, evs in sorted(by_tag.items()):
+        lat = sorted(e["latency_s"] for e in evs if e.get("latency_s") is not None)
+        ttft = sorted(e["ttft_s"] for e in evs if e.get("ttft_s") is not None)
+        p_tok = sum(e.get("prompt_tokens") or 0 for e in evs)
+        c_tok = sum(e.get("completion_tokens") or 0 for e in evs)
+        timed_tok = sum(e.get("completion_tokens") or 0 for e in evs if e.get("latency_s"))
+        hits = sum(1 for e in evs if e.get("cache") == "hit")
+        cached_tok = sum(e.get("cached_prompt_tokens") or 0 for e in evs)
+        ctx_lat = sorted(e["latency_s"] for e in evs
+                         if e.get("context_cache") and e.get("latency_s") is not None)
+        plain_lat = sorted(e["latency_s"] for e in evs
+                           if not e.get("context_cache") and e.get("latency_s") is not None)
+        rows.append({
+            "tag": tag,
+            "calls": len(evs),
+            "errors": sum(1 for e in evs if e.get("error")),
+            "cache_hit_rate": hits / len(evs),
+            "p50_s": percentile(lat, 50),
+            "p95_s": percentile(lat, 95),
+            "p99_s": percentile(lat, 99),
+            "p50_ttft_s": percentile(ttft, 50),
+            "tokens_per_s": timed_tok / sum(lat) if lat and sum(lat) else None,
+            "prompt_tokens": p_tok,
+            "completion_tokens": c_tok,
+            "cached_prompt_tokens": cached_tok,
+            "p50_ctx_cached_s": percentile(ctx_lat, 50),
+            "p50_uncached_s": percentile(plain_lat, 50),
+            "cost_usd": ((p_tok - cached_tok) * price_in + cached_tok * price_in * CACHED_PRICE_RATIO
+                         + c_tok * price_out) / 1e6,
+            "ctx_saved_usd": cached_tok * price_in * (1 - CACHED_PRICE_RATIO) / 1e6,
+        })
+    return rows
+
+
+def _fmt(v):
+    if v is None:
+        return "-"
+    if isinstance(v, float):
+        return f"{v:.4f}" if v < 10 else f"{v:.1f}"
+    return str(v)
+
+
+def print_report(rows, out=sys.stdout):
+    cols = ["tag", "calls", "errors", "cache_hit_rate", "p50_s", "p95_s", "p99_s",
+            "p50_ttft_s", "tokens_per_s", "prompt_tokens", "completion_tokens",
+            "cached_prompt_tokens", "p50_ctx_cached_s", "p50_uncached_s", "cost_usd", "ctx_saved_usd"]
+    table = [cols] + [[_fmt(r[c]) for c in cols] for r in rows]
+    widths = [max(len(row[i]) for row in table) for i in range(len(cols))]
+    for row in table:
+        out.write("  ".join(cell.rjust(w) for cell, w in zip(row, widths)) + "\n")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m utils.telemetry",
+                                description="Summarize model-call telemetry.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    rep = sub.add_parser("report", help="p50/p95/p99 latency, tokens/sec and cost per tag")
+    rep.add_argument("files", nargs="*", default=[DEFAULT_PATH],
+                     help="telemetry JSONL and/or legacy tokens.log files")
+    rep.add_argument("--price-in", type=float, default=PRICE_IN, help="USD per 1M prompt tokens")
+    rep.add_argument("--price-out", type=float, default=PRICE_OUT, help="USD per 1M completion tokens")
+    rep.add_argument("--json", action="store_true", help="print rows as JSON")
+
+    imp = sub.add_parser("import-legacy", help="convert logs/tokens.log lines to JSONL events")
+    imp.add_argument("src", nargs="?", default="logs/tokens.log")
+    imp.add_argument("--out", default=DEFAULT_PATH)
+
+    args = p.parse_args(argv)
+    if args.cmd == "report":
+        events = [e for path in args.files for e in read_events(path)]
+        rows = summarize(events, args.price_in, args.price_out)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print_report(rows)
+    else:
+        events = list(read_events(args.src))
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "a", encoding="utf-8") as fh:
+            for e in events:
+                fh.write(json.dumps(e, ensure_ascii=False) + "\n")
+        print(f"✅ Imported {len(events)} legacy events → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import re
+import threading
+
+# Only `{identifier}` is a placeholder, so JSON examples like `{ "level": ... }` stay literal.
+PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+class TemplateError(ValueError):
+    """Raised when render() gets missing or unknown placeholder values."""
+
+
+class Template:
+    """
+    A prompt template parsed once into literal and placeholder segments.
+    render() fills every slot in a single pass with one join.
+    """
+
+    def __init__(self, text, name="<string>"):
+        self.name = name
+        self.segments = []
+        self.slots = []
+        pos = 0
+        for m in PLACEHOLDER_RE.finditer(text):
+            if m.start() > pos:
+                self.segments.append(text[pos:m.start()])
+            self.slots.append((len(self.segments), m.group(1)))
+            self.segments.append(None)
+            pos = m.end()
+        if pos < len(text):
+            self.segments.append(text[pos:])
+        self.placeholders = frozenset(name for _, name in self.slots)
+
+    def render(self, **values):
+        if values.keys() != self.placeholders:
+            missing = sorted(self.placeholders - values.keys())
+            unknown = sorted(values.keys() - self.placeholders)
+            raise TemplateError(f"{self.name}: missing placeholders {missing}, unknown {unknown}")
+        parts = list(self.segments)
+        for i, name in self.slots:
+            parts[i] = values[name]
+        return "".join(parts)
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def load_template(path, strip=False):
+    """
+    Returns the parsed Template for `path`, re-parsing only when the file's mtime changes.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, strip)
+    entry = _cache.get(key)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    tpl = Template(text.strip() if strip else text, name=path)
+    with _lock:
+        _cache[key] = (mtime, tpl)
+    return tpl
+
+
+def render(path, **values):
+    return load_template(path).render(**values)
@@ -0,0 +1,296 @@
+import re
+import json
+import typing
+import asyncio
+import inspect
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.response_cache import canonical
+
+# Python annotation -> JSON-schema type used in Gemini function declarations.
+SCHEMA_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean",
+                list: "array", tuple: "array", dict: "object"}
+
+ARG_DOC_RE = re.compile(r"^\s*(\w+)\s*(?:\([^)]*\))?\s*:\s*(.+)$")
+
+
+class ToolError(Exception):
+    """Raised for unknown tools or arguments that don't match the signature."""
+
+
+def param_schema(annotation):
+    origin = typing.get_origin(annotation)
+    if origin is typing.Literal:
+        values = typing.get_args(annotation)
+        return {"type": SCHEMA_TYPES.get(type(values[0]), "string"), "enum": list(values)}
+    if origin is typing.Union:
+        # Optional[X] -> X
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        return param_schema(args[0]) if len(args) == 1 else {"type": "string"}
+    if origin in (list, tuple):
+        args = typing.get_args(annotation)
+        schema = {"type": "array"}
+        if args:
+            schema["items"] = param_schema(args[0])
+        return schema
+    return {"type": SCHEMA_TYPES.get(origin or annotation, "string")}
+
+
+def parse_docstring(fn):
+    """
+    Returns (summary, {arg: description}) from a docstring with an optional
+    Google-style "Args:" section.
+    """
+    doc = inspect.getdoc(fn) or ""
+    summary = doc.partition("\n\n")[0]
+    args, in_args = {}, False
+    for line in doc.splitlines():
+        if line.strip().lower() in ("args:", "arguments:", "parameters:"):
+            in_args = True
+            continue
+        if in_args:
+            m = ARG_DOC_RE.match(line)
+            if m:
+                args[m.group(1)] = m.group(2).strip()
+            elif line.strip() and not line.startswith((" ", "\t")):
+                in_args = False
+    return " ".join(summary.split()), args
+
+
+class Tool:
+    """
+    A Python function exposed to the model. The declaration is generated from
+    its signature and docstring. Results of `idempotent` tools are memoized per
+    arguments (LRU of `memo_size` entries).
+    """
+
+    def __init__(self, fn, name=None, idempotent=False, timeout=10.0, memo_size=1024):
+        self.fn = fn
+        self.name = name or fn.__name__
+        self.idempotent = idempotent
+        self.timeout = timeout
+        self.memo_size = memo_size
+        self.signature = inspect.signature(fn)
+        self.is_async = inspect.iscoroutinefunction(fn)
+        self._memo = OrderedDict()
+        self.calls = 0
+        self.memo_hits = 0
+
+    def declaration(self):
+        summary, arg_docs = parse_docstring(self.fn)
+        hints = typing.get_type_hints(self.fn)
+        properties, required = {}, []
+        for pname, param in self.signature.parameters.items():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            schema = param_schema(hints.get(pname, str))
+            if pname in arg_docs:
+                schema["description"] = arg_docs[pname]
+            properties[pname] = schema
+            if param.default is param.empty:
+                required.append(pname)
+        decl = {"name": self.name, "description": summary or self.name,
+                "parameters": {"type": "object", "properties": properties}}
+        if required:
+            decl["parameters"]["required"] = required
+        return decl
+
+    def bind(self, args):
+        try:
+            return self.signature.bind(**args)
+        except TypeError as e:
+            raise ToolError(f"{self.name}: {e}")
+
+    def memo_key(self, bound):
+        # defaults applied, so f(x) and f(x, unit="C") share an entry
+        bound.apply_defaults()
+        return json.dumps(canonical(dict(bound.arguments)), sort_keys=True)
+
+    def memo_get(self, key):
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            self.memo_hits += 1
+            return True, self._memo[key]
+        return False, None
+
+    def memo_put(self, key, result):
+        self._memo[key] = result
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+
+class ToolRegistry:
+    """
+    Collects tools and runs the function calls the model asks for. All calls
+    from one model turn run concurrently: async tools on the event loop,
+    blocking ones on a shared thread pool, each bounded by its timeout.
+    A failing or timed-out tool returns {"error": ...} to the model instead of
+    aborting the turn.
+    """
+
+    def __init__(self, max_workers=8):
+        self.tools = {}
+        self.max_workers = max_workers
+        self._pool = None
+
+    def register(self, fn=None, *, name=None, idempotent=False, timeout=10.0):
+        """
+        Usable as @registry.register or @registry.register(idempotent=True).
+        """
+        def add(f):
+            tool = Tool(f, name=name, idempotent=idempotent, timeout=timeout)
+            self.tools[tool.name] = tool
+            return f
+        return add(fn) if fn is not None else add
+
+    def declarations(self):
+        # Plain dicts are accepted by the SDK and hash stably for the response cache
+        return [{"function_declarations": [t.declaration() for t in self.tools.values()]}]
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+        return self._pool
+
+    async def call(self, name, args):
+        """
+        Runs one tool call and returns its JSON-able result (or an error dict).
+        """
+        tool = self.tools.get(name)
+        if tool is None:
+            return {"error": f"unknown tool {name!r}"}
+        try:
+            bound = tool.bind(args)
+        except ToolError as e:
+            return {"error": str(e)}
+
+        key = tool.memo_key(bound) if tool.idempotent else None
+        if key is not None:
+            hit, result = tool.memo_get(key)
+            if hit:
+                return result
+
+        tool.calls += 1
+        try:
+            if tool.is_async:
+                work = tool.fn(*bound.args, **bound.kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                # a timed-out blocking tool keeps its thread until it returns; its result is dropped
+                work = loop.run_in_executor(self._executor(), lambda: tool.fn(*bound.args, **bound.kwargs))
+            result = await asyncio.wait_for(work, tool.timeout)
+        except asyncio.TimeoutError:
+            return {"error": f"{name} timed out after {tool.timeout}s"}
+        except Exception as e:
+            return {"error": f"{name} failed: {e!r}"}
+
+        if key is not None:
+            tool.memo_put(key, result)
+        return result
+
+    async def run_calls(self, calls):
+        """
+        Runs [(name, args), ...] concurrently; results come back in call order.
+        """
+        return await asyncio.gather(*(self.call(name, args) for name, args in calls))
+
+
+# ---------- Response / history helpers ----------
+
+def to_plain(value):
+    """
+    Converts SDK map/repeated composites (function-call args) into dicts and lists.
+    """
+    if isinstance(value, Mapping):
+        return {str(k): to_plain(v) for k, v in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return [to_plain(v) for v in value]
+    return value
+
+
+def call_args(fc):
+    args = fc.args
+    if isinstance(args, str):
+        args = json.loads(args or "{}")
+    return to_plain(args or {})
+
+
+def function_calls(resp):
+    """
+    Every function call requested in the first candidate, as [(name, args)].
+    """
+    try:
+        parts = resp.candidates[0].content.parts
+    except (AttributeError, IndexError):
+        return []
+    calls = []
+    for part in parts:
+        fc = getattr(part, "function_call", None)
+        if fc and getattr(fc, "name", None):
+            calls.append((fc.name, call_args(fc)))
+    return calls
+
+
+def model_turn(resp):
+    """
+    The model's turn as a plain content dict, to append to the history.
+    """
+    parts = []
+    for part in resp.candidates[0].content.parts:
+        fc = getattr(part, "function_call", None)
+        if fc and getattr(fc, "name", None):
+            parts.append({"function_call": {"name": fc.name, "args": call_args(fc)}})
+        elif getattr(part, "text", None):
+            parts.append({"text": part.text})
+    return {"role": "model", "parts": parts}
+
+
+def response_turn(calls, results):
+    parts = []
+    for (name, _), result in zip(calls, results):
+        # function_response.response must be an object
+        payload = result if isinstance(result, dict) else {"result": result}
+        parts.append({"function_response": {"name": name, "response": payload}})
+    return {"role": "function", "parts": parts}
+
+
+def as_history(contents):
+    """
+    `contents` as a chat history. A plain prompt becomes one user turn with the
+    same parts, so its leading parts stay a cacheable prefix (see split_static).
+    """
+    if isinstance(contents, str):
+        contents = [contents]
+    if contents and isinstance(contents[0], dict) and "role" in contents[0]:
+        return list(contents)
+    return [{"role": "user", "parts": list(contents)}]
+
+
+async def arun_tool_loop(client, contents, registry, generation_config=None, max_turns=5, on_calls=None):
+    """
+    Calls the model with the registry's tools, executes every function call it
+    asks for (in parallel), sends all results back with the full history, and
+    repeats until the model answers with text or `max_turns` tool rounds pass.
+    Returns (final response, history).
+    """
+    history = as_history(contents)
+    tools = registry.declarations()
+    for _ in range(max_turns):
+        resp = await client.agenerate(history, generation_config, tools)
+        calls = function_calls(resp)
+        if not calls:
+            return resp, history
+        results = await registry.run_calls(calls)
+        if on_calls is not None:
+            on_calls(calls, results)
+        history = history + [model_turn(resp), response_turn(calls, results)]
+    # out of tool rounds: ask for an answer with what we have. The history holds
+    # function calls, which the API only accepts alongside their declarations.
+    resp = await client.agenerate(history, generation_config, tools)
+    return resp, history
+
+
+def run_tool_loop(client, contents, registry, generation_config=None, max_turns=5, on_calls=None):
+    return asyncio.run(arun_tool_loop(client, contents, registry, generation_config, max_turns, on_calls))